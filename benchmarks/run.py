@@ -0,0 +1,113 @@
+"""
+Micro-benchmarks for hot paths; not part of the test suite.
+
+Run from the repository root: ``python -m benchmarks.run [name ...]``
+(all benchmarks when no name is given).
+"""
+
+import random
+import string
+import sys
+import timeit
+
+BENCHMARKS = {}
+
+
+def benchmark(func):
+    BENCHMARKS[func.__name__[len('bench_'):]] = func
+    return func
+
+
+@benchmark
+def bench_scoring():
+    """score_answer on questions of growing length with misspellings."""
+    from src.scoring import score_answer
+
+    rng = random.Random(0)
+    vocabulary = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 10)))
+                  for _ in range(2000)]
+
+    def misspell(word):
+        if len(word) < 5 or rng.random() > 0.2:
+            return word
+        i = rng.randrange(len(word))
+        return word[:i] + rng.choice(string.ascii_lowercase) + word[i + 1:]
+
+    for size in (10, 100, 1000):
+        correct = rng.choices(vocabulary, k=size)
+        answer = [misspell(word) for word in correct if rng.random() > 0.1]
+        answer += rng.choices(vocabulary, k=size // 10)
+        pair = (' '.join(answer), ' '.join(correct))
+        number = 200 if size < 1000 else 10
+        seconds = timeit.timeit(lambda: score_answer(*pair), number=number) / number
+        print(f"{size:>5} words: {seconds * 1000:8.3f} ms per question")
+
+
+@benchmark
+def bench_media():
+    """send_media against plain send_file for full downloads and 64 KiB seeks."""
+    import os
+    import tempfile
+    import time
+    from flask import Flask, send_file
+    from src.media import send_media
+
+    app = Flask(__name__)
+    size = 32 * 1024 * 1024
+    with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as f:
+        f.write(os.urandom(size))
+        path = f.name
+
+    @app.route('/send_file')
+    def via_send_file():
+        return send_file(path, mimetype='audio/mpeg')
+
+    @app.route('/send_media')
+    def via_send_media():
+        stat = os.stat(path)
+        return send_media(open(path, 'rb'), stat.st_size, stat.st_mtime_ns,
+                          'audio/mpeg', last_modified=stat.st_mtime)
+
+    class ServerFileWrapper:
+        """Like gunicorn's file wrapper: streams from the current position, cannot seek."""
+
+        def __init__(self, file, buffer_size=8192):
+            self.file = file
+            self.buffer_size = buffer_size
+
+        def __iter__(self):
+            return iter(lambda: self.file.read(self.buffer_size), b'')
+
+        def close(self):
+            self.file.close()
+
+    client = app.test_client()
+    client.environ_base['wsgi.file_wrapper'] = ServerFileWrapper
+    try:
+        for route in ('/send_file', '/send_media'):
+            started = time.perf_counter()
+            for _ in range(10):
+                assert len(client.get(route).data) == size
+            elapsed = time.perf_counter() - started
+            print(f"{route} full: {10 * size / elapsed / 1024 / 1024:.0f} MB/s")
+
+            started = time.perf_counter()
+            for i in range(200):
+                offset = (i * 7919 * 4096) % (size - 65536)
+                response = client.get(route, headers={'Range': f"bytes={offset}-{offset + 65535}"})
+                assert response.status_code == 206 and len(response.data) == 65536
+            print(f"{route} seek: {(time.perf_counter() - started) / 200 * 1000:.3f} ms per 64 KiB range")
+    finally:
+        os.remove(path)
+
+
+def main(names):
+    for name in names or BENCHMARKS:
+        if name not in BENCHMARKS:
+            sys.exit(f"Unknown benchmark {name!r}, choose from {', '.join(BENCHMARKS)}")
+        print(f"== {name}")
+        BENCHMARKS[name]()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
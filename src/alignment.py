@@ -0,0 +1,128 @@
+"""
+Word alignment of a spoken transcription against its reference text.
+
+Runs of identical words are found first and anchor the alignment; the words
+between them are aligned with a banded dynamic program (matches and
+near-matches cost less than a substitution, and a dropped or inserted word
+costs one gap), so a single missing word no longer shifts every later word
+out of place. Word similarity is a Levenshtein ratio computed with a
+two-row, threshold-bounded edit distance that gives up as soon as the ratio
+can no longer exceed the threshold.
+"""
+
+import math
+import string
+import difflib
+
+from src.scoring import bounded_edit_distance
+
+SIMILARITY_THRESHOLD = 0.7
+# Diagonals explored beyond the length difference of the two texts
+ALIGNMENT_BAND = 32
+STATUS_COSTS = {'correct': 0, 'similar': 0.5, 'incorrect': 1}
+GAP_COST = 1
+
+_DIAGONAL, _MISSING, _EXTRA = 0, 1, 2
+
+
+def normalize_word(word):
+    """Lowercase a word and drop surrounding punctuation for comparison."""
+    return (word.strip(string.punctuation) or word).lower()
+
+
+def is_similar(a, b, threshold=SIMILARITY_THRESHOLD):
+    """Whether 1 - levenshtein(a, b) / max length exceeds threshold."""
+    if not a or not b:
+        return False
+    # Largest distance that keeps the ratio strictly above the threshold
+    max_distance = math.ceil(round((1 - threshold) * max(len(a), len(b)), 9)) - 1
+    if max_distance < 0:
+        return False
+    return bounded_edit_distance(a, b, max_distance, substitution_cost=1) is not None
+
+
+def compare_words(a, b, threshold=SIMILARITY_THRESHOLD):
+    if a == b:
+        return 'correct'
+    return 'similar' if is_similar(a, b, threshold) else 'incorrect'
+
+
+def _align(original, transcribed, threshold):
+    """Return (i, j, status) steps aligning two lists of normalized words.
+
+    i or j is None for a word missing from, or extra in, the transcription.
+    """
+    n, m = len(original), len(transcribed)
+    band = abs(n - m) + ALIGNMENT_BAND
+    statuses = {}
+
+    def status(i, j):
+        key = (original[i], transcribed[j])
+        if key not in statuses:
+            statuses[key] = compare_words(*key, threshold)
+        return statuses[key]
+
+    infinity = float('inf')
+    previous = [j * GAP_COST if j <= band else infinity for j in range(m + 1)]
+    moves = [bytearray([_EXTRA]) * (m + 1)]
+    for i in range(1, n + 1):
+        current = [infinity] * (m + 1)
+        row_moves = bytearray([_EXTRA]) * (m + 1)
+        if i <= band:
+            current[0] = i * GAP_COST
+            row_moves[0] = _MISSING
+        for j in range(max(1, i - band), min(m, i + band) + 1):
+            best = previous[j - 1] + STATUS_COSTS[status(i - 1, j - 1)]
+            move = _DIAGONAL
+            if previous[j] + GAP_COST < best:
+                best, move = previous[j] + GAP_COST, _MISSING
+            if current[j - 1] + GAP_COST < best:
+                best, move = current[j - 1] + GAP_COST, _EXTRA
+            current[j] = best
+            row_moves[j] = move
+        moves.append(row_moves)
+        previous = current
+
+    steps = []
+    i, j = n, m
+    while i or j:
+        move = moves[i][j] if i and j else (_MISSING if i else _EXTRA)
+        if move == _DIAGONAL:
+            i, j = i - 1, j - 1
+            steps.append((i, j, status(i, j)))
+        elif move == _MISSING:
+            i -= 1
+            steps.append((i, None, 'incorrect'))
+        else:
+            j -= 1
+            steps.append((None, j, 'incorrect'))
+    steps.reverse()
+    return steps
+
+
+def align_words(original_words, transcribed_words, threshold=SIMILARITY_THRESHOLD):
+    """Compare reference and transcribed words in reading order.
+
+    Returns the word_analysis list of {'original', 'transcribed', 'status'}
+    used by evaluate_speaking, with "" for a missing or extra word.
+    """
+    original = [normalize_word(word) for word in original_words]
+    transcribed = [normalize_word(word) for word in transcribed_words]
+
+    # Runs of identical words anchor the alignment; only the stretches between
+    # them go through the dynamic program
+    steps = []
+    matcher = difflib.SequenceMatcher(None, original, transcribed, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            steps.extend((i1 + k, j1 + k, 'correct') for k in range(i2 - i1))
+        else:
+            for i, j, status in _align(original[i1:i2], transcribed[j1:j2], threshold):
+                steps.append((None if i is None else i + i1,
+                              None if j is None else j + j1, status))
+
+    return [{
+        "original": original_words[i] if i is not None else "",
+        "transcribed": transcribed_words[j] if j is not None else "",
+        "status": status
+    } for i, j, status in steps]
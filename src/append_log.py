@@ -0,0 +1,329 @@
+"""
+Append-only segment logs for files that are mostly appended to.
+
+A logged file is stored as its canonical object plus a hidden sibling folder
+of small segment objects, one per append (JSON logs hold one entry per line)
+(``.<filename>.segments/<time>-<id>.seg``). Appending writes a single
+segment, so its cost does not depend on the size of the file and concurrent
+workers cannot overwrite each other's entries. Reads merge the canonical
+content with the outstanding segments; compaction folds them back into the
+canonical object in a background thread.
+
+Segment names only order the merge: a segment can land after a compaction
+that started later than its name suggests. The ``compacted`` marker object
+therefore lists the segments already folded into the canonical object by
+name. Each rewrite of the canonical object (compaction or a full save)
+first records the segments it folds in as pending against the generation
+it replaces, then writes the canonical object conditionally on that
+generation, then deletes them. Readers treat pending segments as folded in
+once the canonical object has moved past that generation, so a crash at any
+step neither loses nor duplicates entries. Rewrites are serialized across
+processes by a ``lease`` object created with a conditional write.
+
+Readers get a version token (canonical generation and the segments merged
+in) alongside the content; a save passes it back so that only the segments
+the client has seen are replaced by the saved content.
+"""
+
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from src.storage import storage, join_path, WriteConflict
+
+SEGMENT_SUFFIX = '.seg'
+MARKER_NAME = 'compacted'
+LEASE_NAME = 'lease'
+COMPACT_THRESHOLD = int(os.getenv('APPEND_LOG_COMPACT_THRESHOLD', 32))
+# A lease left behind by a crashed process is taken over after this long
+LEASE_SECONDS = float(os.getenv('APPEND_LOG_LEASE_SECONDS', 60))
+# How long a save waits for a running compaction of the same file
+LEASE_WAIT = 10
+LEASE_POLL_INTERVAL = 0.05
+SNAPSHOT_ATTEMPTS = 5
+
+_compaction_executor = ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix='append-log-compaction')
+_pending_compactions = set()
+_append_counts = defaultdict(int)
+_state_lock = threading.Lock()
+
+# canonical: content (None if missing); generation: 0 if missing;
+# folded: listed segment names already in the canonical object;
+# outstanding: the others in append order; contents: their content, if read
+Snapshot = namedtuple(
+    'Snapshot', 'canonical generation folded outstanding contents')
+
+
+class LogConflict(Exception):
+    """Raised when a logged file cannot be rewritten safely."""
+
+
+def merge_text(canonical, entries):
+    """Merge markdown segments by concatenation."""
+    return (canonical or '') + ''.join(entries)
+
+
+def merge_json_list(canonical, entries):
+    """Merge JSON segments (one object per line) into the canonical JSON list."""
+    items = []
+    if canonical:
+        try:
+            items = json.loads(canonical)
+        except json.JSONDecodeError:
+            logging.error("Corrupted canonical JSON log, starting from empty list")
+        if not isinstance(items, list):
+            items = []
+    for entry in entries:
+        for line in entry.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError:
+                logging.error(f"Skipping corrupted JSON log entry: {line[:100]}")
+    return json.dumps(items, indent=4)
+
+
+def get_segments_prefix(path):
+    directory, _, filename = path.rpartition('/')
+    return join_path(directory, f".{filename}.segments") + '/'
+
+
+def _read_marker(prefix):
+    text, _ = storage.read_with_generation(prefix + MARKER_NAME)
+    if text is None:
+        return {}
+    try:
+        marker = json.loads(text)
+    except json.JSONDecodeError:
+        marker = None
+    if not isinstance(marker, dict):
+        # Older logs kept the name of the newest folded segment instead
+        return {'watermark': text.strip()}
+    return marker
+
+
+def _is_folded(name, marker, generation):
+    if name in marker.get('absorbed', ()):
+        return True
+    if name <= marker.get('watermark', ''):
+        return True
+    # Pending segments are in the canonical object once it has been rewritten
+    return generation != marker.get('base') and name in marker.get('pending', ())
+
+
+def _read_segments(segments):
+    with ThreadPoolExecutor(max_workers=min(10, len(segments) or 1)) as executor:
+        return list(executor.map(storage.read, segments))
+
+
+def _snapshot(path, read_contents=True):
+    """Read the canonical object and the segments outstanding against it.
+
+    Retried until the canonical object is unchanged across the reads, so the
+    marker and listing describe the generation that was read.
+    """
+    prefix = get_segments_prefix(path)
+    for _ in range(SNAPSHOT_ATTEMPTS):
+        if read_contents:
+            canonical, generation = storage.read_with_generation(path)
+        else:
+            obj = storage.stat(path)
+            canonical, generation = None, obj.generation if obj else None
+        generation = generation or 0
+        marker = _read_marker(prefix)
+        objects, _ = storage.list(prefix, delimiter='/')
+        names = sorted(obj.name[len(prefix):] for obj in objects
+                       if obj.name.endswith(SEGMENT_SUFFIX))
+        folded = {name for name in names if _is_folded(name, marker, generation)}
+        outstanding = [name for name in names if name not in folded]
+        contents = _read_segments([prefix + name for name in outstanding]) \
+            if read_contents and outstanding else []
+        current = storage.stat(path)
+        if (current.generation if current else 0) == generation and None not in contents:
+            return Snapshot(canonical, generation, folded, outstanding, contents)
+    logging.warning(f"Append log {path} kept changing while being read")
+    return Snapshot(canonical, generation, folded, outstanding,
+                    [content for content in contents if content is not None])
+
+
+def _format_version(generation, segments):
+    return f"{generation}:{','.join(segments)}"
+
+
+def _acquire_lease(path, wait):
+    """Take the rewrite lease of path, returning its owner token or None."""
+    key = get_segments_prefix(path) + LEASE_NAME
+    owner = uuid.uuid4().hex
+    deadline = time.monotonic() + (LEASE_WAIT if wait else 0)
+    while True:
+        text, generation = storage.read_with_generation(key)
+        try:
+            expires = json.loads(text)['expires'] if text else 0
+        except (json.JSONDecodeError, KeyError, TypeError):
+            expires = 0
+        if expires < time.time():
+            try:
+                storage.write(key, json.dumps({'owner': owner, 'expires': time.time() + LEASE_SECONDS}),
+                              if_generation_match=generation or 0)
+                return owner
+            except WriteConflict:
+                pass
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(LEASE_POLL_INTERVAL)
+
+
+def _release_lease(path, owner):
+    key = get_segments_prefix(path) + LEASE_NAME
+    text, _ = storage.read_with_generation(key)
+    try:
+        held = text and json.loads(text).get('owner') == owner
+    except json.JSONDecodeError:
+        held = False
+    if held:
+        storage.delete(key)
+
+
+def _commit(path, snapshot, content, folded):
+    """Replace the canonical object with content including the folded segments.
+
+    Must be called with the lease held. Returns the new generation.
+    """
+    marker_key = get_segments_prefix(path) + MARKER_NAME
+    absorbed = sorted(snapshot.folded)
+    folded = sorted(folded)
+    storage.write(marker_key, json.dumps(
+        {'base': snapshot.generation, 'absorbed': absorbed, 'pending': folded}))
+    try:
+        storage.write(path, content, if_generation_match=snapshot.generation)
+    except WriteConflict:
+        storage.write(marker_key, json.dumps(
+            {'base': snapshot.generation, 'absorbed': absorbed, 'pending': []}))
+        raise LogConflict(f"{path} was rewritten concurrently")
+    obj = storage.stat(path)
+    generation = obj.generation if obj else 0
+    storage.write(marker_key, json.dumps(
+        {'base': generation, 'absorbed': absorbed + folded, 'pending': []}))
+    prefix = get_segments_prefix(path)
+    storage.delete_many(prefix + name for name in absorbed + folded)
+    with _state_lock:
+        _append_counts.pop(path, None)
+    return generation
+
+
+def append_entry(path, entry, merge, on_compact=None):
+    """Append one entry to the log of path, writing only the entry itself."""
+    segment = get_segments_prefix(path) + \
+        f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}{SEGMENT_SUFFIX}"
+    storage.write(segment, entry)
+    with _state_lock:
+        _append_counts[path] += 1
+        due = _append_counts[path] >= COMPACT_THRESHOLD
+    if due:
+        schedule_compaction(path, merge, on_compact)
+
+
+def read_merged_versioned(path, merge, on_compact=None):
+    """Return (merged content or None, version token for replace_content)."""
+    snapshot = _snapshot(path)
+    if len(snapshot.outstanding) >= COMPACT_THRESHOLD:
+        schedule_compaction(path, merge, on_compact)
+    content = merge(snapshot.canonical, snapshot.contents) \
+        if snapshot.outstanding else snapshot.canonical
+    return content, _format_version(snapshot.generation, snapshot.outstanding)
+
+
+def read_merged(path, merge, on_compact=None):
+    """Return the canonical content merged with outstanding segments, or None."""
+    return read_merged_versioned(path, merge, on_compact)[0]
+
+
+def get_version(path):
+    """Return the version token of path without reading any content."""
+    snapshot = _snapshot(path, read_contents=False)
+    return _format_version(snapshot.generation, snapshot.outstanding)
+
+
+def replace_content(path, content, version=None):
+    """Write content read (and edited) at version as the new canonical object.
+
+    Only the segments merged into that read are dropped; entries appended
+    since stay outstanding on top of content. Without a version none are.
+    Raises LogConflict if the canonical object was rewritten since the read.
+    Returns the version token of content.
+    """
+    owner = _acquire_lease(path, wait=True)
+    if owner is None:
+        raise LogConflict(f"{path} is being compacted, try again")
+    try:
+        snapshot = _snapshot(path, read_contents=False)
+        seen = set()
+        if version is not None:
+            generation, _, names = version.partition(':')
+            if generation != str(snapshot.generation):
+                raise LogConflict(f"{path} changed since it was read")
+            seen = set(filter(None, names.split(',')))
+        generation = _commit(path, snapshot, content,
+                             [name for name in snapshot.outstanding if name in seen])
+    finally:
+        _release_lease(path, owner)
+    return _format_version(generation, [])
+
+
+def compact(path, merge, on_compact=None, wait=False):
+    """Fold outstanding segments into the canonical object.
+
+    Skipped (returning 0) if another process holds the lease, unless wait is
+    set, in which case LogConflict is raised once LEASE_WAIT runs out.
+    """
+    owner = _acquire_lease(path, wait)
+    if owner is None:
+        if wait:
+            raise LogConflict(f"{path} is being compacted, try again")
+        logging.info(f"Skipping compaction of {path}: lease held elsewhere")
+        return 0
+    try:
+        snapshot = _snapshot(path)
+        if not snapshot.outstanding:
+            return 0
+        _commit(path, snapshot, merge(snapshot.canonical, snapshot.contents),
+                snapshot.outstanding)
+    finally:
+        _release_lease(path, owner)
+    if on_compact:
+        on_compact()
+    logging.info(f"Compacted {len(snapshot.outstanding)} segments into {path}")
+    return len(snapshot.outstanding)
+
+
+def discard_segments(path):
+    """Delete the whole segment log of path (used when the file is deleted)."""
+    objects, _ = storage.list(get_segments_prefix(path))
+    storage.delete_many(obj.name for obj in objects)
+    with _state_lock:
+        _append_counts.pop(path, None)
+
+
+def schedule_compaction(path, merge, on_compact=None):
+    with _state_lock:
+        if path in _pending_compactions:
+            return
+        _pending_compactions.add(path)
+        _append_counts.pop(path, None)
+
+    def run():
+        try:
+            compact(path, merge, on_compact)
+        except Exception as e:
+            logging.error(f"Error compacting append log for {path}: {str(e)}")
+        finally:
+            with _state_lock:
+                _pending_compactions.discard(path)
+
+    _compaction_executor.submit(run)
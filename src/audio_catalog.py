@@ -0,0 +1,82 @@
+"""
+Catalog of the shared audio library with a substring index for search.
+
+The catalog records every audio file under ``artifacts/audio`` with its size,
+generation, duration and tags, so listing and searching the library costs no
+prefix scan. Search uses an index from every substring of up to GRAM_SIZE
+characters of a file's name and tags to the files containing it: short
+queries are a single lookup, longer ones intersect the postings of their
+grams and confirm the candidates. Persistence and keeping the catalog in
+sync with storage live in ``src.utils``.
+"""
+
+CATALOG_VERSION = 1
+GRAM_SIZE = 3
+
+
+def catalog_terms(name, entry):
+    """Return the lowercased texts a file is found by: its name and tags."""
+    return [name.lower()] + [tag.lower() for tag in entry.get('tags', [])]
+
+
+class AudioCatalog:
+    def __init__(self, files=None):
+        # name -> {'size', 'generation', 'mtime', 'duration', 'tags'}
+        self.files = files or {}
+        self._grams = None
+
+    @classmethod
+    def from_dict(cls, data):
+        """Return the catalog stored in data, or None if missing or outdated."""
+        if not data or data.get('version') != CATALOG_VERSION:
+            return None
+        return cls(data.get('files'))
+
+    def to_dict(self):
+        return {'version': CATALOG_VERSION, 'files': self.files}
+
+    def set_file(self, name, entry):
+        self.files[name] = entry
+        self._grams = None
+
+    def remove_file(self, name):
+        if self.files.pop(name, None) is not None:
+            self._grams = None
+
+    def _get_grams(self):
+        if self._grams is None:
+            grams = {}
+            for name, entry in self.files.items():
+                for term in catalog_terms(name, entry):
+                    for size in range(1, GRAM_SIZE + 1):
+                        for start in range(len(term) - size + 1):
+                            grams.setdefault(term[start:start + size], set()).add(name)
+            self._grams = grams
+        return self._grams
+
+    def search(self, query, names=None):
+        """Return the names matching query, prefix matches first.
+
+        names optionally restricts the result (e.g. to the files a user may
+        access); an empty query matches every file.
+        """
+        query = query.strip().lower()
+        candidates = set(self.files) if names is None else set(names) & set(self.files)
+        if query:
+            grams = self._get_grams()
+            if len(query) <= GRAM_SIZE:
+                candidates &= grams.get(query, set())
+            else:
+                postings = sorted((grams.get(query[i:i + GRAM_SIZE], set())
+                                   for i in range(len(query) - GRAM_SIZE + 1)), key=len)
+                for posting in postings:
+                    candidates &= posting
+                    if not candidates:
+                        break
+                candidates = {name for name in candidates
+                              if any(query in term for term in catalog_terms(name, self.files[name]))}
+
+        def rank(name):
+            terms = catalog_terms(name, self.files[name])
+            return (not any(term.startswith(query) for term in terms), name.lower())
+        return sorted(candidates, key=rank)
@@ -0,0 +1,136 @@
+"""
+Audio container detection and transcoding for speech transcription.
+
+Whisper accepts most containers browsers record in, so uploads are sniffed
+from their first bytes and sent as they are, under a filename whose
+extension matches the real container. Only formats Whisper rejects are
+decoded and re-encoded to MP3; that work runs in a separate process pool so
+it never holds the GIL of the web workers.
+"""
+
+import io
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Containers the transcription API accepts as uploaded
+WHISPER_FORMATS = {'mp3', 'mp4', 'm4a', 'wav', 'webm', 'ogg', 'flac'}
+TRANSCODE_WORKERS = int(os.getenv('TRANSCODE_WORKERS', 2))
+TRANSCODE_TIMEOUT = int(os.getenv('TRANSCODE_TIMEOUT', 120))
+
+_transcode_executor = None
+_executor_lock = threading.Lock()
+
+
+def sniff_audio_format(data):
+    """Return the container of audio data from its magic bytes, or None if unknown."""
+    header = data[:64]
+    if len(header) > 1 and header[0] == 0xFF and header[1] & 0xF6 == 0xF0:
+        # 12-bit sync with layer bits 00: an ADTS AAC stream, not MPEG audio
+        return 'aac'
+    if header.startswith(b'ID3') or (len(header) > 1 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0):
+        return 'mp3'
+    if header.startswith(b'RIFF') and header[8:12] == b'WAVE':
+        return 'wav'
+    if header.startswith(b'\x1a\x45\xdf\xa3'):
+        # EBML: WebM, or a Matroska file the API does not accept
+        return 'webm' if b'webm' in header else 'mkv'
+    if header.startswith(b'OggS'):
+        return 'ogg'
+    if header.startswith(b'fLaC'):
+        return 'flac'
+    if header[4:8] == b'ftyp':
+        return 'm4a' if header[8:11] == b'M4A' else 'mp4'
+    return None
+
+
+def _syncsafe(data):
+    return data[0] << 21 | data[1] << 14 | data[2] << 7 | data[3]
+
+
+def audio_parts(data):
+    """Return the parts of audio data that encode the sound, as memoryviews.
+
+    Metadata that tag editors and uploaders rewrite without touching the
+    audio is left out: ID3 and APE tags around MP3 streams, FLAC metadata
+    blocks other than STREAMINFO and WAV chunks other than fmt and data.
+    Other containers are returned whole.
+    """
+    view = memoryview(data)
+    audio_format = sniff_audio_format(data)
+    if audio_format == 'mp3':
+        start, end = 0, len(view)
+        if bytes(view[:3]) == b'ID3' and len(view) >= 10:
+            start = 10 + _syncsafe(view[6:10]) + (10 if view[5] & 0x10 else 0)
+        if end - start >= 128 and bytes(view[end - 128:end - 125]) == b'TAG':
+            end -= 128
+        if end - start >= 32 and bytes(view[end - 32:end - 24]) == b'APETAGEX':
+            size = int.from_bytes(view[end - 20:end - 16], 'little')
+            has_header = view[end - 9] & 0x80
+            end -= size + (32 if has_header else 0)
+        return [view[start:max(start, end)]]
+    if audio_format == 'flac':
+        parts, position = [view[:4]], 4
+        while position + 4 <= len(view):
+            header = view[position]
+            length = int.from_bytes(view[position + 1:position + 4], 'big')
+            if header & 0x7F == 0:
+                parts.append(view[position + 1:position + 4 + length])
+            position += 4 + length
+            if header & 0x80:
+                break
+        return parts + [view[position:]]
+    if audio_format == 'wav':
+        # The RIFF size changes with the chunks left out
+        parts, position = [view[8:12]], 12
+        while position + 8 <= len(view):
+            chunk_id = bytes(view[position:position + 4])
+            length = int.from_bytes(view[position + 4:position + 8], 'little')
+            if chunk_id in (b'fmt ', b'data'):
+                parts.append(view[position:position + 8 + length])
+            # Chunks are padded to an even length
+            position += 8 + length + (length & 1)
+        return parts
+    return [view]
+
+
+def transcode_to_mp3(data, source_format=None):
+    """Decode audio with pydub (ffmpeg) and return it encoded as MP3."""
+    from pydub import AudioSegment
+    sound = AudioSegment.from_file(io.BytesIO(data), format=source_format)
+    converted = io.BytesIO()
+    sound.export(converted, format="mp3")
+    return converted.getvalue()
+
+
+def _get_transcode_executor():
+    global _transcode_executor
+    with _executor_lock:
+        if _transcode_executor is None:
+            # Spawned rather than forked: the web process runs threads
+            _transcode_executor = ProcessPoolExecutor(
+                max_workers=TRANSCODE_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _transcode_executor
+
+
+def prepare_audio(filename, data):
+    """Return (filename, data) ready for transcription.
+
+    Supported containers are passed through untouched (renamed to their real
+    extension); anything else is transcoded to MP3 in the process pool.
+    """
+    base, extension = os.path.splitext(filename or 'recording')
+    audio_format = sniff_audio_format(data)
+    if audio_format in WHISPER_FORMATS:
+        return f"{base}.{audio_format}", data
+
+    logging.info(f"Transcoding {audio_format or extension or 'unknown'} audio {filename} to mp3")
+    return f"{base}.mp3", run_audio_task(
+        transcode_to_mp3, data, audio_format or extension[1:] or None)
+
+
+def run_audio_task(function, *args, timeout=TRANSCODE_TIMEOUT):
+    """Run a CPU-bound audio function in the process pool and return its result."""
+    return _get_transcode_executor().submit(function, *args).result(timeout=timeout)
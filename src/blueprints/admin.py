@@ -1,66 +1,20 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, session, jsonify
+from flask import Blueprint, render_template, request, flash, redirect, url_for, session, jsonify, Response
 from src.database import db
 from src.models import User
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
 from datetime import datetime
 import logging
-from src.utils import create_zip_from_folder, create_zip_from_files, list_user_folders, list_md_files, ARTIFACTS_DIR
-from src.gcs_utils import gcs_client
+from src.utils import create_zip_from_folder, create_zip_from_files, list_user_folders, list_md_files, read_notifications, write_notification, save_notifications, rebuild_user_manifest, get_file_list_cache_stats, lesson_cache, save_audio_file, rebuild_audio_catalog
+from src.storage import storage
+from src.transcription_cache import transcription_cache
+from src.openai_clients import openai_clients
 from flask import send_file
+from werkzeug.utils import secure_filename
 import os
-import tempfile
-import json
-import uuid
 
 admin_bp = Blueprint('admin', __name__)
 
-# Notifications file path
-NOTIFICATIONS_FILE = os.path.join(ARTIFACTS_DIR, 'notifications.json')
-
-# Helper functions for notifications
-
-
-def read_notifications():
-    """Read notifications from notifications.json, supporting both local and GCS storage."""
-    if gcs_client.enabled:
-        try:
-            content = gcs_client.read_file('artifacts/notifications.json')
-            if content:
-                return json.loads(content)
-            return []
-        except Exception as e:
-            logging.error(f"Error reading notifications from GCS: {str(e)}")
-            return []
-    try:
-        if os.path.exists(NOTIFICATIONS_FILE):
-            with open(NOTIFICATIONS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return []
-    except Exception as e:
-        logging.error(f"Error reading notifications from local file: {str(e)}")
-        return []
-
-
-def write_notification(notification):
-    try:
-        notifications = read_notifications()
-        # Assign a unique id if not already present
-        if 'id' not in notification:
-            notification['id'] = str(uuid.uuid4().int >> 64)  # Store as string
-        notifications.append(notification)
-        content = json.dumps(notifications, indent=2)
-        if gcs_client.enabled:
-            gcs_client.write_file('artifacts/notifications.json', content)
-        else:
-            with open(NOTIFICATIONS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(notifications, f, indent=2)
-        logging.info(f"Notification added: {notification['details']}")
-    except Exception as e:
-        logging.error(f"Error writing notification: {str(e)}")
-        raise
-
-
 # Admin login required decorator
 def admin_required(f):
     @wraps(f)
@@ -384,12 +338,7 @@ def delete_notification(notification_id):
         if len(new_notifications) == len(notifications):
             return jsonify({'message': 'Notification not found.'}), 404
 
-        content = json.dumps(new_notifications, indent=2)
-        if gcs_client.enabled:
-            gcs_client.write_file('artifacts/notifications.json', content)
-        else:
-            with open(NOTIFICATIONS_FILE, 'w', encoding='utf-8') as f:
-                f.write(content)
+        save_notifications(new_notifications)
 
         return jsonify({'message': 'Notification deleted.'}), 200
     except Exception as e:
@@ -411,6 +360,66 @@ def get_users():
         return jsonify({'message': f'Error retrieving users: {str(e)}'}), 500
 
 
+@admin_bp.route('/admin/storage-stats', methods=['GET'])
+@admin_required
+def get_storage_stats():
+    return jsonify({
+        'backend': storage.name,
+        'read_cache': storage.cache_stats(),
+        'file_list_cache': get_file_list_cache_stats(),
+        'lesson_cache': lesson_cache.snapshot(),
+        'transcription_cache': transcription_cache.snapshot(),
+        'openai_clients': openai_clients.snapshot()
+    }), 200
+
+
+@admin_bp.route('/admin/manifest/<username>/rebuild', methods=['POST'])
+@admin_required
+def rebuild_manifest(username):
+    try:
+        user = User.query.filter_by(username=username).first()
+        if not user:
+            logging.error(f"User {username} not found")
+            return jsonify({'message': 'User not found'}), 404
+
+        manifest = rebuild_user_manifest(username)
+        return jsonify({'files': len(manifest['files']), 'folders': manifest['folders']}), 200
+    except Exception as e:
+        logging.error(
+            f"Error rebuilding manifest for user {username}: {str(e)}")
+        return jsonify({'message': f'Error rebuilding manifest: {str(e)}'}), 500
+
+
+@admin_bp.route('/admin/audio/upload', methods=['POST'])
+@admin_required
+def upload_audio():
+    file = request.files.get('file')
+    if not file or not file.filename:
+        return jsonify({'message': 'No file provided'}), 400
+    filename = secure_filename(file.filename)
+    if not filename.lower().endswith('.mp3'):
+        return jsonify({'message': 'Only MP3 files are supported'}), 400
+    tags = [tag.strip() for tag in request.form.get('tags', '').split(',') if tag.strip()]
+
+    try:
+        save_audio_file(filename, file.read(), tags)
+        return jsonify({'message': 'Audio file uploaded', 'filename': filename, 'tags': tags}), 201
+    except Exception as e:
+        logging.error(f"Error uploading audio file {filename}: {str(e)}")
+        return jsonify({'message': f'Error uploading audio file: {str(e)}'}), 500
+
+
+@admin_bp.route('/admin/audio/catalog/rebuild', methods=['POST'])
+@admin_required
+def rebuild_catalog():
+    try:
+        catalog = rebuild_audio_catalog()
+        return jsonify({'files': len(catalog.files)}), 200
+    except Exception as e:
+        logging.error(f"Error rebuilding audio catalog: {str(e)}")
+        return jsonify({'message': f'Error rebuilding audio catalog: {str(e)}'}), 500
+
+
 @admin_bp.route('/admin/folders/<username>', methods=['GET'])
 @admin_required
 def get_user_folders(username):
@@ -449,6 +458,12 @@ def get_user_files(username):
         return jsonify({'message': f'Error retrieving files: {str(e)}'}), 500
 
 
+def zip_response(chunks, zip_filename):
+    return Response(chunks, mimetype='application/zip', headers={
+        'Content-Disposition': f'attachment; filename="{zip_filename}"'
+    })
+
+
 @admin_bp.route('/download_folder', methods=['POST'])
 @admin_required
 def download_folder():
@@ -466,23 +481,10 @@ def download_folder():
             logging.error(f"User {username} not found")
             return jsonify({'message': 'User not found'}), 404
 
-        # Create a temporary ZIP file
-        temp_dir = tempfile.gettempdir()
         zip_filename = f"{username}_{folder or 'root'}_files.zip"
-        zip_path = os.path.join(temp_dir, zip_filename)
 
-        # Create ZIP file for the folder
-        create_zip_from_folder(username, folder, zip_path)
-        logging.info(
-            f"ZIP file created for folder '{folder or 'root'}' for user {username} at {zip_path}")
-
-        # Send the file as a download
-        return send_file(
-            zip_path,
-            as_attachment=True,
-            download_name=zip_filename,
-            mimetype='application/zip'
-        )
+        # Stream the ZIP to the client while the files are being fetched
+        return zip_response(create_zip_from_folder(username, folder), zip_filename)
     except FileNotFoundError as e:
         logging.error(f"Folder download error: {str(e)}")
         return jsonify({'message': str(e)}), 404
@@ -490,14 +492,6 @@ def download_folder():
         logging.error(
             f"Error downloading folder for user {username}: {str(e)}")
         return jsonify({'message': f'Error downloading folder: {str(e)}'}), 500
-    finally:
-        if 'zip_path' in locals() and os.path.exists(zip_path):
-            try:
-                os.remove(zip_path)
-                logging.debug(f"Cleaned up temporary file: {zip_path}")
-            except Exception as e:
-                logging.error(
-                    f"Error cleaning up temporary file {zip_path}: {str(e)}")
 
 
 @admin_bp.route('/download_files', methods=['POST'])
@@ -525,34 +519,15 @@ def download_files():
             logging.error("Only .md files can be downloaded")
             return jsonify({'message': 'Only .md files can be downloaded'}), 400
 
-        temp_dir = tempfile.gettempdir()
         zip_filename = f"{username}_{folder or 'root'}_selected_files.zip"
-        zip_path = os.path.join(temp_dir, zip_filename)
 
-        create_zip_from_files(username, folder, files, zip_path)
-        logging.info(
-            f"ZIP file created for {len(files)} files in folder '{folder or 'root'}' for user {username} at {zip_path}")
-
-        return send_file(
-            zip_path,
-            as_attachment=True,
-            download_name=zip_filename,
-            mimetype='application/zip'
-        )
+        return zip_response(create_zip_from_files(username, folder, files), zip_filename)
     except FileNotFoundError as e:
         logging.error(f"File download error: {str(e)}")
         return jsonify({'message': str(e)}), 404
     except Exception as e:
         logging.error(f"Error downloading files for user {username}: {str(e)}")
         return jsonify({'message': f'Error downloading files: {str(e)}'}), 500
-    finally:
-        if 'zip_path' in locals() and os.path.exists(zip_path):
-            try:
-                os.remove(zip_path)
-                logging.debug(f"Cleaned up temporary file: {zip_path}")
-            except Exception as e:
-                logging.error(
-                    f"Error cleaning up temporary file {zip_path}: {str(e)}")
 
 
 @admin_bp.route('/admin/download-db')
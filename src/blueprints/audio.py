@@ -1,9 +1,8 @@
-from flask import Blueprint, jsonify, render_template, request, session, send_from_directory
-from src.utils import list_audio_files, get_audio_file
+from flask import Blueprint, jsonify, render_template, request, session
+from src.utils import list_audio_files, list_audio_details, search_audio_files, get_audio_file, get_audio_waveform, send_storage_file
+from src.storage import storage
 from .auth import login_required
-import os
 import logging
-from ..gcs_utils import gcs_client
 
 audio_bp = Blueprint('audio', __name__)
 
@@ -19,9 +18,18 @@ def audio_page():
 @audio_bp.route('/files')
 @login_required
 def list_audio_files_route():
-    """List all MP3 files the user is allowed to access."""
+    """List all MP3 files the user is allowed to access.
+
+    With ?details=1 each file comes with its catalog metadata (size,
+    duration, bitrate, tags) instead of just its name.
+    """
     username = session.get('username')
 
+    if request.args.get('details'):
+        details = [entry for entry in list_audio_details(username)
+                   if entry['name'].lower().endswith('.mp3')]
+        return jsonify(details)
+
     # Get the list of accessible audio files
     audio_files = list_audio_files(username)
 
@@ -34,7 +42,7 @@ def list_audio_files_route():
 @audio_bp.route('/play/<filename>')
 @login_required
 def play_audio(filename):
-    """Serve an MP3 file for playback or return a presigned URL for GCS."""
+    """Serve an MP3 file for playback or return a presigned URL."""
     username = session.get('username')
 
     # Ensure the file is an MP3
@@ -44,31 +52,17 @@ def play_audio(filename):
         return jsonify({'success': False, 'error': 'Only MP3 files are supported'}), 400
 
     try:
-        if gcs_client.enabled:
-            # For GCS, generate a presigned URL for direct streaming
-            allowed_files = gcs_client.get_audio_permissions(username)
-            if filename not in allowed_files:
-                logging.error(
-                    f"User {username} does not have access to audio file: {filename}")
-                return jsonify({'success': False, 'error': 'Access denied'}), 403
-
-            gcs_path = os.path.join(
-                'artifacts', 'audio', filename).replace(os.sep, '/')
-            url = gcs_client.generate_presigned_url(
-                gcs_path, expiration=3600)  # 1-hour URL
-            if url:
-                logging.info(
-                    f"Generated presigned URL for audio file: {filename} for user {username}")
-                return jsonify({'success': True, 'url': url})
-            logging.error(
-                f"Failed to generate presigned URL for {filename} for user {username}")
-            return jsonify({'success': False, 'error': 'Failed to generate URL'}), 500
-
-        # Local filesystem: serve the file directly
-        audio_file_path = get_audio_file(username, filename)
-        audio_dir = os.path.dirname(audio_file_path)  # artifacts/audio
+        audio_path = get_audio_file(username, filename)
+
+        # Backends with signed URLs stream directly from the bucket
+        url = storage.signed_url(audio_path, expiration=3600)  # 1-hour URL
+        if url:
+            logging.info(
+                f"Generated presigned URL for audio file: {filename} for user {username}")
+            return jsonify({'success': True, 'url': url})
+
         logging.info(f"Serving audio file: {filename} for user {username}")
-        return send_from_directory(audio_dir, filename, mimetype='audio/mpeg')
+        return send_storage_file(audio_path, mimetype='audio/mpeg')
     except ValueError as e:
         logging.error(
             f"Access denied: {filename} for user {username}: {str(e)}")
@@ -82,19 +76,31 @@ def play_audio(filename):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@audio_bp.route('/waveform/<filename>')
+@login_required
+def audio_waveform(filename):
+    """Return the duration and waveform peaks of an audio file."""
+    username = session.get('username')
+    try:
+        waveform = get_audio_waveform(username, filename)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 403
+    if waveform is None:
+        # Not extracted yet (or the file does not exist)
+        return jsonify({'success': False, 'error': 'Waveform not available'}), 404
+    return jsonify({'success': True, **waveform})
+
+
 @audio_bp.route('/search')
 @login_required
 def search_audio():
-    """Search for MP3 files by keyword in the filename."""
+    """Search for MP3 files by keyword in the filename or tags."""
     username = session.get('username')
-    keyword = request.args.get('q', '').lower()
-
-    # Get the list of accessible audio files
-    audio_files = list_audio_files(username)
+    keyword = request.args.get('q', '')
 
-    # Filter for MP3 files matching the keyword
-    matching_files = [f for f in audio_files
-                      if f.lower().endswith('.mp3') and keyword in f.lower()]
+    # Served from the catalog index, prefix matches first
+    matching_files = [f for f in search_audio_files(username, keyword)
+                      if f.lower().endswith('.mp3')]
     logging.debug(
         f"Search for '{keyword}' returned {len(matching_files)} audio files for user {username}")
     return jsonify(matching_files)
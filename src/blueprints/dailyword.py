@@ -1,6 +1,7 @@
 from flask import Blueprint, jsonify, current_app
 import logging
-from src.utils import open_md_file
+from src.storage import storage, join_path
+from src.utils import ARTIFACTS_PREFIX
 
 dailyword_bp = Blueprint('dailyword', __name__)
 
@@ -8,8 +9,9 @@ dailyword_bp = Blueprint('dailyword', __name__)
 @dailyword_bp.route('/get_all_words')
 def get_all_words():
     try:
-        # Read wordbank_saved.md using open_md_file (supports both local and GCS)
-        content = open_md_file('wordbank_saved.md', '', 'word bank')
+        # The shared word bank lives outside any user's folder
+        content = storage.read(join_path(
+            ARTIFACTS_PREFIX, 'word bank', 'wordbank_saved.md'))
         if content is None:
             logging.warning("Wordbank file not found: wordbank_saved.md")
             return jsonify({'error': 'Wordbank file not found'}), 404
@@ -1,6 +1,7 @@
 # src/blueprints/editor.py
 from flask import Blueprint, render_template, jsonify, request, session
-from src.utils import get_user_books, list_md_files, open_md_file, save_file, save_user_books, search_files, list_user_folders
+from src.utils import get_user_books, list_md_files, open_md_file_versioned, save_file, save_user_books, search_files, list_user_folders
+from src.append_log import LogConflict
 from src.models import User
 from .auth import login_required
 import logging
@@ -102,10 +103,15 @@ def save():
         return jsonify({'success': False, 'error': 'Cannot save to shared folder', 'upgrade_required': True}), 403
 
     try:
-        save_file(filename, content, username, folder)
+        log_version = save_file(filename, content, username,
+                                folder, data.get('log_version'))
         logging.info(
             f"File saved successfully: {filename} for user {username} in folder {folder or 'root'}")
-        return jsonify({'success': True})
+        return jsonify({'success': True, 'log_version': log_version})
+    except LogConflict as e:
+        logging.warning(
+            f"Conflicting save of {filename} for user {username}: {str(e)}")
+        return jsonify({'success': False, 'error': 'The file changed since it was opened, reopen it and try again'}), 409
     except PermissionError as e:
         logging.warning(
             f"Permission error saving file {filename} for user {username}: {str(e)}")
@@ -125,10 +131,13 @@ def open_file():
     logging.debug(
         f"Opening file: {filename} in folder: '{folder}' for user: {username}")
     try:
-        content = open_md_file(filename, username, folder)
+        content, log_version = open_md_file_versioned(
+            filename, username, folder)
         logging.info(
             f"File opened successfully: {filename} in folder: {folder or 'root'} for user: {username}")
-        return content
+        # Sent back on save so only the appended entries shown are replaced
+        headers = {'X-Log-Version': log_version} if log_version else {}
+        return content, 200, headers
     except FileNotFoundError as e:
         logging.error(
             f"File not found: {filename} in folder: {folder} for user: {username} - {str(e)}")
@@ -1,10 +1,26 @@
 import os
-from flask import Blueprint, request, jsonify, session, current_app
-from openai import OpenAI
-from pydub import AudioSegment
+import uuid
+import openai
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import Blueprint, request, jsonify, session, url_for
+from src.alignment import align_words
+from src.audio_formats import prepare_audio, run_audio_task, sniff_audio_format
+from src.jobs import job_queue
+from src.openai_clients import openai_clients
+from src.transcription_cache import transcription_cache
+from src.long_audio import LONG_AUDIO_BYTES, split_audio, stitch_segments
 
 openai_bp = Blueprint('openai', __name__)
 
+WHISPER_MODEL = "whisper-1"
+# Chunks of a long recording transcribed at the same time
+LONG_AUDIO_WORKERS = int(os.getenv('LONG_AUDIO_WORKERS', 4))
+LONG_AUDIO_SPLIT_TIMEOUT = 600
+
+# Failures of the OpenAI API worth retrying (network, rate limit, server errors)
+RETRYABLE_ERRORS = (openai.APIConnectionError,
+                    openai.RateLimitError, openai.InternalServerError)
+
 
 @openai_bp.route('/set_api_key', methods=['POST'])
 def set_api_key():
@@ -17,6 +33,27 @@ def set_api_key():
     return jsonify({'message': 'API key saved successfully'}), 200
 
 
+def get_job_owner():
+    """Jobs belong to the logged in user, or to the browser session otherwise."""
+    if session.get('username'):
+        return session['username']
+    if 'job_owner' not in session:
+        session['job_owner'] = uuid.uuid4().hex
+    return session['job_owner']
+
+
+def submit_audio_job(kind, audio_file, params):
+    """Queue audio for a background job and return the 202 response."""
+    params['filename'] = audio_file.filename or 'recording.mp3'
+    job_id = job_queue.submit(kind, get_job_owner(), params, payload=audio_file.read(),
+                              secrets={'api_key': session['OPENAI_API_KEY']})
+    return jsonify({
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': url_for('openai.job_status', job_id=job_id)
+    }), 202
+
+
 @openai_bp.route('/transcribe', methods=['POST'])
 def transcribe_audio():
     # Retrieve the API key from the session
@@ -28,33 +65,10 @@ def transcribe_audio():
     if not audio_file:
         return jsonify({'error': 'No audio file provided'}), 400
 
-    # Use configured upload folder instead of hardcoded 'uploads'
-    upload_folder = current_app.config.get('UPLOAD_FOLDER', 'uploads')
-    if not os.path.exists(upload_folder):
-        os.makedirs(upload_folder)
-    
-    audio_path = os.path.join(upload_folder, audio_file.filename)
-    audio_file.save(audio_path)
-
-    # Convert audio to a format supported by Whisper (if needed)
-    if not audio_path.endswith(".mp3"):
-        converted_audio_path = os.path.splitext(audio_path)[0] + ".mp3"
-        sound = AudioSegment.from_file(audio_path)
-        sound.export(converted_audio_path, format="mp3")
-        os.remove(audio_path)  # Remove original file
-        audio_path = converted_audio_path
-
-    try:
-        # Initialize OpenAI client with the user's API key
-        client = OpenAI(api_key=api_key)
-        with open(audio_path, "rb") as f:
-            transcription = client.audio.transcriptions.create(
-                model="whisper-1", file=f)
-
-        os.remove(audio_path)  # Clean up uploaded files
-        return jsonify({'transcription': transcription.text})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    # Long recordings are split and transcribed in parallel chunks
+    return submit_audio_job('transcribe', audio_file, {
+        'long_audio': request.form.get('mode') == 'long'
+    })
 
 
 @openai_bp.route('/evaluate_speaking', methods=['POST'])
@@ -73,186 +87,204 @@ def evaluate_speaking():
     if not reference_text:
         return jsonify({'error': 'No reference text provided'}), 400
 
-    # Use configured upload folder instead of hardcoded 'uploads'
-    upload_folder = current_app.config.get('UPLOAD_FOLDER', 'uploads')
-    if not os.path.exists(upload_folder):
-        os.makedirs(upload_folder)
+    return submit_audio_job('evaluate_speaking', audio_file, {
+        'reference_text': reference_text,
+        'language': language
+    })
 
-    # Save audio temporarily
-    audio_path = os.path.join(upload_folder, audio_file.filename)
-    audio_file.save(audio_path)
 
-    # Convert audio to a format supported by Whisper (if needed)
-    if not audio_path.endswith(".mp3"):
-        converted_audio_path = os.path.splitext(audio_path)[0] + ".mp3"
-        sound = AudioSegment.from_file(audio_path)
-        sound.export(converted_audio_path, format="mp3")
-        os.remove(audio_path)  # Remove original file
-        audio_path = converted_audio_path
+@openai_bp.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Report the progress of a transcription or evaluation job, with its result once done."""
+    job = job_queue.get(job_id, owner=get_job_owner())
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
 
+
+@openai_bp.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    status = job_queue.cancel(job_id, owner=get_job_owner())
+    if status is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'job_id': job_id, 'status': status})
+
+
+def transcribe(job, language=None):
+    """Transcribe the audio of a job with Whisper, reusing earlier results for the same audio."""
+    cache_key = transcription_cache.key(job.payload, WHISPER_MODEL, language)
+    cached = transcription_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    job.set_progress(0.1, 'Preparing audio')
+    filename, audio = prepare_audio(job.params['filename'], job.payload)
+
+    job.set_progress(0.3, 'Transcribing')
+    transcription = create_transcription(
+        job.secrets.get('api_key'), (filename, audio), language)
+    transcription_cache.put(cache_key, transcription.text)
+    return transcription.text
+
+
+def create_transcription(api_key, file, language=None, **options):
+    """Call Whisper with the pooled client of the user's API key."""
+    # Reusing the client keeps its connections alive between calls
+    client = openai_clients.get(api_key)
+    if language:
+        options['language'] = language
     try:
-        # Initialize OpenAI client with the user's API key
-        client = OpenAI(api_key=api_key)
-
-        # First, transcribe the audio
-        with open(audio_path, "rb") as f:
-            transcription_result = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=f,
-                language=language.split(
-                    '-')[0] if '-' in language else language
-            )
-
-        transcription = transcription_result.text
-
-        # Now evaluate pronunciation using GPT
-        # Create a manual evaluation instead of relying on GPT API
-        # This avoids potential format issues causing 400 errors
-
-        # Simple word-by-word analysis
-        original_words = reference_text.split()
-        transcribed_words = transcription.split()
-
-        word_analysis = []
-
-        # Compare words
-        for i in range(max(len(original_words), len(transcribed_words))):
-            if i < len(original_words) and i < len(transcribed_words):
-                # Both words exist
-                orig = original_words[i]
-                trans = transcribed_words[i]
-
-                if orig.lower() == trans.lower():
-                    status = "correct"
-                elif _calculate_similarity(orig.lower(), trans.lower()) > 0.7:
-                    status = "similar"
-                else:
-                    status = "incorrect"
-
-                word_analysis.append({
-                    "original": orig,
-                    "transcribed": trans,
-                    "status": status
-                })
-            elif i < len(original_words):
-                # Missing in transcription
-                word_analysis.append({
-                    "original": original_words[i],
-                    "transcribed": "",
-                    "status": "incorrect"
-                })
-            else:
-                # Extra in transcription
-                word_analysis.append({
-                    "original": "",
-                    "transcribed": transcribed_words[i],
-                    "status": "incorrect"
-                })
-
-        # Calculate scores
-        correct_count = sum(
-            1 for w in word_analysis if w["status"] == "correct")
-        similar_count = sum(
-            1 for w in word_analysis if w["status"] == "similar")
-        total_words = len(word_analysis)
-
-        # Simple scoring algorithm
-        accuracy_score = int((correct_count + 0.5 * similar_count) /
-                             total_words * 100) if total_words > 0 else 0
-        # Simplified fluency calculation
-        fluency_score = int(0.8 * accuracy_score + 10)
-        # Simplified pronunciation score
-        pronunciation_score = int(0.9 * accuracy_score + 5)
-
-        # Prepare feedback based on accuracy
-        if accuracy_score >= 90:
-            overall = "Excellent pronunciation! Your speech is very clear and accurate."
-            suggestions = [
-                "Continue practicing with more complex sentences",
-                "Work on maintaining natural intonation"
-            ]
-        elif accuracy_score >= 75:
-            overall = "Good pronunciation with minor errors. Keep practicing!"
-            suggestions = [
-                "Focus on words that were marked as similar or incorrect",
-                "Practice speaking at a natural pace"
-            ]
-        elif accuracy_score >= 50:
-            overall = "Fair pronunciation with some errors. More practice will help improve clarity."
-            suggestions = [
-                "Practice the words that were difficult to pronounce",
-                "Try speaking more slowly and clearly",
-                "Listen to native speakers pronouncing these words"
-            ]
-        else:
-            overall = "Your pronunciation needs improvement. Regular practice will help significantly."
-            suggestions = [
-                "Break down words into syllables for easier pronunciation",
-                "Start with shorter phrases before attempting longer sentences",
-                "Record yourself and compare with native speakers"
-            ]
-
-        # Prepare response
-        evaluation_data = {
-            "transcription": transcription,
-            "accuracy_score": accuracy_score,
-            "fluency_score": fluency_score,
-            "pronunciation_score": pronunciation_score,
-            "word_analysis": word_analysis,
-            "feedback": {
-                "overall": overall,
-                "suggestions": suggestions
-            }
+        return client.audio.transcriptions.create(model=WHISPER_MODEL, file=file, **options)
+    except openai.AuthenticationError:
+        openai_clients.discard(api_key)
+        raise
+
+
+def transcribe_chunk(api_key, chunk, language=None):
+    """Return the timed segments of one chunk of a long recording."""
+    cache_key = transcription_cache.key(chunk['audio'], f"{WHISPER_MODEL}:segments", language)
+    segments = transcription_cache.get(cache_key)
+    if segments is not None:
+        return segments
+
+    transcription = create_transcription(
+        api_key, ('chunk.mp3', chunk['audio']), language,
+        response_format='verbose_json', timestamp_granularities=['segment'])
+    segments = [{'start': segment.start, 'end': segment.end, 'text': segment.text.strip()}
+                for segment in (getattr(transcription, 'segments', None) or [])]
+    if not segments and transcription.text.strip():
+        segments = [{'start': 0, 'end': (chunk['end'] - chunk['start']) / 1000,
+                     'text': transcription.text.strip()}]
+    transcription_cache.put(cache_key, segments)
+    return segments
+
+
+def transcribe_long(job, language=None):
+    """Transcribe a long recording in overlapping chunks, several at a time.
+
+    The segments transcribed so far are published as the job's partial
+    result every time a chunk completes.
+    """
+    cache_key = transcription_cache.key(job.payload, f"{WHISPER_MODEL}:long", language)
+    cached = transcription_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    job.set_progress(0.05, 'Splitting audio')
+    audio_format = sniff_audio_format(job.payload) or \
+        os.path.splitext(job.params['filename'])[1][1:] or None
+    chunks = run_audio_task(split_audio, job.payload, audio_format,
+                            timeout=LONG_AUDIO_SPLIT_TIMEOUT)
+
+    api_key = job.secrets.get('api_key')
+    transcribed = {}
+    with ThreadPoolExecutor(max_workers=LONG_AUDIO_WORKERS) as executor:
+        futures = {executor.submit(transcribe_chunk, api_key, chunk, language): i
+                   for i, chunk in enumerate(chunks)}
+        try:
+            for future in as_completed(futures):
+                transcribed[futures[future]] = future.result()
+                segments = stitch_segments(
+                    (chunks[i], transcribed[i]) for i in sorted(transcribed))
+                job.set_progress(0.1 + 0.9 * len(transcribed) / len(chunks),
+                                 f"Transcribed {len(transcribed)} of {len(chunks)} chunks",
+                                 partial={'segments': segments, 'chunks_done': len(transcribed),
+                                          'chunks_total': len(chunks)})
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+    segments = stitch_segments((chunk, transcribed[i]) for i, chunk in enumerate(chunks))
+    result = {
+        'transcription': ' '.join(segment['text'] for segment in segments),
+        'segments': segments
+    }
+    transcription_cache.put(cache_key, result)
+    return result
+
+
+def run_transcription(job):
+    if job.params.get('long_audio') or len(job.payload) > LONG_AUDIO_BYTES:
+        return transcribe_long(job)
+    return {'transcription': transcribe(job)}
+
+
+def run_speaking_evaluation(job):
+    language = job.params['language']
+    transcription = transcribe(
+        job, language.split('-')[0] if '-' in language else language)
+    job.set_progress(0.9, 'Evaluating')
+    return evaluate_transcription(job.params['reference_text'], transcription)
+
+
+def evaluate_transcription(reference_text, transcription):
+    """Score a transcription against the text the user was asked to read."""
+    # A manual evaluation instead of relying on GPT API
+    # This avoids potential format issues causing 400 errors
+
+    # Word-by-word analysis, aligned so a skipped word does not shift the rest
+    word_analysis = align_words(reference_text.split(), transcription.split())
+
+    # Calculate scores
+    correct_count = sum(
+        1 for w in word_analysis if w["status"] == "correct")
+    similar_count = sum(
+        1 for w in word_analysis if w["status"] == "similar")
+    total_words = len(word_analysis)
+
+    # Simple scoring algorithm
+    accuracy_score = int((correct_count + 0.5 * similar_count) /
+                         total_words * 100) if total_words > 0 else 0
+    # Simplified fluency calculation
+    fluency_score = int(0.8 * accuracy_score + 10)
+    # Simplified pronunciation score
+    pronunciation_score = int(0.9 * accuracy_score + 5)
+
+    # Prepare feedback based on accuracy
+    if accuracy_score >= 90:
+        overall = "Excellent pronunciation! Your speech is very clear and accurate."
+        suggestions = [
+            "Continue practicing with more complex sentences",
+            "Work on maintaining natural intonation"
+        ]
+    elif accuracy_score >= 75:
+        overall = "Good pronunciation with minor errors. Keep practicing!"
+        suggestions = [
+            "Focus on words that were marked as similar or incorrect",
+            "Practice speaking at a natural pace"
+        ]
+    elif accuracy_score >= 50:
+        overall = "Fair pronunciation with some errors. More practice will help improve clarity."
+        suggestions = [
+            "Practice the words that were difficult to pronounce",
+            "Try speaking more slowly and clearly",
+            "Listen to native speakers pronouncing these words"
+        ]
+    else:
+        overall = "Your pronunciation needs improvement. Regular practice will help significantly."
+        suggestions = [
+            "Break down words into syllables for easier pronunciation",
+            "Start with shorter phrases before attempting longer sentences",
+            "Record yourself and compare with native speakers"
+        ]
+
+    # Prepare response
+    evaluation_data = {
+        "transcription": transcription,
+        "accuracy_score": accuracy_score,
+        "fluency_score": fluency_score,
+        "pronunciation_score": pronunciation_score,
+        "word_analysis": word_analysis,
+        "feedback": {
+            "overall": overall,
+            "suggestions": suggestions
         }
+    }
+
+    return evaluation_data
+
 
-        # Clean up uploaded files
-        os.remove(audio_path)
-
-        return jsonify(evaluation_data)
-
-    except Exception as e:
-        # Make sure to clean up even if there's an error
-        if os.path.exists(audio_path):
-            os.remove(audio_path)
-        return jsonify({
-            'error': str(e),
-            'transcription': 'Error processing your recording: ' + str(e)
-        }), 500
-
-# Helper function to calculate word similarity
-
-
-def _calculate_similarity(s1, s2):
-    """Calculate similarity between two strings using Levenshtein distance"""
-    if len(s1) == 0 or len(s2) == 0:
-        return 0.0
-
-    # Initialize matrix of zeros
-    rows = len(s1) + 1
-    cols = len(s2) + 1
-    distance = [[0 for _ in range(cols)] for _ in range(rows)]
-
-    # Populate matrix
-    for i in range(1, rows):
-        distance[i][0] = i
-    for j in range(1, cols):
-        distance[0][j] = j
-
-    for col in range(1, cols):
-        for row in range(1, rows):
-            if s1[row-1] == s2[col-1]:
-                cost = 0
-            else:
-                cost = 1
-            distance[row][col] = min(
-                distance[row-1][col] + 1,      # deletion
-                distance[row][col-1] + 1,      # insertion
-                distance[row-1][col-1] + cost  # substitution
-            )
-
-    # Calculate the similarity ratio
-    max_len = max(len(s1), len(s2))
-    similarity = 1.0 - (distance[rows-1][cols-1] /
-                        max_len if max_len > 0 else 0)
-
-    return similarity
+job_queue.register('transcribe', run_transcription, retry_on=RETRYABLE_ERRORS)
+job_queue.register('evaluate_speaking', run_speaking_evaluation,
+                   retry_on=RETRYABLE_ERRORS)
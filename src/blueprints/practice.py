@@ -1,14 +1,19 @@
 from flask import Blueprint, render_template, jsonify, request, session
-from src.utils import open_md_file, list_md_files, list_user_folders, get_user_folder_dir, save_file
+from src.utils import open_md_file, list_md_files, list_user_folders, save_file, buffer_file_write, load_lesson
+from src.highlighter import highlight, highlight_many
+from src.lessons import make_cloze_item, make_quiz_item, sample_cloze_items, sample_quiz_items
 from .auth import login_required
 import logging
 import re
 import json
 import random
-from ..gcs_utils import gcs_client
 
 practice_bp = Blueprint('practice', __name__)
 
+# Items returned by the batch cloze/quiz endpoints
+DEFAULT_BATCH_SIZE = 10
+MAX_BATCH_SIZE = 50
+
 
 @practice_bp.route('/')
 @login_required
@@ -34,18 +39,14 @@ def load_text():
         if content is None:
             return jsonify({'error': f"File '{filename}' not found"}), 404
 
-        # Parse markdown table to extract Target Language and Native Language sentences
-        sentences = parse_markdown_table(content)
-
-        # Extract keywords from Target Language sentences
-        target_lang_text = ' '.join([s['target_lang'] for s in sentences])
-        keywords = extract_keywords(target_lang_text)
+        # Sentence pairs and keywords of the Target Language table
+        lesson = load_lesson(filename, username, folder, content=content)
 
         # Structure response
         response = {
             # List of {'target_lang': ..., 'native_lang': ...}
-            'sentences': sentences,
-            'keywords': keywords,
+            'sentences': lesson['sentences'],
+            'keywords': lesson['keywords'],
             'content': content
         }
         logging.info(
@@ -60,20 +61,21 @@ def load_text():
 @practice_bp.route('/highlight_keywords', methods=['POST'])
 @login_required
 def highlight_keywords():
-    """Highlight keywords in the provided Target Language sentence."""
+    """Highlight keywords in the provided Target Language sentence, or in a list of sentences."""
     data = request.get_json()
     sentence = data.get('sentence', '')
+    sentences = data.get('sentences')
     keywords = data.get('keywords', [])
 
+    if sentences is not None:
+        if not isinstance(sentences, list) or not keywords:
+            return jsonify({'error': 'Sentences and keywords are required'}), 400
+        return jsonify({'highlighted': highlight_many(sentences, keywords)})
+
     if not sentence or not keywords:
         return jsonify({'error': 'Sentence and keywords are required'}), 400
 
-    highlighted = sentence
-    for keyword in keywords:
-        highlighted = re.sub(r'\b' + re.escape(keyword) + r'\b',
-                             f'<strong>{keyword}</strong>', highlighted, flags=re.IGNORECASE)
-
-    return jsonify({'highlighted': highlighted})
+    return jsonify({'highlighted': highlight(sentence, keywords)})
 
 
 @practice_bp.route('/cloze_test')
@@ -88,38 +90,60 @@ def cloze_test():
         return jsonify({'error': 'No filename provided'}), 400
 
     try:
-        content = open_md_file(filename, username, folder)
-        if content is None:
-            return jsonify({'error': f"File '{filename}' not found"}), 404
-
-        sentences = parse_markdown_table(content)
-        if not sentences:
+        lesson = load_lesson(filename, username, folder)
+        if not lesson['sentences']:
             return jsonify({'error': 'No sentences found'}), 400
-
-        selected_sentence = random.choice(sentences)
-        target_lang_sentence = selected_sentence['target_lang']
-        words = target_lang_sentence.split()
-        if len(words) < 3:
+        if not lesson['cloze_candidates']:
             return jsonify({'error': 'Sentence too short for cloze test'}), 400
 
-        # Randomly select a word to hide
-        hide_index = random.randint(0, len(words) - 1)
-        correct_word = words[hide_index]
-        words[hide_index] = '_____'
-        cloze_sentence = ' '.join(words)
-
-        return jsonify({
-            'sentence': cloze_sentence,
-            'correct_word': correct_word,
-            'original': target_lang_sentence,
-            'native_lang': selected_sentence['native_lang']
-        })
+        selected_sentence = lesson['sentences'][random.choice(
+            lesson['cloze_candidates'])]
+        return jsonify(make_cloze_item(selected_sentence))
+    except FileNotFoundError:
+        return jsonify({'error': f"File '{filename}' not found"}), 404
     except Exception as e:
         logging.error(
             f"Error generating cloze test for user {username}: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
+def get_batch_args():
+    """Read count and optional seed of a batch request; returns (count, rng) or raises ValueError."""
+    count = int(request.args.get('count', DEFAULT_BATCH_SIZE))
+    if count < 1:
+        raise ValueError('count must be positive')
+    seed = request.args.get('seed')
+    return min(count, MAX_BATCH_SIZE), random.Random(seed)
+
+
+@practice_bp.route('/cloze_tests')
+@login_required
+def cloze_tests():
+    """Generate a drill of unique cloze tests in one response."""
+    username = session.get('username')
+    filename = request.args.get('filename')
+    folder = request.args.get('folder', '')
+
+    if not filename:
+        return jsonify({'error': 'No filename provided'}), 400
+    try:
+        count, rng = get_batch_args()
+    except ValueError:
+        return jsonify({'error': 'Invalid count'}), 400
+
+    try:
+        lesson = load_lesson(filename, username, folder)
+        if not lesson['sentences']:
+            return jsonify({'error': 'No sentences found'}), 400
+        return jsonify({'items': sample_cloze_items(lesson, count, rng)})
+    except FileNotFoundError:
+        return jsonify({'error': f"File '{filename}' not found"}), 404
+    except Exception as e:
+        logging.error(
+            f"Error generating cloze tests for user {username}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
 @practice_bp.route('/progress', methods=['POST'])
 @login_required
 def save_progress():
@@ -138,7 +162,8 @@ def save_progress():
 
     try:
         progress_filename = f"{filename}_progress.json"
-        save_file(progress_filename, json.dumps(
+        # The client sends the whole progress, so this is a blind overwrite
+        buffer_file_write(progress_filename, json.dumps(
             progress, indent=4), username, folder)
         logging.info(
             f"Progress saved for {filename} in folder {folder or 'root'} for user {username}")
@@ -172,69 +197,6 @@ def load_progress():
         return jsonify({'progress': {}})
 
 
-def parse_markdown_table(content):
-    """Parse markdown table into a list of {'target_lang': ..., 'native_lang': ...} using basic string manipulation."""
-    sentences = []
-    lines = content.splitlines()
-    in_table = False
-    header_processed = False
-
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-
-        # Detect table start
-        if line.startswith('|') and 'Target Language' in line and 'Native Language' in line:
-            in_table = True
-            header_processed = False
-            continue
-
-        # Process table rows
-        if in_table and line.startswith('|'):
-            if not header_processed and '---' in line:
-                header_processed = True
-                continue
-
-            # Split row into columns
-            columns = [col.strip() for col in line.strip('|').split('|')]
-            if len(columns) >= 2:
-                target_lang = columns[0]
-                native_lang = columns[1]
-                # Split into sentences using a simple regex
-                target_lang_sentences = re.split(
-                    r'(?<=[.!?])\s+', target_lang.strip())
-                native_lang_sentences = re.split(
-                    r'(?<=[.!?])\s+', native_lang.strip())
-                # Pair sentences (handle mismatched lengths)
-                max_len = max(len(target_lang_sentences),
-                              len(native_lang_sentences))
-                target_lang_sentences.extend(
-                    [''] * (max_len - len(target_lang_sentences)))
-                native_lang_sentences.extend(
-                    [''] * (max_len - len(native_lang_sentences)))
-                for t, n in zip(target_lang_sentences, native_lang_sentences):
-                    if t or n:  # Only include non-empty pairs
-                        sentences.append(
-                            {'target_lang': t.strip(), 'native_lang': n.strip()})
-
-    if not sentences:
-        logging.warning(
-            "No valid table or sentences found in markdown content")
-
-    return sentences
-
-
-def extract_keywords(text):
-    """Extract keywords from Target Language text."""
-    words = text.split()
-    common_keywords = ['Inge', 'Paula', 'Alex', 'Den Haag',
-                       'Rotterdam', 'Frankrijk', 'China', 'Marktstraat']
-    keywords = [
-        word for word in words if word in common_keywords or word.istitle()]
-    return list(set(keywords))  # Remove duplicates
-
-
 @practice_bp.route('/vocabulary', methods=['POST'])
 @login_required
 def vocabulary():
@@ -264,17 +226,15 @@ def translate():
         return jsonify({'error': 'Sentence and filename are required'}), 400
 
     try:
-        content = open_md_file(filename, username, folder)
-        if content is None:
-            return jsonify({'error': f"File '{filename}' not found"}), 404
-        sentences = parse_markdown_table(content)
-        for s in sentences:
-            if s['target_lang'] == sentence:
-                return jsonify({
-                    'sentence': sentence,
-                    'translation': s['native_lang']
-                })
+        translations = load_lesson(filename, username, folder)['translations']
+        if sentence in translations:
+            return jsonify({
+                'sentence': sentence,
+                'translation': translations[sentence]
+            })
         return jsonify({'error': 'Sentence not found'}), 404
+    except FileNotFoundError:
+        return jsonify({'error': f"File '{filename}' not found"}), 404
     except Exception as e:
         logging.error(
             f"Error translating sentence for user {username}: {str(e)}")
@@ -293,39 +253,46 @@ def quiz():
         return jsonify({'error': 'No filename provided'}), 400
 
     try:
-        content = open_md_file(filename, username, folder)
-        if content is None:
-            return jsonify({'error': f"File '{filename}' not found"}), 404
-        sentences = parse_markdown_table(content)
+        sentences = load_lesson(filename, username, folder)['sentences']
         if not sentences:
             return jsonify({'error': 'No sentences found'}), 400
 
-        # Select a random sentence
-        selected = random.choice(sentences)
-        question = selected['target_lang']
-        correct_answer = selected['native_lang']
-
-        # Generate distractors (placeholder: use other Native Language translations)
-        distractors = [s['native_lang'] for s in random.sample(
-            sentences, min(3, len(sentences))) if s['native_lang'] != correct_answer]
-        while len(distractors) < 3:
-            distractors.append("Incorrect option")
-        distractors = distractors[:3]
-
-        # Shuffle answers
-        answers = [correct_answer] + distractors
-        random.shuffle(answers)
-
-        return jsonify({
-            'question': question,
-            'answers': answers,
-            'correct_answer': correct_answer
-        })
+        # Distractors are other Native Language translations (placeholder)
+        return jsonify(make_quiz_item(random.choice(sentences), sentences))
+    except FileNotFoundError:
+        return jsonify({'error': f"File '{filename}' not found"}), 404
     except Exception as e:
         logging.error(f"Error generating quiz for user {username}: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
+@practice_bp.route('/quizzes', methods=['GET'])
+@login_required
+def quizzes():
+    """Generate a drill of unique multiple-choice questions in one response."""
+    username = session.get('username')
+    filename = request.args.get('filename')
+    folder = request.args.get('folder', '')
+
+    if not filename:
+        return jsonify({'error': 'No filename provided'}), 400
+    try:
+        count, rng = get_batch_args()
+    except ValueError:
+        return jsonify({'error': 'Invalid count'}), 400
+
+    try:
+        lesson = load_lesson(filename, username, folder)
+        if not lesson['sentences']:
+            return jsonify({'error': 'No sentences found'}), 400
+        return jsonify({'items': sample_quiz_items(lesson, count, rng)})
+    except FileNotFoundError:
+        return jsonify({'error': f"File '{filename}' not found"}), 404
+    except Exception as e:
+        logging.error(f"Error generating quizzes for user {username}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
 @practice_bp.route('/folders')
 @login_required
 def list_folders():
@@ -7,60 +7,10 @@ import logging
 import re
 import base64
 from datetime import datetime
-import json
-import os
-from src.utils import ARTIFACTS_DIR
-from src.gcs_utils import gcs_client
-import uuid
+from src.utils import write_notification
 
 profile_bp = Blueprint('profile', __name__)
 
-# Notifications file path
-NOTIFICATIONS_FILE = os.path.join(ARTIFACTS_DIR, 'notifications.json')
-
-# Helper functions for notifications
-
-
-def read_notifications():
-    """Read notifications from notifications.json, supporting both local and GCS storage."""
-    if gcs_client.enabled:
-        try:
-            content = gcs_client.read_file('artifacts/notifications.json')
-            if content:
-                return json.loads(content)
-            return []
-        except Exception as e:
-            logging.error(f"Error reading notifications from GCS: {str(e)}")
-            return []
-    try:
-        if os.path.exists(NOTIFICATIONS_FILE):
-            with open(NOTIFICATIONS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return []
-    except Exception as e:
-        logging.error(f"Error reading notifications from local file: {str(e)}")
-        return []
-
-
-def write_notification(notification):
-    try:
-        notifications = read_notifications()
-        # Assign a unique id if not already present
-        if 'id' not in notification:
-            notification['id'] = str(uuid.uuid4().int >> 64)  # Store as string
-        notifications.append(notification)
-        content = json.dumps(notifications, indent=2)
-        if gcs_client.enabled:
-            gcs_client.write_file('artifacts/notifications.json', content)
-        else:
-            with open(NOTIFICATIONS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(notifications, f, indent=2)
-        logging.info(f"Notification added: {notification['details']}")
-    except Exception as e:
-        logging.error(f"Error writing notification: {str(e)}")
-        raise
-
-
 def is_valid_email(email):
     """Validate email format."""
     email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
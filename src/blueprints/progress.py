@@ -2,11 +2,9 @@ from flask import Blueprint, jsonify, request, session
 import json
 import logging
 import random
-import re
-import difflib
 from .auth import login_required
-from ..utils import get_user_artifacts_dir, open_md_file, save_file
-from ..gcs_utils import gcs_client
+from ..utils import open_md_file, buffer_json_update, load_lesson
+from ..scoring import score_answers
 
 progress_bp = Blueprint('progress', __name__)
 
@@ -34,11 +32,14 @@ def load_progress(username):
         return {}
 
 
-def save_progress(username, progress_data):
-    """Saves learning progress to the JSON file for a specific user."""
+def update_progress(username, update):
+    """Applies update to the learning progress of a specific user and saves it.
+
+    The update is buffered (see buffer_json_update) and applied on top of the
+    stored progress when the buffer is flushed.
+    """
     try:
-        save_file(get_progress_file(username), json.dumps(
-            progress_data, indent=4), username, '')
+        buffer_json_update(get_progress_file(username), username, update)
         logging.info(
             f"Learning progress saved successfully for user {username}.")
     except Exception as e:
@@ -100,14 +101,16 @@ def save_lesson_progress(folder, lesson_name):
         return jsonify({'error': 'No test data provided'}), 400
 
     try:
-        progress = load_progress(username)
         # Store progress with folder prefix
         lesson_key = f"{folder}/{lesson_name}"
-        if lesson_key not in progress:
-            progress[lesson_key] = {'tests': []}
 
-        progress[lesson_key]['tests'].append(data['test'])
-        save_progress(username, progress)
+        def add_test(progress):
+            if lesson_key not in progress:
+                progress[lesson_key] = {'tests': []}
+            progress[lesson_key]['tests'].append(data['test'])
+            return progress
+
+        update_progress(username, add_test)
         logging.info(
             f"Test result saved for lesson '{lesson_key}' for user {username}.")
         return jsonify({'message': f'Test result saved for lesson {lesson_name}'}), 200
@@ -117,81 +120,6 @@ def save_lesson_progress(folder, lesson_name):
         return jsonify({'error': str(e)}), 500
 
 
-def evaluate_answer(user_answer, correct_answer):
-    """Evaluate an answer with partial scoring based on word correctness and order."""
-    if not user_answer:
-        return 0, "No answer provided"
-
-    # Handle exact match case
-    if user_answer.lower() == correct_answer.lower():
-        return 10, "Perfect!"
-
-    # Clean up answers for comparison
-    user_words = re.findall(r'\b\w+\b', user_answer.lower())
-    correct_words = re.findall(r'\b\w+\b', correct_answer.lower())
-
-    # Count correctly spelled words that appear in the answer
-    correct_word_count = 0
-    feedback_details = []
-
-    # Check which words are present in the answer
-    for word in correct_words:
-        if word in user_words:
-            correct_word_count += 1
-            user_words.remove(word)  # Remove to prevent double counting
-        else:
-            # Look for close matches to catch spelling errors
-            close_matches = difflib.get_close_matches(
-                word, user_words, n=1, cutoff=0.8)
-            if close_matches:
-                correct_word_count += 0.5  # Partial credit for close matches
-                feedback_details.append(
-                    f"'{close_matches[0]}' should be '{word}'")
-                # Remove to prevent double counting
-                user_words.remove(close_matches[0])
-            else:
-                feedback_details.append(f"Missing word: '{word}'")
-
-    # Check for extra words in user answer
-    for word in user_words:
-        feedback_details.append(f"Extra word: '{word}'")
-
-    # Calculate score based on word accuracy (max 8 points)
-    word_score = min(8, round((correct_word_count / len(correct_words)) * 8))
-
-    # Check word order using sequence matcher (max 2 points)
-    order_score = 0
-    if word_score > 0:
-        seq_matcher = difflib.SequenceMatcher(None,
-                                              user_answer.lower(),
-                                              correct_answer.lower())
-        ratio = seq_matcher.ratio()
-        order_score = round(ratio * 2)  # Up to 2 points for correct order
-
-    total_score = word_score + order_score
-
-    # Generate feedback
-    if total_score >= 9:
-        feedback = "Almost perfect! Minor issues with spelling or word order."
-    elif total_score >= 7:
-        feedback = "Good attempt! Most words correct but some issues."
-    elif total_score >= 5:
-        feedback = "Partial credit. Some correct words but needs improvement."
-    elif total_score > 0:
-        feedback = "Few correct words but significant errors."
-    else:
-        feedback = "Completely incorrect answer."
-
-    # Add specific feedback if available
-    if feedback_details:
-        # Limit to 3 specific issues
-        feedback += " " + " ".join(feedback_details[:3])
-        if len(feedback_details) > 3:
-            feedback += " and other issues."
-
-    return total_score, feedback
-
-
 @progress_bp.route('/evaluate_test/<folder>/<lesson_name>', methods=['POST'])
 @login_required
 def evaluate_test(folder, lesson_name):
@@ -210,14 +138,13 @@ def evaluate_test(folder, lesson_name):
         total_points = 0
         total_possible = 0
 
-        # Evaluate each answer
-        for question in test_data['questions']:
-            user_answer = question.get('user_answer', '')
-            correct_answer = question.get('dutch', '')
-            max_points = question.get('max_points', 10)
+        # Evaluate every answer in one batch
+        questions = test_data['questions']
+        results = score_answers(
+            (question.get('user_answer', ''), question.get('dutch', '')) for question in questions)
 
-            # Evaluate the answer to get points and feedback
-            points, feedback = evaluate_answer(user_answer, correct_answer)
+        for question, (points, feedback) in zip(questions, results):
+            max_points = question.get('max_points', 10)
 
             # Update question with evaluation results
             question['points'] = points
@@ -253,38 +180,11 @@ def generate_test(folder, lesson_name):
     logging.info(
         f"Generating test for user: {username}, folder: {folder}, lesson: {lesson_name}")
     try:
-        lesson_content = open_md_file(lesson_name, username, folder)
-        if lesson_content is None:
-            logging.error(
-                f"Lesson file '{lesson_name}' not found in folder '{folder}' for user {username}")
-            return jsonify({'error': 'Lesson file not found'}), 404
-
-        sentences = []
-        table_section = re.search(
-            r'\| Dutch \| English \|\n\|[-| ]+\|[-| ]+\|\n(.*?)(?=\n\n|\Z)', lesson_content, re.DOTALL)
-        if not table_section:
+        sentences = load_lesson(lesson_name, username, folder)['test_pairs']
+        if not sentences:
             logging.error(
                 f"No valid table found in lesson file '{lesson_name}'")
             return jsonify({'questions': []}), 200
-
-        logging.info(f"Table section found:\n{table_section.group(1)}")
-        table_rows = table_section.group(1).strip().split('\n')
-        logging.info(f"Found {len(table_rows)} table rows")
-
-        for row in table_rows:
-            columns = [col.strip() for col in row.split('|')[1:3]]
-            if len(columns) != 2:
-                logging.warning(f"Invalid row format: {row}")
-                continue
-            dutch, english = columns
-            dutch_sentences = [s.strip()
-                               for s in re.split(r'[.!?]+', dutch) if s.strip()]
-            english_sentences = [s.strip() for s in re.split(
-                r'[.!?]+', english) if s.strip()]
-            for i in range(min(len(dutch_sentences), len(english_sentences))):
-                sentences.append(
-                    {'dutch': dutch_sentences[i], 'english': english_sentences[i]})
-
         logging.info(f"Extracted {len(sentences)} sentence pairs")
 
         if len(sentences) > 10:
@@ -296,6 +196,10 @@ def generate_test(folder, lesson_name):
         logging.info(
             f"Generated test with {len(selected_sentences)} sentences for lesson '{lesson_name}'")
         return jsonify(test_data)
+    except FileNotFoundError:
+        logging.error(
+            f"Lesson file '{lesson_name}' not found in folder '{folder}' for user {username}")
+        return jsonify({'error': 'Lesson file not found'}), 404
     except Exception as e:
         logging.error(
             f"Error generating test for lesson '{lesson_name}' in folder '{folder}': {str(e)}")
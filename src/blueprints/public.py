@@ -1,17 +1,22 @@
 from flask import Blueprint, render_template, jsonify, request, session, abort
-from src.utils import save_file, open_md_file, ensure_published_dir, PUBLISH_DIR_LOCAL, PUBLISH_DIR_GCS
+from src.utils import save_file, open_md_file, ensure_published_dir, read_storage_json, write_storage_json, PUBLISH_DIR
 from src.models import User
 from .auth import login_required
-from src.gcs_utils import gcs_client
-import os
+from src.storage import storage, join_path
 import logging
 import uuid
-import glob
 import json
 from datetime import datetime
 
 public_bp = Blueprint('public', __name__)
 
+PUBLISHED_SUFFIXES = ('.md', '.meta', '.permissions.json', '.comments.json')
+
+
+def get_published_path(public_id, suffix):
+    """Return the storage key of a published file or one of its sidecars."""
+    return join_path(PUBLISH_DIR, f"{public_id}{suffix}")
+
 
 @public_bp.route('/publish', methods=['POST'])
 @login_required
@@ -44,45 +49,17 @@ def publish_file():
         ensure_published_dir()
 
         public_id = str(uuid.uuid4())
-        public_filename = f"{public_id}.md"
-        metadata_filename = f"{public_id}.meta"
-        permissions_filename = f"{public_id}.permissions.json"
-        comments_filename = f"{public_id}.comments.json"
-
-        if gcs_client.enabled:
-            public_path = f"{PUBLISH_DIR_GCS}/{public_filename}"
-            metadata_path = f"{PUBLISH_DIR_GCS}/{metadata_filename}"
-            permissions_path = f"{PUBLISH_DIR_GCS}/{permissions_filename}"
-            comments_path = f"{PUBLISH_DIR_GCS}/{comments_filename}"
-            gcs_client.write_file(public_path, content)
-            gcs_client.write_file(metadata_path, json.dumps({
-                'display_filename': display_filename,
-                'display_username': display_username,
-                'owner_username': username,
-                'tags': tags  # Store tags in metadata
-            }))
-            gcs_client.write_file(permissions_path, json.dumps([]))
-            gcs_client.write_file(comments_path, json.dumps([]))
-        else:
-            public_path = os.path.join(PUBLISH_DIR_LOCAL, public_filename)
-            metadata_path = os.path.join(PUBLISH_DIR_LOCAL, metadata_filename)
-            permissions_path = os.path.join(
-                PUBLISH_DIR_LOCAL, permissions_filename)
-            comments_path = os.path.join(PUBLISH_DIR_LOCAL, comments_filename)
-            os.makedirs(PUBLISH_DIR_LOCAL, exist_ok=True)
-            with open(public_path, 'w', encoding='utf-8') as f:
-                f.write(content)
-            with open(metadata_path, 'w', encoding='utf-8') as f:
-                json.dump({
-                    'display_filename': display_filename,
-                    'display_username': display_username,
-                    'owner_username': username,
-                    'tags': tags  # Store tags in metadata
-                }, f)
-            with open(permissions_path, 'w', encoding='utf-8') as f:
-                json.dump([], f)
-            with open(comments_path, 'w', encoding='utf-8') as f:
-                json.dump([], f)
+        storage.write(get_published_path(public_id, '.md'), content)
+        write_storage_json(get_published_path(public_id, '.meta'), {
+            'display_filename': display_filename,
+            'display_username': display_username,
+            'owner_username': username,
+            'tags': tags  # Store tags in metadata
+        }, indent=None)
+        write_storage_json(get_published_path(
+            public_id, '.permissions.json'), [], indent=None)
+        write_storage_json(get_published_path(
+            public_id, '.comments.json'), [], indent=None)
 
         public_url = f"/public/view/{public_id}"
         logging.info(
@@ -109,24 +86,15 @@ def edit_file(public_id):
         return jsonify({'success': False, 'error': 'Content is required'}), 400
 
     try:
-        metadata_path = f"{PUBLISH_DIR_GCS}/{public_id}.meta" if gcs_client.enabled else os.path.join(
-            PUBLISH_DIR_LOCAL, f"{public_id}.meta")
-        permissions_path = f"{PUBLISH_DIR_GCS}/{public_id}.permissions.json" if gcs_client.enabled else os.path.join(
-            PUBLISH_DIR_LOCAL, f"{public_id}.permissions.json")
+        metadata_path = get_published_path(public_id, '.meta')
+        permissions_path = get_published_path(public_id, '.permissions.json')
 
         # Read metadata
-        if gcs_client.enabled:
-            metadata_content = gcs_client.read_file(metadata_path)
-            permissions_content = gcs_client.read_file(permissions_path)
-        else:
-            with open(metadata_path, 'r', encoding='utf-8') as f:
-                metadata_content = f.read()
-            with open(permissions_path, 'r', encoding='utf-8') as f:
-                permissions_content = f.read()
-
+        metadata_content = storage.read(metadata_path)
+        if metadata_content is None:
+            raise FileNotFoundError(f"Metadata for {public_id} not found")
         metadata = json.loads(metadata_content)
-        permitted_users = json.loads(
-            permissions_content) if permissions_content else []
+        permitted_users = read_storage_json(permissions_path, [])
         owner_username = metadata.get('owner_username')
 
         # Check if user is owner or has edit permission
@@ -136,20 +104,10 @@ def edit_file(public_id):
             return jsonify({'success': False, 'error': 'Unauthorized'}), 403
 
         # Update file content
-        public_path = f"{PUBLISH_DIR_GCS}/{public_id}.md" if gcs_client.enabled else os.path.join(
-            PUBLISH_DIR_LOCAL, f"{public_id}.md")
-        if gcs_client.enabled:
-            gcs_client.write_file(public_path, content)
-            # Update metadata with new tags
-            metadata['tags'] = tags
-            gcs_client.write_file(metadata_path, json.dumps(metadata))
-        else:
-            with open(public_path, 'w', encoding='utf-8') as f:
-                f.write(content)
-            # Update metadata with new tags
-            metadata['tags'] = tags
-            with open(metadata_path, 'w', encoding='utf-8') as f:
-                json.dump(metadata, f)
+        storage.write(get_published_path(public_id, '.md'), content)
+        # Update metadata with new tags
+        metadata['tags'] = tags
+        write_storage_json(metadata_path, metadata, indent=None)
 
         logging.info(
             f"File {public_id} edited by user {username}, updated tags: {tags}")
@@ -165,68 +123,21 @@ def unpublish_file(public_id):
     username = session.get('username')
 
     try:
-        public_filename = f"{public_id}.md"
-        metadata_filename = f"{public_id}.meta"
-        permissions_filename = f"{public_id}.permissions.json"
-        comments_filename = f"{public_id}.comments.json"
-
-        if gcs_client.enabled:
-            public_path = f"{PUBLISH_DIR_GCS}/{public_filename}"
-            metadata_path = f"{PUBLISH_DIR_GCS}/{metadata_filename}"
-            permissions_path = f"{PUBLISH_DIR_GCS}/{permissions_filename}"
-            comments_path = f"{PUBLISH_DIR_GCS}/{comments_filename}"
-            public_blob = gcs_client.bucket.blob(public_path)
-            metadata_blob = gcs_client.bucket.blob(metadata_path)
-            permissions_blob = gcs_client.bucket.blob(permissions_path)
-            comments_blob = gcs_client.bucket.blob(comments_path)
-
-            if not public_blob.exists():
-                logging.error(f"Public file {public_id} not found in GCS")
-                return jsonify({'success': False, 'error': 'File not found'}), 404
-
-            metadata_content = gcs_client.read_file(metadata_path)
-            if metadata_content:
-                metadata = json.loads(metadata_content)
-                owner_username = metadata.get('owner_username', 'Unknown')
-                if owner_username != username:
-                    logging.warning(
-                        f"User {username} attempted to unpublish file {public_id} owned by {owner_username}")
-                    return jsonify({'success': False, 'error': 'You are not authorized to unpublish this file'}), 403
-
-            public_blob.delete()
-            if metadata_blob.exists():
-                metadata_blob.delete()
-            if permissions_blob.exists():
-                permissions_blob.delete()
-            if comments_blob.exists():
-                comments_blob.delete()
-        else:
-            public_path = os.path.join(PUBLISH_DIR_LOCAL, public_filename)
-            metadata_path = os.path.join(PUBLISH_DIR_LOCAL, metadata_filename)
-            permissions_path = os.path.join(
-                PUBLISH_DIR_LOCAL, permissions_filename)
-            comments_path = os.path.join(PUBLISH_DIR_LOCAL, comments_filename)
-
-            if not os.path.exists(public_path):
-                logging.error(f"Public file {public_id} not found")
-                return jsonify({'success': False, 'error': 'File not found'}), 404
-
-            if os.path.exists(metadata_path):
-                with open(metadata_path, 'r', encoding='utf-8') as f:
-                    metadata = json.load(f)
-                    owner_username = metadata.get('owner_username', 'Unknown')
-                    if owner_username != username:
-                        logging.warning(
-                            f"User {username} attempted to unpublish file {public_id} owned by {owner_username}")
-                        return jsonify({'success': False, 'error': 'You are not authorized to unpublish this file'}), 403
-
-            os.remove(public_path)
-            if os.path.exists(metadata_path):
-                os.remove(metadata_path)
-            if os.path.exists(permissions_path):
-                os.remove(permissions_path)
-            if os.path.exists(comments_path):
-                os.remove(comments_path)
+        public_path = get_published_path(public_id, '.md')
+        if not storage.exists(public_path):
+            logging.error(f"Public file {public_id} not found")
+            return jsonify({'success': False, 'error': 'File not found'}), 404
+
+        metadata = read_storage_json(get_published_path(public_id, '.meta'))
+        if metadata:
+            owner_username = metadata.get('owner_username', 'Unknown')
+            if owner_username != username:
+                logging.warning(
+                    f"User {username} attempted to unpublish file {public_id} owned by {owner_username}")
+                return jsonify({'success': False, 'error': 'You are not authorized to unpublish this file'}), 403
+
+        storage.delete_many(get_published_path(public_id, suffix)
+                            for suffix in PUBLISHED_SUFFIXES)
 
         logging.info(f"File {public_id} unpublished by user {username}")
         return jsonify({'success': True, 'message': 'File unpublished successfully'})
@@ -248,16 +159,9 @@ def clear_public_files():
         return jsonify({'success': False, 'error': 'Admin access required to clear public files'}), 403
 
     try:
-        if gcs_client.enabled:
-            blobs = gcs_client.client.list_blobs(
-                gcs_client.bucket, prefix=f"{PUBLISH_DIR_GCS}/")
-            for blob in blobs:
-                if blob.name.endswith(('.md', '.meta', '.permissions.json', '.comments.json')):
-                    blob.delete()
-        else:
-            for ext in ('*.md', '*.meta', '*.permissions.json', '*.comments.json'):
-                for file_path in glob.glob(os.path.join(PUBLISH_DIR_LOCAL, ext)):
-                    os.remove(file_path)
+        objects, _ = storage.list(f"{PUBLISH_DIR}/")
+        storage.delete_many(obj.name for obj in objects
+                            if obj.name.endswith(PUBLISHED_SUFFIXES))
 
         logging.info(f"All public files cleared by admin {username}")
         return jsonify({'success': True, 'message': 'All public files cleared successfully'})
@@ -272,62 +176,20 @@ def list_public_files():
     try:
         ensure_published_dir()
         files = []
-        if gcs_client.enabled:
-            blobs = gcs_client.client.list_blobs(
-                gcs_client.bucket, prefix=f"{PUBLISH_DIR_GCS}/")
-            md_files = {os.path.splitext(os.path.basename(blob.name))[
-                0] for blob in blobs if blob.name.endswith('.md')}
-            for public_id in md_files:
-                metadata_path = f"{PUBLISH_DIR_GCS}/{public_id}.meta"
-                public_path = f"{PUBLISH_DIR_GCS}/{public_id}.md"
-                display_filename = public_id
-                display_username = 'Unknown'
-                tags = []
-                content = gcs_client.read_file(public_path) or ''
-                metadata_content = gcs_client.read_file(metadata_path)
-                if metadata_content:
-                    try:
-                        metadata = json.loads(metadata_content)
-                        display_filename = metadata.get(
-                            'display_filename', public_id)
-                        display_username = metadata.get(
-                            'display_username', 'Unknown')
-                        tags = metadata.get('tags', [])
-                    except json.JSONDecodeError:
-                        logging.error(
-                            f"Invalid metadata JSON for {metadata_path}")
-                files.append({
-                    'public_id': public_id,
-                    'display_filename': display_filename,
-                    'display_username': display_username,
-                    'tags': tags,
-                    'content': content  # Include content for search
-                })
-        else:
-            for file_path in glob.glob(os.path.join(PUBLISH_DIR_LOCAL, '*.md')):
-                public_id = os.path.splitext(os.path.basename(file_path))[0]
-                metadata_path = os.path.join(
-                    PUBLISH_DIR_LOCAL, f"{public_id}.meta")
-                display_filename = public_id
-                display_username = 'Unknown'
-                tags = []
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                if os.path.exists(metadata_path):
-                    with open(metadata_path, 'r', encoding='utf-8') as f:
-                        metadata = json.load(f)
-                        display_filename = metadata.get(
-                            'display_filename', public_id)
-                        display_username = metadata.get(
-                            'display_username', 'Unknown')
-                        tags = metadata.get('tags', [])
-                files.append({
-                    'public_id': public_id,
-                    'display_filename': display_filename,
-                    'display_username': display_username,
-                    'tags': tags,
-                    'content': content  # Include content for search
-                })
+        objects, _ = storage.list(f"{PUBLISH_DIR}/", delimiter='/')
+        md_files = {obj.name.rsplit('/', 1)[-1][:-len('.md')]
+                    for obj in objects if obj.name.endswith('.md')}
+        for public_id in md_files:
+            metadata_path = get_published_path(public_id, '.meta')
+            content = storage.read(get_published_path(public_id, '.md')) or ''
+            metadata = read_storage_json(metadata_path, {})
+            files.append({
+                'public_id': public_id,
+                'display_filename': metadata.get('display_filename', public_id),
+                'display_username': metadata.get('display_username', 'Unknown'),
+                'tags': metadata.get('tags', []),
+                'content': content  # Include content for search
+            })
 
         current_username = session.get('username')
         is_authenticated = current_username is not None
@@ -357,17 +219,9 @@ def list_public_files():
 @login_required
 def get_metadata(public_id):
     try:
-        metadata_path = f"{PUBLISH_DIR_GCS}/{public_id}.meta" if gcs_client.enabled else os.path.join(
-            PUBLISH_DIR_LOCAL, f"{public_id}.meta")
-
-        # Read metadata
-        if gcs_client.enabled:
-            metadata_content = gcs_client.read_file(metadata_path)
-        else:
-            if not os.path.exists(metadata_path):
-                return jsonify({'success': False, 'error': 'Metadata not found'}), 404
-            with open(metadata_path, 'r', encoding='utf-8') as f:
-                metadata_content = f.read()
+        metadata_content = storage.read(get_published_path(public_id, '.meta'))
+        if metadata_content is None:
+            return jsonify({'success': False, 'error': 'Metadata not found'}), 404
 
         metadata = json.loads(metadata_content)
         return jsonify({'success': True, 'tags': metadata.get('tags', [])})
@@ -380,39 +234,14 @@ def get_metadata(public_id):
 @public_bp.route('/view/<public_id>')
 def view_public_file(public_id):
     try:
-        public_filename = f"{public_id}.md"
-        metadata_filename = f"{public_id}.meta"
-        permissions_filename = f"{public_id}.permissions.json"
-
         # Read content
-        if gcs_client.enabled:
-            public_path = f"{PUBLISH_DIR_GCS}/{public_filename}"
-            metadata_path = f"{PUBLISH_DIR_GCS}/{metadata_filename}"
-            permissions_path = f"{PUBLISH_DIR_GCS}/{permissions_filename}"
-            content = gcs_client.read_file(public_path)
-            if content is None:
-                logging.error(f"Public file {public_id} not found in GCS")
-                abort(404)
-            metadata_content = gcs_client.read_file(metadata_path)
-            permissions_content = gcs_client.read_file(permissions_path)
-        else:
-            public_path = os.path.join(PUBLISH_DIR_LOCAL, public_filename)
-            metadata_path = os.path.join(PUBLISH_DIR_LOCAL, metadata_filename)
-            permissions_path = os.path.join(
-                PUBLISH_DIR_LOCAL, permissions_filename)
-            if not os.path.exists(public_path):
-                logging.error(f"Public file {public_id} not found")
-                abort(404)
-            with open(public_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            metadata_content = None
-            if os.path.exists(metadata_path):
-                with open(metadata_path, 'r', encoding='utf-8') as f:
-                    metadata_content = f.read()
-            permissions_content = None
-            if os.path.exists(permissions_path):
-                with open(permissions_path, 'r', encoding='utf-8') as f:
-                    permissions_content = f.read()
+        content = storage.read(get_published_path(public_id, '.md'))
+        if content is None:
+            logging.error(f"Public file {public_id} not found")
+            abort(404)
+        metadata_content = storage.read(get_published_path(public_id, '.meta'))
+        permissions_content = storage.read(
+            get_published_path(public_id, '.permissions.json'))
 
         display_filename = public_id
         display_username = 'Unknown'
@@ -459,17 +288,8 @@ def view_public_file(public_id):
 @public_bp.route('/comments/<public_id>', methods=['GET'])
 def get_comments(public_id):
     try:
-        comments_path = f"{PUBLISH_DIR_GCS}/{public_id}.comments.json" if gcs_client.enabled else os.path.join(
-            PUBLISH_DIR_LOCAL, f"{public_id}.comments.json")
-
-        if gcs_client.enabled:
-            comments_content = gcs_client.read_file(comments_path)
-        else:
-            if not os.path.exists(comments_path):
-                return jsonify({'success': True, 'comments': []})
-            with open(comments_path, 'r', encoding='utf-8') as f:
-                comments_content = f.read()
-
+        comments_content = storage.read(
+            get_published_path(public_id, '.comments.json'))
         comments = json.loads(comments_content) if comments_content else []
         return jsonify({'success': True, 'comments': comments})
     except Exception as e:
@@ -489,18 +309,10 @@ def add_comment(public_id):
         return jsonify({'success': False, 'error': 'Comment is required'}), 400
 
     try:
-        comments_path = f"{PUBLISH_DIR_GCS}/{public_id}.comments.json" if gcs_client.enabled else os.path.join(
-            PUBLISH_DIR_LOCAL, f"{public_id}.comments.json")
+        comments_path = get_published_path(public_id, '.comments.json')
 
         # Read existing comments
-        if gcs_client.enabled:
-            comments_content = gcs_client.read_file(comments_path)
-        else:
-            comments_content = None
-            if os.path.exists(comments_path):
-                with open(comments_path, 'r', encoding='utf-8') as f:
-                    comments_content = f.read()
-
+        comments_content = storage.read(comments_path)
         comments = json.loads(comments_content) if comments_content else []
 
         # Add new comment
@@ -511,11 +323,7 @@ def add_comment(public_id):
         })
 
         # Write back
-        if gcs_client.enabled:
-            gcs_client.write_file(comments_path, json.dumps(comments))
-        else:
-            with open(comments_path, 'w', encoding='utf-8') as f:
-                json.dump(comments, f)
+        write_storage_json(comments_path, comments, indent=None)
 
         logging.info(f"Comment added to file {public_id} by user {username}")
         return jsonify({'success': True})
@@ -529,18 +337,13 @@ def add_comment(public_id):
 def get_permissions(public_id):
     username = session.get('username')
     try:
-        metadata_path = f"{PUBLISH_DIR_GCS}/{public_id}.meta" if gcs_client.enabled else os.path.join(
-            PUBLISH_DIR_LOCAL, f"{public_id}.meta")
-        permissions_path = f"{PUBLISH_DIR_GCS}/{public_id}.permissions.json" if gcs_client.enabled else os.path.join(
-            PUBLISH_DIR_LOCAL, f"{public_id}.permissions.json")
+        metadata_path = get_published_path(public_id, '.meta')
+        permissions_path = get_published_path(public_id, '.permissions.json')
 
         # Check ownership
-        if gcs_client.enabled:
-            metadata_content = gcs_client.read_file(metadata_path)
-        else:
-            with open(metadata_path, 'r', encoding='utf-8') as f:
-                metadata_content = f.read()
-
+        metadata_content = storage.read(metadata_path)
+        if metadata_content is None:
+            raise FileNotFoundError(f"Metadata for {public_id} not found")
         metadata = json.loads(metadata_content)
         if metadata.get('owner_username') != username:
             logging.warning(
@@ -548,14 +351,9 @@ def get_permissions(public_id):
             return jsonify({'success': False, 'error': 'Unauthorized'}), 403
 
         # Read permissions
-        if gcs_client.enabled:
-            permissions_content = gcs_client.read_file(permissions_path)
-        else:
-            if not os.path.exists(permissions_path):
-                return jsonify({'success': True, 'permitted_users': []})
-            with open(permissions_path, 'r', encoding='utf-8') as f:
-                permissions_content = f.read()
-
+        permissions_content = storage.read(permissions_path)
+        if permissions_content is None:
+            return jsonify({'success': True, 'permitted_users': []})
         permitted_users = json.loads(
             permissions_content) if permissions_content else []
         return jsonify({'success': True, 'permitted_users': permitted_users})
@@ -575,18 +373,13 @@ def add_permission(public_id):
         return jsonify({'success': False, 'error': 'Username is required'}), 400
 
     try:
-        metadata_path = f"{PUBLISH_DIR_GCS}/{public_id}.meta" if gcs_client.enabled else os.path.join(
-            PUBLISH_DIR_LOCAL, f"{public_id}.meta")
-        permissions_path = f"{PUBLISH_DIR_GCS}/{public_id}.permissions.json" if gcs_client.enabled else os.path.join(
-            PUBLISH_DIR_LOCAL, f"{public_id}.permissions.json")
+        metadata_path = get_published_path(public_id, '.meta')
+        permissions_path = get_published_path(public_id, '.permissions.json')
 
         # Check ownership
-        if gcs_client.enabled:
-            metadata_content = gcs_client.read_file(metadata_path)
-        else:
-            with open(metadata_path, 'r', encoding='utf-8') as f:
-                metadata_content = f.read()
-
+        metadata_content = storage.read(metadata_path)
+        if metadata_content is None:
+            raise FileNotFoundError(f"Metadata for {public_id} not found")
         metadata = json.loads(metadata_content)
         if metadata.get('owner_username') != username:
             logging.warning(
@@ -599,14 +392,7 @@ def add_permission(public_id):
             return jsonify({'success': False, 'error': 'User not found'}), 404
 
         # Read existing permissions
-        if gcs_client.enabled:
-            permissions_content = gcs_client.read_file(permissions_path)
-        else:
-            permissions_content = None
-            if os.path.exists(permissions_path):
-                with open(permissions_path, 'r', encoding='utf-8') as f:
-                    permissions_content = f.read()
-
+        permissions_content = storage.read(permissions_path)
         permitted_users = json.loads(
             permissions_content) if permissions_content else []
 
@@ -618,12 +404,7 @@ def add_permission(public_id):
         permitted_users.append(target_username)
 
         # Write back
-        if gcs_client.enabled:
-            gcs_client.write_file(
-                permissions_path, json.dumps(permitted_users))
-        else:
-            with open(permissions_path, 'w', encoding='utf-8') as f:
-                json.dump(permitted_users, f)
+        write_storage_json(permissions_path, permitted_users, indent=None)
 
         logging.info(
             f"Edit permission granted to {target_username} for file {public_id} by {username}")
@@ -644,18 +425,13 @@ def remove_permission(public_id):
         return jsonify({'success': False, 'error': 'Username is required'}), 400
 
     try:
-        metadata_path = f"{PUBLISH_DIR_GCS}/{public_id}.meta" if gcs_client.enabled else os.path.join(
-            PUBLISH_DIR_LOCAL, f"{public_id}.meta")
-        permissions_path = f"{PUBLISH_DIR_GCS}/{public_id}.permissions.json" if gcs_client.enabled else os.path.join(
-            PUBLISH_DIR_LOCAL, f"{public_id}.permissions.json")
+        metadata_path = get_published_path(public_id, '.meta')
+        permissions_path = get_published_path(public_id, '.permissions.json')
 
         # Check ownership
-        if gcs_client.enabled:
-            metadata_content = gcs_client.read_file(metadata_path)
-        else:
-            with open(metadata_path, 'r', encoding='utf-8') as f:
-                metadata_content = f.read()
-
+        metadata_content = storage.read(metadata_path)
+        if metadata_content is None:
+            raise FileNotFoundError(f"Metadata for {public_id} not found")
         metadata = json.loads(metadata_content)
         if metadata.get('owner_username') != username:
             logging.warning(
@@ -663,14 +439,9 @@ def remove_permission(public_id):
             return jsonify({'success': False, 'error': 'Unauthorized'}), 403
 
         # Read existing permissions
-        if gcs_client.enabled:
-            permissions_content = gcs_client.read_file(permissions_path)
-        else:
-            if not os.path.exists(permissions_path):
-                return jsonify({'success': False, 'error': 'Permission not found'}), 404
-            with open(permissions_path, 'r', encoding='utf-8') as f:
-                permissions_content = f.read()
-
+        permissions_content = storage.read(permissions_path)
+        if permissions_content is None:
+            return jsonify({'success': False, 'error': 'Permission not found'}), 404
         permitted_users = json.loads(
             permissions_content) if permissions_content else []
 
@@ -682,12 +453,7 @@ def remove_permission(public_id):
         permitted_users.remove(target_username)
 
         # Write back
-        if gcs_client.enabled:
-            gcs_client.write_file(
-                permissions_path, json.dumps(permitted_users))
-        else:
-            with open(permissions_path, 'w', encoding='utf-8') as f:
-                json.dump(permitted_users, f)
+        write_storage_json(permissions_path, permitted_users, indent=None)
 
         logging.info(
             f"Edit permission removed for {target_username} for file {public_id} by {username}")
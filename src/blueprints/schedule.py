@@ -1,27 +1,29 @@
 from flask import Blueprint, current_app, jsonify, request, session
-import os
-import json
 from datetime import datetime
-from ..utils import get_user_artifacts_dir  # Import helper function
+from ..utils import get_user_storage_path, read_storage_json, write_storage_json
+from .auth import login_required
 
 bp = Blueprint('schedule', __name__)
 
 
+def get_user_schedule_path(username):
+    """Return the storage key of the user's calendar data."""
+    return get_user_storage_path(username, filename='schedule-data.json')
+
+
 @bp.route('/save-schedule', methods=['POST'])
+@login_required
 def save_schedule():
     try:
         data = request.get_json()
         username = session.get('username')  # Retrieve username from session
-        # Get user-specific artifacts directory
-        user_dir = get_user_artifacts_dir(username)
-        os.makedirs(user_dir, exist_ok=True)
+        # Get user-specific schedule file
+        schedule_file = get_user_schedule_path(username)
 
         data['lastSaved'] = datetime.now().isoformat()
         data['lastSavedBy'] = username
 
-        schedule_file = os.path.join(user_dir, 'schedule-data.json')
-        with open(schedule_file, 'w') as f:
-            json.dump(data, f)
+        write_storage_json(schedule_file, data, indent=None)
 
         return jsonify({
             "success": True,
@@ -35,16 +37,14 @@ def save_schedule():
 
 
 @bp.route('/get-schedule', methods=['GET'])
+@login_required
 def get_schedule():
     try:
         username = session.get('username')  # Retrieve username from session
-        # Get user-specific artifacts directory
-        user_dir = get_user_artifacts_dir(username)
-        schedule_file = os.path.join(user_dir, 'schedule-data.json')
+        # Get user-specific schedule file
+        data = read_storage_json(get_user_schedule_path(username))
 
-        if os.path.exists(schedule_file):
-            with open(schedule_file, 'r') as f:
-                data = json.load(f)
+        if data is not None:
             return jsonify(data)
         else:
             return jsonify({
@@ -58,17 +58,14 @@ def get_schedule():
 
 
 @bp.route('/export-schedule', methods=['GET'])
+@login_required
 def export_schedule():
     try:
         username = session.get('username')  # Retrieve username from session
-        # Get user-specific artifacts directory
-        user_dir = get_user_artifacts_dir(username)
-        schedule_file = os.path.join(user_dir, 'schedule-data.json')
-
-        if os.path.exists(schedule_file):
-            with open(schedule_file, 'r') as f:
-                data = json.load(f)
+        # Get user-specific schedule file
+        data = read_storage_json(get_user_schedule_path(username))
 
+        if data is not None:
             data['exportDate'] = datetime.now().isoformat()
             data['exportedBy'] = username
 
@@ -82,6 +79,7 @@ def export_schedule():
 
 
 @bp.route('/import-schedule', methods=['POST'])
+@login_required
 def import_schedule():
     try:
         data = request.get_json()
@@ -90,17 +88,14 @@ def import_schedule():
         if 'scheduledEvents' not in data:
             return jsonify({"success": False, "error": "Invalid data format"}), 400
 
-        # Get user-specific artifacts directory
-        user_dir = get_user_artifacts_dir(username)
-        os.makedirs(user_dir, exist_ok=True)
+        # Get user-specific schedule file
+        schedule_file = get_user_schedule_path(username)
 
         data['importDate'] = datetime.now().isoformat()
         data['importedBy'] = username
         data['lastSaved'] = datetime.now().isoformat()
 
-        schedule_file = os.path.join(user_dir, 'schedule-data.json')
-        with open(schedule_file, 'w') as f:
-            json.dump(data, f)
+        write_storage_json(schedule_file, data, indent=None)
 
         return jsonify({
             "success": True,
@@ -113,17 +108,14 @@ def import_schedule():
 
 
 @bp.route('/schedule-stats', methods=['GET'])
+@login_required
 def get_stats():
     try:
         username = session.get('username')  # Retrieve username from session
-        # Get user-specific artifacts directory
-        user_dir = get_user_artifacts_dir(username)
-        schedule_file = os.path.join(user_dir, 'schedule-data.json')
-
-        if os.path.exists(schedule_file):
-            with open(schedule_file, 'r') as f:
-                data = json.load(f)
+        # Get user-specific schedule file
+        data = read_storage_json(get_user_schedule_path(username))
 
+        if data is not None:
             total_events = 0
             repeating_events = 0
             for date, events_list in data.get('scheduledEvents', {}).items():
@@ -1,68 +1,34 @@
 # src/blueprints/sharing.py
 from flask import Blueprint, jsonify, request, session
-from src.utils import open_md_file, list_md_files, get_user_artifacts_dir, save_file
-from src.gcs_utils import gcs_client
+from src.utils import open_md_file, list_md_files, get_user_storage_path, read_storage_json, write_storage_json, manifest_record_file, manifest_remove_file
+from src.storage import storage
 from src.models import User
 from .auth import login_required
-import os
-import json
 import logging
-import shutil
 
 sharing_bp = Blueprint('sharing', __name__)
 
 
 def update_sharing_permissions(username, permissions):
     """Update the sharing permissions for a user."""
-    if gcs_client.enabled:
-        gcs_path = os.path.join('artifacts', username,
-                                'sharing_permissions.json').replace(os.sep, '/')
-        try:
-            gcs_client.write_file(gcs_path, json.dumps(permissions, indent=4))
-            logging.info(f"Updated sharing permissions in GCS for {username}")
-        except Exception as e:
-            logging.error(
-                f"Error updating sharing permissions in GCS for {username}: {str(e)}")
-            raise
-    else:
-        permissions_file = os.path.join(
-            get_user_artifacts_dir(username), 'sharing_permissions.json')
-        try:
-            with open(permissions_file, 'w', encoding='utf-8') as f:
-                json.dump(permissions, f, indent=4)
-            logging.info(f"Updated sharing permissions for user {username}")
-        except Exception as e:
-            logging.error(
-                f"Error updating sharing permissions for {username}: {str(e)}")
-            raise
+    try:
+        write_storage_json(get_user_storage_path(
+            username, filename='sharing_permissions.json'), permissions)
+        logging.info(f"Updated sharing permissions for user {username}")
+    except Exception as e:
+        logging.error(
+            f"Error updating sharing permissions for {username}: {str(e)}")
+        raise
 
 
 def get_sharing_permissions(username):
     """Retrieve the sharing permissions for a user."""
-    if gcs_client.enabled:
-        gcs_path = os.path.join('artifacts', username,
-                                'sharing_permissions.json').replace(os.sep, '/')
-        content = gcs_client.read_file(gcs_path)
-        if content:
-            try:
-                permissions = json.loads(content)
-                logging.debug(
-                    f"Retrieved sharing permissions for {username} from GCS: {permissions}")
-                return permissions.get('shared_files', {})
-            except json.JSONDecodeError as e:
-                logging.error(
-                    f"Error parsing sharing permissions for {username}: {str(e)}")
-        return {}
-    permissions_file = os.path.join(
-        get_user_artifacts_dir(username), 'sharing_permissions.json')
     try:
-        if os.path.exists(permissions_file):
-            with open(permissions_file, 'r', encoding='utf-8') as f:
-                permissions = json.load(f)
-                logging.debug(
-                    f"Retrieved sharing permissions for {username}: {permissions}")
-                return permissions.get('shared_files', {})
-        return {}
+        permissions = read_storage_json(get_user_storage_path(
+            username, filename='sharing_permissions.json'), {})
+        logging.debug(
+            f"Retrieved sharing permissions for {username}: {permissions}")
+        return permissions.get('shared_files', {})
     except Exception as e:
         logging.error(
             f"Error reading sharing permissions for {username}: {str(e)}")
@@ -73,20 +39,11 @@ def copy_file_to_shared_folder(sharer, recipient, filename, folder):
     """Copy a file to the recipient's shared folder with a unique name."""
     unique_filename = f"{filename.rsplit('.md', 1)[0]}_sharedby_{sharer}.md"
     try:
-        content = open_md_file(filename, sharer, folder)
-        recipient_shared_dir = os.path.join(
-            get_user_artifacts_dir(recipient), 'shared')
-        if gcs_client.enabled:
-            src_path = os.path.join('artifacts', sharer, folder, filename).replace(
-                os.sep, '/').lstrip('/')
-            dst_path = os.path.join('artifacts', recipient, 'shared', unique_filename).replace(
-                os.sep, '/').lstrip('/')
-            gcs_client.write_file(dst_path, content)
-            logging.info(f"Copied {src_path} to {dst_path} in GCS")
-        else:
-            save_file(unique_filename, content, recipient, 'shared')
-            logging.info(
-                f"Copied {filename} to {recipient}'s shared folder as {unique_filename}")
+        src_path = get_user_storage_path(sharer, folder, filename)
+        dst_path = get_user_storage_path(recipient, 'shared', unique_filename)
+        storage.copy(src_path, dst_path)
+        manifest_record_file(recipient, f"shared/{unique_filename}")
+        logging.info(f"Copied {src_path} to {dst_path}")
         return unique_filename
     except Exception as e:
         logging.error(
@@ -219,21 +176,12 @@ def unshare_file():
                 # Delete the file from the recipient's shared folder
                 recipient = entry['recipient']
                 unique_filename = entry['unique_filename']
-                if gcs_client.enabled:
-                    gcs_path = os.path.join('artifacts', recipient, 'shared', unique_filename).replace(
-                        os.sep, '/').lstrip('/')
-                    blob = gcs_client.bucket.blob(gcs_path)
-                    if blob.exists():
-                        blob.delete()
-                        logging.info(
-                            f"Deleted {gcs_path} from GCS for user {recipient}")
-                else:
-                    file_path = os.path.join(get_user_artifacts_dir(
-                        recipient), 'shared', unique_filename)
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
-                        logging.info(
-                            f"Deleted {file_path} for user {recipient}")
+                path = get_user_storage_path(
+                    recipient, 'shared', unique_filename)
+                if storage.delete(path):
+                    manifest_remove_file(
+                        recipient, f"shared/{unique_filename}")
+                    logging.info(f"Deleted {path} for user {recipient}")
 
         if updated_permissions:
             permissions[filename] = updated_permissions
@@ -1,9 +1,8 @@
 from flask import Blueprint, jsonify, request, session
-from src.utils import open_md_file, save_file
+from src.utils import open_md_file, append_to_file
 from .auth import login_required
 import logging
 import json
-from ..gcs_utils import gcs_client
 
 typo_bp = Blueprint('typo', __name__)
 
@@ -44,30 +43,9 @@ def save_typo():
             'timestamp': data['timestamp']
         }
 
-        # Load existing typos or initialize empty list
-        typos = []
-        try:
-            content = open_md_file('typo.json', username, '')
-            if content:
-                typos = json.loads(content)
-                if not isinstance(typos, list):
-                    logging.warning(
-                        f"Invalid typo.json format for {username}, resetting to empty list")
-                    typos = []
-        except json.JSONDecodeError:
-            logging.error(
-                f"Corrupted typo.json content for {username}, resetting to empty list")
-            typos = []
-        except Exception as e:
-            logging.error(f"Error loading typo.json for {username}: {str(e)}")
-            typos = []
-
-        # Append new typo entry
-        typos.append(typo_entry)
-
-        # Save updated typos to typo.json
+        # Append the typo entry to typo.json's log
         try:
-            save_file('typo.json', json.dumps(typos, indent=4), username, '')
+            append_to_file('typo.json', json.dumps(typo_entry), username, '')
             logging.info(f"Saved typo for user {username}: {typo_entry}")
             return jsonify({'success': True}), 200
         except Exception as e:
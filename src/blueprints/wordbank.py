@@ -1,8 +1,7 @@
 from flask import Blueprint, jsonify, request, session
 import logging
 from .auth import login_required
-from ..utils import open_md_file, save_file
-from ..gcs_utils import gcs_client
+from ..utils import open_md_file, append_to_file
 
 wordbank_bp = Blueprint('wordbank', __name__)
 
@@ -22,15 +21,9 @@ def add_word():
         if not word:
             return jsonify({'success': False, 'error': 'No word provided'}), 400
 
-        # Load existing wordbank content
-        content = open_md_file('wordbank.md', username, 'word bank') or ''
-
-        # Append new word
-        new_content = content + f"- {word}\n"
-
-        # Save updated content
+        # Append new word without rewriting the wordbank
         try:
-            save_file('wordbank.md', new_content, username, 'word bank')
+            append_to_file('wordbank.md', f"- {word}\n", username, 'word bank')
             logging.info(f"Word added to wordbank for user {username}: {word}")
             return jsonify({'success': True}), 200
         except Exception as e:
@@ -85,17 +78,11 @@ def save_word():
         if not dutch or not english or not difficulty:
             return jsonify({'error': 'Invalid word data'}), 400
 
-        # Load existing saved wordbank content
-        content = open_md_file('wordbank_saved.md',
-                               username, 'word bank') or ''
-
-        # Append new word entry
+        # Append new word entry without rewriting the saved wordbank
         new_entry = f"- **{dutch}** {difficulty} *{english}*\n"
-        new_content = content + new_entry
-
-        # Save updated content
         try:
-            save_file('wordbank_saved.md', new_content, username, 'word bank')
+            append_to_file('wordbank_saved.md', new_entry,
+                           username, 'word bank')
             logging.info(
                 f"Word '{dutch}' saved successfully for user {username}")
             return jsonify({'message': 'Word saved successfully'}), 200
@@ -1,16 +1,149 @@
 import os
 import json
+import time
 import logging
-import zipfile
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
 from google.cloud import storage
 from google.cloud.storage import Client
-from google.cloud.exceptions import GoogleCloudError
+from google.cloud.exceptions import GoogleCloudError, NotFound
 import mimetypes
 
 
+class ReadCache:
+    """Bounded LRU cache of decoded object contents keyed by object path.
+
+    Each entry remembers the object generation it was downloaded at. Within
+    ``ttl`` seconds of the last check an entry is served as-is; after that it
+    is revalidated with a metadata-only request and only re-downloaded if the
+    generation changed.
+    """
+
+    def __init__(self, max_bytes, max_entries, ttl):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'revalidations': 0,
+                      'evictions': 0, 'bytes_served': 0, 'bytes_downloaded': 0}
+
+    def get(self, path):
+        """Return ``(content, generation, fresh)`` for a cached path, or None."""
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                return None
+            self._entries.move_to_end(path)
+            content, generation, size, checked_at = entry
+            return content, generation, time.monotonic() - checked_at < self.ttl
+
+    def put(self, path, content, generation, size):
+        if size > self.max_bytes:
+            self.invalidate(path)
+            return
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old:
+                self._size -= old[2]
+            self._entries[path] = (content, generation, size, time.monotonic())
+            self._size += size
+            while self._size > self.max_bytes or len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted[2]
+                self.stats['evictions'] += 1
+
+    def touch(self, path):
+        """Mark a cached entry as freshly validated."""
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry:
+                self._entries[path] = entry[:3] + (time.monotonic(),)
+
+    def invalidate(self, path):
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old:
+                self._size -= old[2]
+
+    def record(self, **counts):
+        with self._lock:
+            for key, value in counts.items():
+                self.stats[key] += value
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update(entries=len(self._entries), bytes=self._size,
+                         max_bytes=self.max_bytes, ttl=self.ttl)
+        return stats
+
+
+class SignedUrlCache:
+    """Bounded LRU cache of signed download URLs keyed by (path, expiry bucket).
+
+    Time is cut into windows of ``reuse_fraction`` of the requested lifetime
+    and every URL of a window expires ``expiration`` seconds after the window
+    starts, so one URL is handed out for the whole window and always has at
+    least ``expiration * (1 - reuse_fraction)`` seconds left. Stable URLs
+    spare the signing and let browsers and CDNs cache the media.
+    """
+
+    def __init__(self, max_entries, reuse_fraction):
+        self.max_entries = max_entries
+        self.reuse_fraction = reuse_fraction
+        # path -> {expiration: (bucket, url)}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def bucket(self, expiration, now=None):
+        """Return (bucket, expires_at) for a URL requested now."""
+        window = max(1, int(expiration * self.reuse_fraction))
+        bucket = int((time.time() if now is None else now) // window)
+        return bucket, bucket * window + expiration
+
+    def get(self, path, expiration, bucket):
+        with self._lock:
+            entry = self._entries.get(path, {}).get(expiration)
+            if entry is None or entry[0] != bucket:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(path)
+            self.stats['hits'] += 1
+            return entry[1]
+
+    def put(self, path, expiration, bucket, url):
+        with self._lock:
+            self._entries.setdefault(path, {})[expiration] = (bucket, url)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, path):
+        with self._lock:
+            self._entries.pop(path, None)
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update(entries=len(self._entries), max_entries=self.max_entries,
+                         reuse_fraction=self.reuse_fraction)
+        return stats
+
+
 class GCSClient:
     def __init__(self):
         self.bucket_name = os.getenv('GCS_BUCKET', 'typorax123')
+        self.read_cache = ReadCache(
+            max_bytes=int(os.getenv('GCS_READ_CACHE_BYTES', 32 * 1024 * 1024)),
+            max_entries=int(os.getenv('GCS_READ_CACHE_ENTRIES', 1024)),
+            ttl=float(os.getenv('GCS_READ_CACHE_TTL', 5)))
+        self.signed_url_cache = SignedUrlCache(
+            max_entries=int(os.getenv('GCS_SIGNED_URL_CACHE_ENTRIES', 4096)),
+            reuse_fraction=float(os.getenv('GCS_SIGNED_URL_REUSE', 0.5)))
         self.enabled = os.getenv('USE_GCS', 'false').lower() == 'true'
         credentials_json = os.getenv('GOOGLE_CLOUD_CREDENTIALS')
         credentials_path = os.path.join(
@@ -65,24 +198,46 @@ class GCSClient:
                 f"Error uploading {local_path} to {gcs_path}: {str(e)}")
             return None
 
-    # ... (rest of the GCSClient class remains unchanged)
-    # Include all other methods as provided in the original gcs_utils.py
     def read_file(self, path):
-        """Read text content directly from a GCS file."""
+        """Read text content from a GCS file through the read cache."""
         if not self.enabled or not self.client:
             return None
         try:
+            cached = self.read_cache.get(path)
+            if cached:
+                content, generation, fresh = cached
+                if not fresh:
+                    # Metadata-only request; skip the download if unchanged
+                    blob = self.bucket.get_blob(path)
+                    self.read_cache.record(revalidations=1)
+                    if blob is None:
+                        self.read_cache.invalidate(path)
+                        logging.info(f"GCS file not found: {path}")
+                        return None
+                    fresh = blob.generation == generation
+                    if fresh:
+                        self.read_cache.touch(path)
+                if fresh:
+                    self.read_cache.record(hits=1, bytes_served=len(content))
+                    return content
+
             blob = self.bucket.blob(path)
-            if not blob.exists():
+            try:
+                data = blob.download_as_bytes()
+            except NotFound:
+                self.read_cache.invalidate(path)
                 logging.info(f"GCS file not found: {path}")
                 return None
-            content = blob.download_as_text(encoding='utf-8')
+            try:
+                content = data.decode('utf-8')
+            except UnicodeDecodeError:
+                content = data.decode('iso-8859-1')
+                logging.info(f"Read file from GCS with iso-8859-1: {path}")
+            # The download response carries the generation it was served at
+            self.read_cache.put(path, content, blob.generation, len(data))
+            self.read_cache.record(misses=1, bytes_downloaded=len(data))
             logging.info(f"Read file from GCS: {path}")
             return content
-        except UnicodeDecodeError:
-            content = blob.download_as_text(encoding='iso-8859-1')
-            logging.info(f"Read file from GCS with iso-8859-1: {path}")
-            return content
         except GoogleCloudError as e:
             logging.error(f"Error reading GCS file {path}: {str(e)}")
             return None
@@ -91,6 +246,7 @@ class GCSClient:
         """Write text content directly to a GCS file."""
         if not self.enabled or not self.client:
             raise Exception("GCS not enabled")
+        self.invalidate(path)
         try:
             blob = self.bucket.blob(path)
             blob.upload_from_string(
@@ -99,6 +255,20 @@ class GCSClient:
         except GoogleCloudError as e:
             logging.error(f"Error writing GCS file {path}: {str(e)}")
             raise
+        # Seed the cache with what we just wrote at its new generation
+        self.read_cache.put(path, content, blob.generation,
+                            len(content.encode('utf-8')))
+
+    def invalidate(self, path):
+        """Drop any cached content and signed URLs for path (it is being changed)."""
+        self.read_cache.invalidate(path)
+        # A new URL after a change keeps browsers from serving the old content
+        self.signed_url_cache.invalidate(path)
+
+    def cache_stats(self):
+        stats = self.read_cache.snapshot()
+        stats['signed_urls'] = self.signed_url_cache.snapshot()
+        return stats
 
     def download_file(self, gcs_path, local_path):
         """Download a file from GCS to a local path (for binary files)."""
@@ -119,168 +289,13 @@ class GCSClient:
                 f"Error downloading {gcs_path} to {local_path}: {str(e)}")
             return None
 
-    def save_file(self, filename, content, username, folder=''):
-        """Save content to a file in GCS."""
-        if not self.enabled or not self.client:
-            return False
-        gcs_path = os.path.join('artifacts', username,
-                                folder, filename).replace(os.sep, '/')
-        try:
-            self.write_file(gcs_path, content)
-            return True
-        except Exception as e:
-            logging.error(f"Error saving file to GCS {gcs_path}: {str(e)}")
-            return False
-
-    def open_file(self, filename, username, folder=''):
-        """Read content from a file in GCS."""
-        if not self.enabled or not self.client:
-            return None
-        gcs_path = os.path.join('artifacts', username,
-                                folder, filename).replace(os.sep, '/')
-        return self.read_file(gcs_path)
-
-    def list_files(self, username, folder=''):
-        """List markdown files in a GCS directory."""
-        if not self.enabled or not self.client:
-            return []
-
-        # Construct prefix properly to avoid double slashes
-        if folder:
-            prefix = f"artifacts/{username}/{folder}/"
-        else:
-            prefix = f"artifacts/{username}/"
-
-        try:
-            blobs = self.client.list_blobs(
-                self.bucket, prefix=prefix, delimiter='/')
-
-            # Filter for markdown files only in this directory level (not in subdirectories)
-            files = []
-            for blob in blobs:
-                if blob.name.endswith('.md'):
-                    # Extract just the filename without the path
-                    file_name = os.path.basename(blob.name)
-                    files.append(file_name)
-
-            logging.info(f"Listed {len(files)} .md files in GCS for {prefix}")
-            return files
-        except GoogleCloudError as e:
-            logging.error(f"Error listing files in GCS {prefix}: {str(e)}")
-            return []
-
-    def list_folders(self, username, folder=''):
-        """List subfolders in a GCS directory."""
-        if not self.enabled or not self.client:
-            return []
-
-        # Construct base prefix properly to avoid double slashes
-        if folder:
-            base_prefix = f"artifacts/{username}/{folder}/"
-        else:
-            base_prefix = f"artifacts/{username}/"
-
-        try:
-            # Create a set to store unique folder names
-            folders = set()
-
-            # List all blobs with the given prefix - don't use delimiter initially
-            blobs = self.client.list_blobs(self.bucket, prefix=base_prefix)
-
-            # Go through each blob and extract folder names
-            for blob in blobs:
-                # Remove the base prefix to get the relative path
-                relative_path = blob.name[len(base_prefix):]
-                if not relative_path:
-                    continue
-
-                # If this path contains a slash, it's in a subfolder
-                if '/' in relative_path:
-                    # Get the top-level folder name
-                    top_folder = relative_path.split('/')[0]
-                    if top_folder:
-                        folders.add(top_folder)
-                        logging.debug(
-                            f"Found folder: {top_folder} from path: {relative_path}")
-
-            # Now also try with delimiter-based approach as a backup
-            blobs = self.client.list_blobs(
-                self.bucket, prefix=base_prefix, delimiter='/')
-            for prefix in blobs.prefixes:
-                # Extract folder name from the path
-                folder_name = prefix[len(base_prefix):].rstrip('/')
-                if folder_name:
-                    folders.add(folder_name)
-                    logging.debug(
-                        f"Found folder (delimiter method): {folder_name}")
-
-            folders_list = list(folders)
-            logging.info(
-                f"Retrieved folders from GCS for user {username}: {folders_list}")
-            return folders_list
-        except GoogleCloudError as e:
-            logging.error(
-                f"Error listing folders in GCS {base_prefix}: {str(e)}")
-            return []
-
-    def update_audio_permissions(self, username, audio_files):
-        """Update audio permissions in GCS."""
-        if not self.enabled or not self.client:
-            return False
-        gcs_path = os.path.join('artifacts', username,
-                                'audio_permissions.json').replace(os.sep, '/')
-        permissions = {'accessible_audio_files': audio_files}
-        try:
-            self.write_file(gcs_path, json.dumps(permissions, indent=4))
-            logging.info(f"Updated audio permissions in GCS for {username}")
-            return True
-        except Exception as e:
-            logging.error(
-                f"Error updating audio permissions in GCS for {username}: {str(e)}")
-            return False
-
-    def get_audio_permissions(self, username):
-        """Retrieve audio permissions from GCS."""
-        if not self.enabled or not self.client:
-            return []
-        gcs_path = os.path.join('artifacts', username,
-                                'audio_permissions.json').replace(os.sep, '/')
-        content = self.read_file(gcs_path)
-        if content:
-            try:
-                permissions = json.loads(content)
-                return permissions.get('accessible_audio_files', [])
-            except json.JSONDecodeError as e:
-                logging.error(
-                    f"Error parsing audio permissions for {username}: {str(e)}")
-        return []
-
-    def get_audio_file(self, username, audio_filename):
-        """Retrieve an audio file path from GCS if the user has access."""
-        if not self.enabled or not self.client:
-            return None
-        allowed_files = self.get_audio_permissions(username)
-        if audio_filename not in allowed_files:
-            logging.error(
-                f"User {username} does not have access to audio file: {audio_filename}")
-            raise ValueError(f"Access denied to audio file: {audio_filename}")
-
-        gcs_path = os.path.join('artifacts', 'audio',
-                                audio_filename).replace(os.sep, '/')
-        local_temp_path = os.path.join('temp', audio_filename)
-        try:
-            if self.download_file(gcs_path, local_temp_path):
-                logging.info(
-                    f"Access granted to audio file {audio_filename} for {username}")
-                return local_temp_path
-            raise FileNotFoundError(f"Audio file not found: {audio_filename}")
-        except Exception as e:
-            logging.error(f"Error retrieving audio file {gcs_path}: {str(e)}")
-            raise
-
     def generate_presigned_url(self, gcs_path, expiration=3600):
         if not self.enabled or not self.client:
             return None
+        bucket, expires_at = self.signed_url_cache.bucket(expiration)
+        url = self.signed_url_cache.get(gcs_path, expiration, bucket)
+        if url:
+            return url
         try:
             blob = self.bucket.blob(gcs_path)
             if not blob.exists():
@@ -288,162 +303,15 @@ class GCSClient:
                     f"GCS file not found for presigned URL: {gcs_path}")
                 return None
             url = blob.generate_signed_url(
-                expiration=expiration, method='GET', version='v4')
-            # Log full URL
-            logging.info(f"Generated presigned URL for {gcs_path}: {url}")
+                expiration=datetime.fromtimestamp(expires_at, timezone.utc),
+                method='GET', version='v4')
+            self.signed_url_cache.put(gcs_path, expiration, bucket, url)
+            logging.info(f"Generated presigned URL for {gcs_path}")
             return url
         except GoogleCloudError as e:
             logging.error(
                 f"Error generating presigned URL for {gcs_path}: {str(e)}")
             return None
 
-    def create_user_folder(self, username, folder):
-        """Simulate creating a folder for the user in GCS by uploading a dummy file."""
-        folder_path = f"artifacts/{username}/{folder}".rstrip('/') + '/'
-        dummy_blob_path = folder_path + '.keep'
-        blob = self.bucket.blob(dummy_blob_path)
-        if blob.exists():
-            raise FileExistsError(
-                f"GCS folder '{folder}' already exists for user '{username}'.")
-        blob.upload_from_string('', content_type='text/plain')
-        logging.info(
-            f"Created GCS folder '{folder}' for user '{username}' (dummy .keep file uploaded).")
-        return folder_path
-
-    def delete_user_folder(self, username, folder):
-        """Delete a folder for the user in GCS by removing all blobs with the folder prefix."""
-        if not self.enabled or not self.client:
-            raise ValueError("GCS not enabled")
-
-        folder_path = f"artifacts/{username}/{folder}/".rstrip('/')
-
-        # List all blobs under the folder prefix (handle pagination)
-        blobs = list(self.client.list_blobs(
-            self.bucket, prefix=folder_path + '/'))
-
-        # Check if folder exists
-        if not blobs:
-            logging.error(f"GCS folder not found: {folder_path}")
-            raise FileNotFoundError(
-                f"GCS folder '{folder}' does not exist for user '{username}'.")
-
-        # Check if folder is empty (only .keep file or no files)
-        keep_file_path = f"{folder_path}/.keep"
-        non_keep_blobs = [
-            blob for blob in blobs if blob.name != keep_file_path]
-
-        if non_keep_blobs:
-            blob_names = [blob.name for blob in non_keep_blobs]
-            logging.error(
-                f"GCS folder '{folder}' is not empty for user '{username}'. Contents: {blob_names}")
-            raise ValueError(
-                f"GCS folder '{folder}' is not empty. Contains: {blob_names}")
-
-        # Delete all blobs (should only be .keep file or none)
-        try:
-            for blob in blobs:
-                blob.delete()
-                logging.debug(f"Deleted blob: {blob.name}")
-            logging.info(
-                f"Successfully deleted GCS folder '{folder}' for user '{username}'.")
-            return True
-        except GoogleCloudError as e:
-            logging.error(
-                f"Error deleting blobs in GCS folder '{folder}' for user '{username}': {str(e)}")
-            raise
-
-    def rename_user_folder(self, username, old_folder, new_folder):
-        """Rename a folder for the user in GCS by copying all objects to new prefix and deleting old ones."""
-        old_path = f"artifacts/{username}/{old_folder}".rstrip('/') + '/'
-        new_path = f"artifacts/{username}/{new_folder}".rstrip('/') + '/'
-
-        # Check if old folder exists
-        blobs = list(self.bucket.list_blobs(prefix=old_path, max_results=1))
-        if not blobs:
-            raise FileNotFoundError(
-                f"GCS folder '{old_folder}' does not exist for user '{username}'.")
-
-        # Check if new folder already exists
-        blobs = list(self.bucket.list_blobs(prefix=new_path, max_results=1))
-        if blobs:
-            raise FileExistsError(
-                f"GCS folder '{new_folder}' already exists for user '{username}'.")
-
-        # Copy all objects to new location
-        blobs_to_copy = list(self.bucket.list_blobs(prefix=old_path))
-        for blob in blobs_to_copy:
-            new_name = blob.name.replace(old_path, new_path, 1)
-            self.bucket.copy_blob(blob, self.bucket, new_name)
-
-        # Delete old objects
-        for blob in blobs_to_copy:
-            blob.delete()
-
-        logging.info(
-            f"Renamed GCS folder from '{old_folder}' to '{new_folder}' for user '{username}'.")
-        return True
-
-    def create_zip_from_folder(self, username, folder, zip_path):
-        """Create a ZIP file containing all .md files in the user's folder in GCS."""
-        if not self.enabled or not self.client:
-            raise ValueError("GCS not enabled")
-
-        prefix = f"artifacts/{username}/{folder}/" if folder else f"artifacts/{username}/"
-        blobs = self.client.list_blobs(self.bucket, prefix=prefix)
-        any_blobs = False
-
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for blob in blobs:
-                if blob.name.endswith('.md'):
-                    any_blobs = True
-                    try:
-                        content = blob.download_as_text(encoding='utf-8')
-                    except UnicodeDecodeError:
-                        content = blob.download_as_text(encoding='iso-8859-1')
-                    arcname = os.path.join(folder or 'root', os.path.relpath(
-                        blob.name, f"artifacts/{username}"))
-                    zipf.writestr(arcname, content)
-                    logging.debug(f"Added {blob.name} to ZIP as {arcname}")
-
-        if not any_blobs and folder:
-            logging.error(f"GCS folder not found: {prefix}")
-            raise FileNotFoundError(f"Folder '{folder}' not found")
-
-        logging.info(
-            f"Created ZIP file at {zip_path} from GCS for folder '{folder or 'root'}' for user {username}")
-
-    def create_zip_from_files(self, username, folder, files, zip_path):
-        """Create a ZIP file containing specified .md files in the user's folder in GCS."""
-        if not self.enabled or not self.client:
-            raise ValueError("GCS not enabled")
-
-        prefix = f"artifacts/{username}/{folder}/" if folder else f"artifacts/{username}/"
-        any_blobs = list(self.client.list_blobs(
-            self.bucket, prefix=prefix, max_results=1))
-        if not any_blobs and folder:
-            logging.error(f"GCS folder not found: {prefix}")
-            raise FileNotFoundError(f"Folder '{folder}' not found")
-
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for file in files:
-                gcs_path = os.path.join(prefix, file).replace(os.sep, '/')
-                blob = self.bucket.blob(gcs_path)
-                if not blob.exists():
-                    logging.error(f"GCS file not found: {gcs_path}")
-                    raise FileNotFoundError(
-                        f"File '{file}' not found in folder '{folder or 'root'}'")
-
-                try:
-                    content = blob.download_as_text(encoding='utf-8')
-                except UnicodeDecodeError:
-                    content = blob.download_as_text(encoding='iso-8859-1')
-
-                arcname = os.path.join(folder or 'root', file)
-                zipf.writestr(arcname, content)
-                logging.debug(f"Added {gcs_path} to ZIP as {arcname}")
-
-        logging.info(
-            f"Created ZIP file at {zip_path} from GCS for {len(files)} files in folder '{folder or 'root'}' for user {username}")
-
 
 gcs_client = GCSClient()
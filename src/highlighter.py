@@ -0,0 +1,156 @@
+"""
+Single-pass keyword highlighting for practice sentences.
+
+A keyword set is compiled once into a matcher and cached by the set, so a
+request only pays for scanning its text. Small sets compile to one combined
+regular expression; large vocabularies use an Aho-Corasick automaton, whose
+scan cost does not grow with the number of keywords. Both matchers pick the
+leftmost, longest whole-word match and never look inside inserted tags.
+"""
+
+import re
+import threading
+from collections import OrderedDict
+
+# Keyword sets larger than this are matched with an Aho-Corasick automaton
+AUTOMATON_THRESHOLD = 200
+MATCHER_CACHE_SIZE = 128
+
+_matchers = OrderedDict()
+_matchers_lock = threading.Lock()
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == '_'
+
+
+def _is_boundary(text, index):
+    """Equivalent of regex \\b at index."""
+    before = index > 0 and _is_word_char(text[index - 1])
+    after = index < len(text) and _is_word_char(text[index])
+    return before != after
+
+
+def _is_whole_word(text, start, end):
+    return _is_boundary(text, start) and _is_boundary(text, end)
+
+
+class RegexMatcher:
+    def __init__(self, keywords):
+        # Longest first so "Den Haag" wins over "Den"
+        alternatives = sorted(keywords, key=len, reverse=True)
+        self.pattern = re.compile(
+            r'\b(?:' + '|'.join(map(re.escape, alternatives)) + r')\b', re.IGNORECASE)
+
+    def matches(self, text):
+        """Yield (start, end) of keyword occurrences, left to right."""
+        for match in self.pattern.finditer(text):
+            yield match.start(), match.end()
+
+
+class KeywordAutomaton:
+    def __init__(self, keywords):
+        self.keywords = list(keywords)
+        self._fallback = None
+        self.transitions = [{}]
+        self.fail = [0]
+        # Lengths of the keywords that end at each state, longest first
+        self.outputs = [[]]
+        for keyword in keywords:
+            self._add(keyword.lower())
+        self._build_failure_links()
+
+    def _add(self, keyword):
+        state = 0
+        for char in keyword:
+            next_state = self.transitions[state].get(char)
+            if next_state is None:
+                next_state = len(self.transitions)
+                self.transitions[state][char] = next_state
+                self.transitions.append({})
+                self.fail.append(0)
+                self.outputs.append([])
+            state = next_state
+        if len(keyword) not in self.outputs[state]:
+            self.outputs[state].append(len(keyword))
+
+    def _build_failure_links(self):
+        queue = list(self.transitions[0].values())
+        for state in queue:
+            for char, next_state in self.transitions[state].items():
+                fallback = self.fail[state]
+                while fallback and char not in self.transitions[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.transitions[fallback].get(char, 0)
+                self.fail[next_state] = target if target != next_state else 0
+                self.outputs[next_state] = sorted(
+                    set(self.outputs[next_state] + self.outputs[self.fail[next_state]]), reverse=True)
+                queue.append(next_state)
+
+    def matches(self, text):
+        """Yield (start, end) of keyword occurrences, left to right."""
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            # Case folding changed offsets; fall back to the regex matcher
+            if self._fallback is None:
+                self._fallback = RegexMatcher(self.keywords)
+            yield from self._fallback.matches(text)
+            return
+
+        # Longest whole-word match ending at each position
+        best_start = {}
+        state = 0
+        for end, char in enumerate(lowered, 1):
+            while state and char not in self.transitions[state]:
+                state = self.fail[state]
+            state = self.transitions[state].get(char, 0)
+            for length in self.outputs[state]:
+                start = end - length
+                if _is_whole_word(text, start, end):
+                    if start not in best_start or best_start[start] < end:
+                        best_start[start] = end
+
+        position = 0
+        for start in sorted(best_start):
+            if start >= position:
+                position = best_start[start]
+                yield start, position
+
+
+def get_matcher(keywords):
+    """Return the compiled matcher for a keyword set, building it on first use."""
+    key = frozenset(keyword for keyword in keywords if keyword)
+    with _matchers_lock:
+        matcher = _matchers.get(key)
+        if matcher is not None:
+            _matchers.move_to_end(key)
+            return matcher
+    if len(key) > AUTOMATON_THRESHOLD:
+        matcher = KeywordAutomaton(key)
+    else:
+        matcher = RegexMatcher(key) if key else None
+    with _matchers_lock:
+        _matchers[key] = matcher
+        while len(_matchers) > MATCHER_CACHE_SIZE:
+            _matchers.popitem(last=False)
+    return matcher
+
+
+def highlight(text, keywords, matcher=None):
+    """Wrap every keyword occurrence in text in <strong> tags in a single pass."""
+    matcher = matcher or get_matcher(keywords)
+    if matcher is None:
+        return text
+    parts, position = [], 0
+    for start, end in matcher.matches(text):
+        parts.append(text[position:start])
+        parts.append(f'<strong>{text[start:end]}</strong>')
+        position = end
+    parts.append(text[position:])
+    return ''.join(parts)
+
+
+def highlight_many(texts, keywords):
+    """Highlight several texts with the same keyword set."""
+    matcher = get_matcher(keywords)
+    return [highlight(text, keywords, matcher) for text in texts]
@@ -0,0 +1,310 @@
+"""
+Background jobs for slow work that should not hold a request worker.
+
+Jobs are rows in a SQLite queue so their status and results are visible to
+every worker process and survive restarts; each process runs a small pool of
+threads that executes the jobs it accepted. Secrets needed to run a job (such
+as a user's API key) are only kept in the memory of that process, so a job
+whose process died is reported as interrupted instead of being run without
+them.
+"""
+
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import logging
+import threading
+
+JOB_DB_PATH = os.getenv('JOB_DB_PATH', os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'jobs.db'))
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 4))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+# Delay before the first retry; doubled for every further attempt
+JOB_RETRY_DELAY = float(os.getenv('JOB_RETRY_DELAY', 2))
+# Finished jobs are kept this many seconds for status polling
+JOB_RETENTION = int(os.getenv('JOB_RETENTION', 86400))
+# A process that has not checked in for this long is considered gone
+NODE_TIMEOUT = 60
+HEARTBEAT_INTERVAL = 10
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+FINISHED = (DONE, FAILED, CANCELLED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    node TEXT NOT NULL,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    payload BLOB,
+    result TEXT,
+    partial TEXT,
+    error TEXT,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    run_after REAL NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (node, status, run_after);
+CREATE TABLE IF NOT EXISTS job_nodes (
+    node TEXT PRIMARY KEY,
+    seen_at REAL NOT NULL
+);
+"""
+# Columns added after the first release of the queue
+MIGRATIONS = ["ALTER TABLE jobs ADD COLUMN partial TEXT"]
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler when its job was cancelled."""
+
+
+class Job:
+    """What a handler sees of the job it runs."""
+
+    def __init__(self, queue, job_id, owner, params, payload, secrets, attempt):
+        self.queue = queue
+        self.id = job_id
+        self.owner = owner
+        self.params = params
+        self.payload = payload
+        self.secrets = secrets
+        self.attempt = attempt
+
+    def set_progress(self, progress, message=None, partial=None):
+        """Record progress (0..1) and stop the job if it was cancelled meanwhile.
+
+        partial is an optional JSON serializable result so far, returned by
+        status requests while the job is still running.
+        """
+        fields = {'progress': progress, 'message': message}
+        if partial is not None:
+            fields['partial'] = json.dumps(partial)
+        self.queue._update(self.id, **fields)
+        self.check_cancelled()
+
+    def check_cancelled(self):
+        row = self.queue._execute(
+            "SELECT cancel_requested FROM jobs WHERE id = ?", (self.id,)).fetchone()
+        if row and row[0]:
+            raise JobCancelled()
+
+
+class JobQueue:
+    def __init__(self, path, workers):
+        self.path = path
+        self.workers = workers
+        self._handlers = {}
+        self._secrets = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._threads = []
+        self._pid = None
+        self.node = None
+
+    def register(self, kind, handler, retry_on=()):
+        """Register handler(job) for a job kind.
+
+        The handler's return value (JSON serializable) becomes the job
+        result. Exceptions of the retry_on types are retried with backoff.
+        """
+        self._handlers[kind] = (handler, tuple(retry_on))
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+            for migration in MIGRATIONS:
+                try:
+                    connection.execute(migration)
+                except sqlite3.OperationalError:
+                    pass  # Already applied
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _execute(self, sql, args=()):
+        return self._connect().execute(sql, args)
+
+    def _update(self, job_id, **fields):
+        fields['updated_at'] = time.time()
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        self._execute(f"UPDATE jobs SET {assignments} WHERE id = ?",
+                      (*fields.values(), job_id))
+
+    def _ensure_workers(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # First use in this process (or after a fork): start a fresh pool
+            self._pid = os.getpid()
+            self.node = f"{socket.gethostname()}:{self._pid}:{uuid.uuid4().hex[:8]}"
+            self._secrets.clear()
+            self._heartbeat()
+            self._threads = [threading.Thread(target=self._run_worker, daemon=True,
+                                              name=f"job-worker-{i}")
+                             for i in range(self.workers)]
+            self._threads.append(threading.Thread(
+                target=self._run_heartbeat, daemon=True, name='job-heartbeat'))
+            for thread in self._threads:
+                thread.start()
+
+    def submit(self, kind, owner, params, payload=None, secrets=None, max_attempts=None):
+        """Queue a job and return its id."""
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        self._ensure_workers()
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        if secrets:
+            self._secrets[job_id] = secrets
+        self._execute(
+            "INSERT INTO jobs (id, kind, owner, node, status, params, payload, max_attempts,"
+            " run_after, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, owner, self.node, QUEUED, json.dumps(params), payload,
+             max_attempts or JOB_MAX_ATTEMPTS, now, now, now))
+        with self._wakeup:
+            self._wakeup.notify()
+        logging.info(f"Queued {kind} job {job_id} for {owner}")
+        return job_id
+
+    def get(self, job_id, owner=None):
+        """Return the public state of a job, or None if unknown (or not owner's)."""
+        row = self._execute(
+            "SELECT id, kind, owner, status, result, error, progress, message, attempts,"
+            " created_at, updated_at, partial FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or (owner is not None and row[2] != owner):
+            return None
+        return {
+            'id': row[0],
+            'kind': row[1],
+            'status': row[3],
+            'result': json.loads(row[4]) if row[4] else None,
+            'partial': json.loads(row[11]) if row[11] else None,
+            'error': row[5],
+            'progress': row[6],
+            'message': row[7],
+            'attempts': row[8],
+            'created_at': row[9],
+            'updated_at': row[10]
+        }
+
+    def cancel(self, job_id, owner=None):
+        """Cancel a queued job or ask a running one to stop; returns its new status or None."""
+        job = self.get(job_id, owner)
+        if job is None:
+            return None
+        if job['status'] == QUEUED:
+            self._execute(
+                "UPDATE jobs SET status = ?, payload = NULL, cancel_requested = 1, updated_at = ?"
+                " WHERE id = ? AND status = ?", (CANCELLED, time.time(), job_id, QUEUED))
+            self._secrets.pop(job_id, None)
+        elif job['status'] == RUNNING:
+            self._update(job_id, cancel_requested=1)
+        return self.get(job_id)['status']
+
+    def stats(self):
+        counts = dict(self._execute(
+            "SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {'workers': self.workers, 'node': self.node, 'jobs': counts}
+
+    def _claim(self):
+        """Mark the next due job of this process as running and return it."""
+        with self._lock:
+            connection = self._connect()
+            now = time.time()
+            row = connection.execute(
+                "SELECT id, kind, owner, params, payload, attempts, max_attempts FROM jobs"
+                " WHERE node = ? AND status = ? AND run_after <= ? ORDER BY run_after LIMIT 1",
+                (self.node, QUEUED, now)).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (RUNNING, now, row[0]))
+        job_id, kind, owner, params, payload, attempts, max_attempts = row
+        return kind, max_attempts, Job(self, job_id, owner, json.loads(params), payload,
+                                       self._secrets.get(job_id, {}), attempts + 1)
+
+    def _finish(self, job_id, status, result=None, error=None):
+        fields = {'status': status, 'payload': None, 'error': error, 'message': None, 'partial': None,
+                  'result': json.dumps(result) if result is not None else None}
+        if status == DONE:
+            fields['progress'] = 1
+        self._update(job_id, **fields)
+        self._secrets.pop(job_id, None)
+
+    def _run_job(self, kind, max_attempts, job):
+        handler, retry_on = self._handlers[kind]
+        try:
+            job.check_cancelled()
+            result = handler(job)
+        except JobCancelled:
+            self._finish(job.id, CANCELLED)
+            logging.info(f"Cancelled {kind} job {job.id}")
+        except retry_on as e:
+            if job.attempt >= max_attempts:
+                self._finish(job.id, FAILED, error=str(e))
+                logging.error(f"{kind} job {job.id} failed after {job.attempt} attempts: {str(e)}")
+                return
+            delay = JOB_RETRY_DELAY * 2 ** (job.attempt - 1)
+            self._update(job.id, status=QUEUED, error=str(e), run_after=time.time() + delay,
+                         message=f"Retrying in {delay:.0f}s")
+            logging.warning(f"Retrying {kind} job {job.id} in {delay:.0f}s: {str(e)}")
+        except Exception as e:
+            self._finish(job.id, FAILED, error=str(e))
+            logging.error(f"{kind} job {job.id} failed: {str(e)}")
+        else:
+            self._finish(job.id, DONE, result=result)
+            logging.info(f"Finished {kind} job {job.id}")
+
+    def _heartbeat(self):
+        """Check in this process and fail jobs left behind by processes that are gone."""
+        now = time.time()
+        self._execute("INSERT OR REPLACE INTO job_nodes (node, seen_at) VALUES (?, ?)",
+                      (self.node, now))
+        self._execute(
+            "UPDATE jobs SET status = ?, payload = NULL, updated_at = ?,"
+            " error = 'Job was interrupted, please submit it again'"
+            " WHERE status IN (?, ?) AND node IN"
+            " (SELECT node FROM job_nodes WHERE seen_at < ?)",
+            (FAILED, now, QUEUED, RUNNING, now - NODE_TIMEOUT))
+        self._execute("DELETE FROM job_nodes WHERE seen_at < ?", (now - NODE_TIMEOUT,))
+        self._execute("DELETE FROM jobs WHERE status IN (?, ?, ?) AND updated_at < ?",
+                      (*FINISHED, now - JOB_RETENTION))
+
+    def _run_heartbeat(self):
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            try:
+                self._heartbeat()
+            except Exception as e:
+                logging.error(f"Error updating job queue heartbeat: {str(e)}")
+
+    def _run_worker(self):
+        while True:
+            try:
+                claimed = self._claim()
+            except Exception as e:
+                logging.error(f"Error polling job queue: {str(e)}")
+                claimed = None
+            if claimed is None:
+                with self._wakeup:
+                    self._wakeup.wait(timeout=1)
+                continue
+            self._run_job(*claimed)
+
+
+job_queue = JobQueue(JOB_DB_PATH, JOB_WORKERS)
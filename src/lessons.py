@@ -0,0 +1,256 @@
+"""
+Parsing of practice lessons and an LRU cache of parsed lessons.
+
+A lesson is a markdown file containing a ``| Target Language | Native
+Language |`` table (practice) and/or a ``| Dutch | English |`` table
+(progress tests). Compiling turns it into sentence pairs, a keyword list,
+cloze candidates and a sentence -> translation lookup, which is what every
+practice and test endpoint needs. Compiled lessons are stored next to the
+lesson as a hidden JSON sidecar so they are parsed once per edit.
+"""
+
+import re
+import random
+import logging
+import threading
+from collections import OrderedDict
+
+SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?])\s+')
+TEST_SENTENCE_SPLIT_RE = re.compile(r'[.!?]+')
+TEST_TABLE_RE = re.compile(
+    r'\| Dutch \| English \|\n\|[-| ]+\|[-| ]+\|\n(.*?)(?=\n\n|\Z)', re.DOTALL)
+# Sentences shorter than this cannot be turned into a cloze question
+CLOZE_MIN_WORDS = 3
+LESSON_VERSION = 1
+COMMON_KEYWORDS = ['Inge', 'Paula', 'Alex', 'Den Haag',
+                   'Rotterdam', 'Frankrijk', 'China', 'Marktstraat']
+
+
+def parse_markdown_table(content, row_offsets=None):
+    """Parse markdown table into a list of {'target_lang': ..., 'native_lang': ...} using basic string manipulation.
+
+    If row_offsets is a list, the character offset of the table row each
+    sentence came from is appended to it.
+    """
+    sentences = []
+    in_table = False
+    header_processed = False
+
+    offset = 0
+    for line in content.splitlines(keepends=True):
+        row_offset = offset
+        offset += len(line)
+        line = line.strip()
+        if not line:
+            continue
+
+        # Detect table start
+        if line.startswith('|') and 'Target Language' in line and 'Native Language' in line:
+            in_table = True
+            header_processed = False
+            continue
+
+        # Process table rows
+        if in_table and line.startswith('|'):
+            if not header_processed and '---' in line:
+                header_processed = True
+                continue
+
+            # Split row into columns
+            columns = [col.strip() for col in line.strip('|').split('|')]
+            if len(columns) >= 2:
+                target_lang = columns[0]
+                native_lang = columns[1]
+                # Split into sentences using a simple regex
+                target_lang_sentences = SENTENCE_SPLIT_RE.split(
+                    target_lang.strip())
+                native_lang_sentences = SENTENCE_SPLIT_RE.split(
+                    native_lang.strip())
+                # Pair sentences (handle mismatched lengths)
+                max_len = max(len(target_lang_sentences),
+                              len(native_lang_sentences))
+                target_lang_sentences.extend(
+                    [''] * (max_len - len(target_lang_sentences)))
+                native_lang_sentences.extend(
+                    [''] * (max_len - len(native_lang_sentences)))
+                for t, n in zip(target_lang_sentences, native_lang_sentences):
+                    if t or n:  # Only include non-empty pairs
+                        sentences.append(
+                            {'target_lang': t.strip(), 'native_lang': n.strip()})
+                        if row_offsets is not None:
+                            row_offsets.append(row_offset)
+
+    if not sentences:
+        logging.warning(
+            "No valid table or sentences found in markdown content")
+
+    return sentences
+
+
+def extract_keywords(text):
+    """Extract keywords from Target Language text."""
+    words = text.split()
+    keywords = [
+        word for word in words if word in COMMON_KEYWORDS or word.istitle()]
+    return list(set(keywords))  # Remove duplicates
+
+
+def parse_test_table(content):
+    """Parse a | Dutch | English | table into {'dutch': ..., 'english': ...} pairs for tests."""
+    table_section = TEST_TABLE_RE.search(content)
+    if not table_section:
+        return []
+
+    pairs = []
+    for row in table_section.group(1).strip().split('\n'):
+        columns = [col.strip() for col in row.split('|')[1:3]]
+        if len(columns) != 2:
+            logging.warning(f"Invalid row format: {row}")
+            continue
+        dutch, english = columns
+        dutch_sentences = [s.strip()
+                           for s in TEST_SENTENCE_SPLIT_RE.split(dutch) if s.strip()]
+        english_sentences = [s.strip()
+                             for s in TEST_SENTENCE_SPLIT_RE.split(english) if s.strip()]
+        for d, e in zip(dutch_sentences, english_sentences):
+            pairs.append({'dutch': d, 'english': e})
+    return pairs
+
+
+def compile_lesson(content):
+    """Parse lesson content into the structures the practice and test endpoints use."""
+    row_offsets = []
+    sentences = parse_markdown_table(content, row_offsets)
+    translations = {}
+    for s in sentences:
+        # Keep the first translation when a sentence appears twice
+        translations.setdefault(s['target_lang'], s['native_lang'])
+    return {
+        'sentences': sentences,
+        'row_offsets': row_offsets,
+        'keywords': extract_keywords(' '.join(s['target_lang'] for s in sentences)),
+        'cloze_candidates': [i for i, s in enumerate(sentences)
+                             if len(s['target_lang'].split()) >= CLOZE_MIN_WORDS],
+        'translations': translations,
+        'test_pairs': parse_test_table(content)
+    }
+
+
+def is_lesson(lesson):
+    """Whether compiled content holds any table worth storing as a sidecar."""
+    return bool(lesson['sentences'] or lesson['test_pairs'])
+
+
+def lesson_to_dict(lesson, generation):
+    """Serialize a compiled lesson for its sidecar, stamped with the source generation."""
+    return {'version': LESSON_VERSION, 'generation': generation, 'lesson': lesson}
+
+
+def lesson_from_dict(data, generation):
+    """Return the lesson stored in a sidecar if it was compiled from generation, else None."""
+    if not isinstance(data, dict) or data.get('version') != LESSON_VERSION:
+        return None
+    if generation is None or data.get('generation') != generation:
+        return None
+    return data.get('lesson')
+
+
+def make_cloze_item(sentence, rng=random):
+    """Hide one random word of a Target Language sentence."""
+    words = sentence['target_lang'].split()
+    hide_index = rng.randint(0, len(words) - 1)
+    correct_word = words[hide_index]
+    words[hide_index] = '_____'
+    return {
+        'sentence': ' '.join(words),
+        'correct_word': correct_word,
+        'original': sentence['target_lang'],
+        'native_lang': sentence['native_lang']
+    }
+
+
+def make_quiz_item(sentence, sentences, rng=random):
+    """Build a multiple-choice question whose distractors are other translations."""
+    correct_answer = sentence['native_lang']
+    distractors = [s['native_lang'] for s in rng.sample(
+        sentences, min(3, len(sentences))) if s['native_lang'] != correct_answer]
+    while len(distractors) < 3:
+        distractors.append("Incorrect option")
+    answers = [correct_answer] + distractors[:3]
+    rng.shuffle(answers)
+    return {
+        'question': sentence['target_lang'],
+        'answers': answers,
+        'correct_answer': correct_answer
+    }
+
+
+def _unique_sentences(sentences, indexes):
+    """Sentences at indexes, keeping the first of repeated Target Language sentences."""
+    seen, unique = set(), []
+    for i in indexes:
+        if sentences[i]['target_lang'] not in seen:
+            seen.add(sentences[i]['target_lang'])
+            unique.append(sentences[i])
+    return unique
+
+
+def sample_cloze_items(lesson, count, rng=random):
+    """Return up to count cloze items for distinct sentences, sampled without replacement."""
+    candidates = _unique_sentences(lesson['sentences'], lesson['cloze_candidates'])
+    return [make_cloze_item(s, rng)
+            for s in rng.sample(candidates, min(count, len(candidates)))]
+
+
+def sample_quiz_items(lesson, count, rng=random):
+    """Return up to count quiz questions for distinct sentences, sampled without replacement."""
+    sentences = lesson['sentences']
+    questions = _unique_sentences(sentences, range(len(sentences)))
+    return [make_quiz_item(s, sentences, rng)
+            for s in rng.sample(questions, min(count, len(questions)))]
+
+
+class LessonCache:
+    """LRU cache of compiled lessons keyed by (username, folder, filename).
+
+    Each entry stores the generation of the file it was compiled from; the
+    caller serves it only once it has confirmed the file's current
+    generation still matches, since other workers may have changed it.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'sidecar_hits': 0}
+
+    def get(self, key):
+        """Return (lesson, generation) or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, lesson, generation):
+        with self._lock:
+            self._entries[key] = (lesson, generation)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def record(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update(entries=len(self._entries),
+                         max_entries=self.max_entries)
+        return stats
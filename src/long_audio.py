@@ -0,0 +1,97 @@
+"""
+Splitting long recordings into overlapping chunks for transcription.
+
+Chunks are cut in a pause close to every CHUNK_SECONDS mark (found with
+pydub's silence detection in a window around the mark, so the whole file is
+never scanned) and extended by a small overlap on both sides so a word at a
+cut is heard in full by one of the two chunks. Each chunk remembers the
+"core" range it is responsible for; when the per-chunk segments are stitched
+back together, a segment is kept only by the chunk whose core contains its
+midpoint, which removes the duplicates the overlap produces.
+"""
+
+import io
+import os
+
+# Uploads larger than this are always transcribed in chunks (the API limit is 25 MB)
+LONG_AUDIO_BYTES = int(os.getenv('LONG_AUDIO_BYTES', 20 * 1024 * 1024))
+CHUNK_SECONDS = int(os.getenv('LONG_AUDIO_CHUNK_SECONDS', 120))
+CHUNK_OVERLAP_MS = 1000
+# How far from a chunk mark to look for a pause to cut in
+SILENCE_SEARCH_MS = 10000
+MIN_SILENCE_MS = 400
+SILENCE_MARGIN_DB = 16
+SILENCE_SEEK_MS = 10
+
+
+def find_cut_points(sound, chunk_ms):
+    """Return the cut positions (ms) splitting sound into chunks of about chunk_ms."""
+    from pydub.silence import detect_silence
+
+    silence_thresh = sound.dBFS - SILENCE_MARGIN_DB
+    cuts = []
+    mark = chunk_ms
+    while mark < len(sound) - chunk_ms / 4:
+        window_start = max(0, mark - SILENCE_SEARCH_MS)
+        window = sound[window_start:mark + SILENCE_SEARCH_MS]
+        silences = detect_silence(window, min_silence_len=MIN_SILENCE_MS,
+                                  silence_thresh=silence_thresh, seek_step=SILENCE_SEEK_MS)
+        if silences:
+            # Middle of the pause closest to the mark
+            cut = min((window_start + (start + end) // 2 for start, end in silences),
+                      key=lambda position: abs(position - mark))
+        else:
+            cut = mark
+        cuts.append(cut)
+        mark = cut + chunk_ms
+    return cuts
+
+
+def plan_chunks(length_ms, cuts, overlap_ms=CHUNK_OVERLAP_MS):
+    """Return the chunks of a recording of length_ms cut at cuts.
+
+    Every chunk is {'start', 'end', 'core_start', 'core_end'} with times in
+    milliseconds; the cores tile the recording and the chunks overlap them.
+    """
+    bounds = [0] + cuts + [length_ms]
+    return [{
+        'start': max(0, core_start - overlap_ms),
+        'end': min(length_ms, core_end + overlap_ms),
+        'core_start': core_start,
+        'core_end': core_end
+    } for core_start, core_end in zip(bounds, bounds[1:])]
+
+
+def split_audio(data, source_format=None, chunk_ms=CHUNK_SECONDS * 1000, overlap_ms=CHUNK_OVERLAP_MS):
+    """Decode audio and return its chunks (see plan_chunks), each with its MP3 'audio'.
+
+    CPU bound; meant to run in the audio process pool.
+    """
+    from pydub import AudioSegment
+
+    sound = AudioSegment.from_file(io.BytesIO(data), format=source_format)
+    chunks = plan_chunks(len(sound), find_cut_points(sound, chunk_ms), overlap_ms)
+    for chunk in chunks:
+        encoded = io.BytesIO()
+        sound[chunk['start']:chunk['end']].export(encoded, format="mp3")
+        chunk['audio'] = encoded.getvalue()
+    return chunks
+
+
+def stitch_segments(transcribed_chunks):
+    """Merge (chunk, segments) pairs into one timeline of segments.
+
+    Segment times are seconds relative to their chunk; the result uses
+    seconds from the start of the recording and is ordered by start time.
+    """
+    stitched = []
+    for chunk, segments in transcribed_chunks:
+        offset = chunk['start'] / 1000
+        core_start, core_end = chunk['core_start'] / 1000, chunk['core_end'] / 1000
+        for segment in segments:
+            start, end = segment['start'] + offset, segment['end'] + offset
+            if core_start <= (start + end) / 2 < core_end:
+                stitched.append({'start': round(start, 2), 'end': round(end, 2),
+                                 'text': segment['text']})
+    stitched.sort(key=lambda segment: segment['start'])
+    return stitched
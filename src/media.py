@@ -0,0 +1,97 @@
+"""
+Serving stored media (audio, images) with conditional and Range requests.
+
+Responses carry a strong ETag built from the file size and version (the
+mtime on disk, the generation or a content checksum elsewhere) and a
+Cache-Control policy chosen by media type. Range requests are answered with
+206 by seeking in the file, so seeking in a long recording only transfers
+the requested bytes; requests that run to the end of the file are handed to
+the server's wsgi.file_wrapper, which lets servers such as gunicorn use
+sendfile().
+"""
+
+from flask import current_app, request
+from werkzeug.datastructures import ContentRange
+from werkzeug.http import is_resource_modified
+from werkzeug.wsgi import wrap_file
+
+MEDIA_BUFFER_SIZE = 64 * 1024
+# Cache-Control by top-level media type; anything else is revalidated each time
+CACHE_POLICIES = {
+    'audio': 'private, max-age=86400',
+    'video': 'private, max-age=86400',
+    'image': 'private, max-age=3600',
+}
+DEFAULT_CACHE_POLICY = 'private, no-cache'
+
+
+def media_etag(size, version):
+    return f"{size:x}-{version:x}" if isinstance(version, int) else f"{size:x}-{version}"
+
+
+def cache_policy(mimetype):
+    return CACHE_POLICIES.get(mimetype.split('/', 1)[0], DEFAULT_CACHE_POLICY)
+
+
+def _read_range(file, length):
+    try:
+        while length > 0:
+            chunk = file.read(min(MEDIA_BUFFER_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def send_media(file, size, version, mimetype, last_modified=None, download_name=None):
+    """Send an open binary file, answering conditional and single Range requests.
+
+    The file is closed once the response has been sent (or right away for
+    304 and 416 responses).
+    """
+    etag = media_etag(size, version)
+    response = current_app.response_class(mimetype=mimetype, direct_passthrough=True)
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+        last_modified = response.last_modified
+    response.accept_ranges = 'bytes'
+    response.headers['Cache-Control'] = cache_policy(mimetype)
+    if download_name:
+        response.headers.set('Content-Disposition', 'inline', filename=download_name)
+
+    environ = request.environ
+    if not is_resource_modified(environ, etag=etag, last_modified=last_modified):
+        file.close()
+        response.status_code = 304
+        return response
+
+    start, length = 0, size
+    byte_range = request.range
+    # Multi-range requests are answered with the whole file
+    if byte_range is not None and len(byte_range.ranges) == 1 and (
+            'HTTP_IF_RANGE' not in environ or not is_resource_modified(
+                environ, etag=etag, last_modified=last_modified, ignore_if_range=False)):
+        bounds = byte_range.range_for_length(size)
+        if bounds is None:
+            file.close()
+            response.status_code = 416
+            response.content_range = ContentRange('bytes', None, None, size)
+            response.content_length = 0
+            return response
+        start, stop = bounds
+        length = stop - start
+        response.status_code = 206
+        response.content_range = ContentRange('bytes', start, stop, size)
+
+    response.content_length = length
+    if start:
+        file.seek(start)
+    if start + length == size:
+        # To the end of the file: let the server stream it (sendfile where supported)
+        response.response = wrap_file(environ, file, MEDIA_BUFFER_SIZE)
+    else:
+        response.response = _read_range(file, length)
+    return response
@@ -0,0 +1,90 @@
+"""
+Pool of OpenAI clients shared across requests and jobs.
+
+Each client owns an HTTP connection pool, so reusing the client of an API
+key keeps its connections (and TLS sessions) alive between transcriptions.
+Clients are keyed by a hash of the key so the pool never holds plain keys
+as dictionary keys, the pool is bounded, and clients idle for too long are
+dropped; their connections close once the last in-flight call releases them.
+"""
+
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from openai import OpenAI
+
+OPENAI_CLIENT_POOL_SIZE = int(os.getenv('OPENAI_CLIENT_POOL_SIZE', 64))
+OPENAI_CLIENT_IDLE_TIMEOUT = int(os.getenv('OPENAI_CLIENT_IDLE_TIMEOUT', 600))
+# Per-request timeout (seconds) of pooled clients
+OPENAI_REQUEST_TIMEOUT = float(os.getenv('OPENAI_REQUEST_TIMEOUT', 120))
+
+
+class ClientPool:
+    def __init__(self, max_clients, idle_timeout, factory=OpenAI, **client_options):
+        # client_options (timeout, max_retries, base_url...) apply to every new client
+        self.max_clients = max_clients
+        self.idle_timeout = idle_timeout
+        self.factory = factory
+        self.client_options = client_options
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    @staticmethod
+    def key(api_key):
+        return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+
+    def _evict_idle(self, now):
+        while self._clients:
+            key, (_, last_used) = next(iter(self._clients.items()))
+            if now - last_used < self.idle_timeout:
+                break
+            del self._clients[key]
+            self.stats['evictions'] += 1
+
+    def get(self, api_key, **options):
+        """Return the pooled client for api_key, creating it on first use."""
+        if not api_key:
+            raise ValueError('API key is required')
+        key = self.key(api_key)
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._clients.get(key)
+            if entry is not None:
+                self._clients[key] = (entry[0], now)
+                self._clients.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry[0]
+            self.stats['misses'] += 1
+
+        client = self.factory(api_key=api_key, **{**self.client_options, **options})
+        with self._lock:
+            # Another thread may have created one meanwhile; keep the first
+            entry = self._clients.get(key)
+            if entry is not None:
+                client = entry[0]
+            self._clients[key] = (client, now)
+            self._clients.move_to_end(key)
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+                self.stats['evictions'] += 1
+        return client
+
+    def discard(self, api_key):
+        """Drop the client of an API key (e.g. after the key was rejected)."""
+        with self._lock:
+            self._clients.pop(self.key(api_key), None)
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update(clients=len(self._clients), max_clients=self.max_clients,
+                         idle_timeout=self.idle_timeout)
+        return stats
+
+
+openai_clients = ClientPool(OPENAI_CLIENT_POOL_SIZE, OPENAI_CLIENT_IDLE_TIMEOUT,
+                            timeout=OPENAI_REQUEST_TIMEOUT)
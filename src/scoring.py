@@ -0,0 +1,178 @@
+"""
+Answer scoring for progress tests.
+
+Answers are compared as multisets of words: exact matches are taken first,
+then each remaining expected word may claim one remaining answer word whose
+similarity is within the cutoff. Similarity is 1 - d / (len(a) + len(b)),
+where d is the edit distance counting a substitution as a deletion plus an
+insertion; this is the ratio difflib approximates for single words. Distances
+are computed in a band around the diagonal and abandoned as soon as the
+cutoff is out of reach, and only answer words of a compatible length are
+compared at all.
+"""
+
+import re
+import difflib
+from collections import Counter, defaultdict
+
+WORD_RE = re.compile(r'\b\w+\b')
+# Minimum similarity for partial credit on a misspelled word
+CLOSE_MATCH_CUTOFF = 0.8
+MAX_WORD_POINTS = 8
+MAX_ORDER_POINTS = 2
+MAX_FEEDBACK_DETAILS = 3
+
+
+def bounded_edit_distance(a, b, max_distance, substitution_cost=2):
+    """Return the edit distance of a and b, or None if it exceeds max_distance.
+
+    The default substitution cost of 2 gives the insert/delete distance used
+    for scoring; pass 1 for the Levenshtein distance.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return None
+    if a == b:
+        return 0
+    if len(a) > len(b):
+        a, b = b, a
+    limit = max_distance + 1
+    previous = [j if j <= max_distance else limit for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        low = max(1, i - max_distance)
+        high = min(len(b), i + max_distance)
+        current = [limit] * (len(b) + 1)
+        if i <= max_distance:
+            current[0] = i
+        for j in range(low, high + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else substitution_cost
+            current[j] = min(previous[j] + 1, current[j - 1] + 1,
+                             previous[j - 1] + cost, limit)
+        # Every path to the final cell crosses this row
+        if min(current[low - 1:high + 1]) > max_distance:
+            return None
+        previous = current
+    distance = previous[len(b)]
+    return distance if distance <= max_distance else None
+
+
+def max_close_distance(a, b, cutoff=CLOSE_MATCH_CUTOFF):
+    return int((1 - cutoff) * (len(a) + len(b)) + 1e-9)
+
+
+def find_close_match(word, words_by_length, cutoff=CLOSE_MATCH_CUTOFF, cache=None):
+    """Return the word closest to word within the cutoff, or None.
+
+    words_by_length maps a length to {candidate: set of its characters}.
+    """
+    # Lengths whose difference alone would already break the cutoff are skipped
+    shortest = int(len(word) * cutoff / (2 - cutoff))
+    longest = int(len(word) * (2 - cutoff) / cutoff + 1e-9)
+    candidates = [(candidate, chars) for length in range(shortest, longest + 1)
+                  for candidate, chars in words_by_length.get(length, {}).items()]
+    word_chars = set(word)
+    best, best_distance = None, None
+    for candidate, chars in sorted(candidates):
+        key = (word, candidate)
+        if cache is not None and key in cache:
+            distance = cache[key]
+        else:
+            max_distance = max_close_distance(word, candidate, cutoff)
+            # Characters missing from the other word must be inserted or deleted
+            missing = sum(1 for char in word if char not in chars) + \
+                sum(1 for char in candidate if char not in word_chars)
+            distance = None if missing > max_distance else bounded_edit_distance(
+                word, candidate, max_distance)
+            if cache is not None:
+                cache[key] = distance
+        if distance is not None and (best_distance is None or distance < best_distance):
+            best, best_distance = candidate, distance
+            if distance == 1:
+                break  # Nothing but an exact match is closer
+    return best
+
+
+def score_answer(user_answer, correct_answer, cache=None):
+    """Score an answer out of 10 with partial credit for words and order.
+
+    Returns (points, feedback). cache is an optional dict shared across calls
+    to reuse edit distances between the same word pairs.
+    """
+    if not user_answer:
+        return 0, "No answer provided"
+
+    # Handle exact match case
+    if user_answer.lower() == correct_answer.lower():
+        return 10, "Perfect!"
+
+    user_words = WORD_RE.findall(user_answer.lower())
+    correct_words = WORD_RE.findall(correct_answer.lower())
+    if not correct_words:
+        return 0, "Completely incorrect answer."
+
+    # Exact matches are reserved first so a fuzzy match never steals them
+    exact = Counter(correct_words) & Counter(user_words)
+    remaining = Counter(user_words) - exact
+    words_by_length = defaultdict(dict)
+    for word in remaining:
+        words_by_length[len(word)][word] = set(word)
+
+    correct_word_count = 0
+    feedback_details = []
+    for word in correct_words:
+        if exact[word]:
+            exact[word] -= 1
+            correct_word_count += 1
+            continue
+        close_match = find_close_match(word, words_by_length, cache=cache)
+        if close_match:
+            correct_word_count += 0.5  # Partial credit for close matches
+            feedback_details.append(f"'{close_match}' should be '{word}'")
+            remaining[close_match] -= 1
+            if not remaining[close_match]:
+                del remaining[close_match]
+                del words_by_length[len(close_match)][close_match]
+        else:
+            feedback_details.append(f"Missing word: '{word}'")
+
+    # Extra words in the order they were written
+    for word in user_words:
+        if remaining[word]:
+            remaining[word] -= 1
+            feedback_details.append(f"Extra word: '{word}'")
+
+    word_score = min(MAX_WORD_POINTS, round(
+        (correct_word_count / len(correct_words)) * MAX_WORD_POINTS))
+
+    # Word order, compared over words rather than characters
+    order_score = 0
+    if word_score > 0:
+        ratio = difflib.SequenceMatcher(
+            None, user_words, correct_words, autojunk=False).ratio()
+        order_score = round(ratio * MAX_ORDER_POINTS)
+
+    total_score = word_score + order_score
+
+    if total_score >= 9:
+        feedback = "Almost perfect! Minor issues with spelling or word order."
+    elif total_score >= 7:
+        feedback = "Good attempt! Most words correct but some issues."
+    elif total_score >= 5:
+        feedback = "Partial credit. Some correct words but needs improvement."
+    elif total_score > 0:
+        feedback = "Few correct words but significant errors."
+    else:
+        feedback = "Completely incorrect answer."
+
+    if feedback_details:
+        feedback += " " + " ".join(feedback_details[:MAX_FEEDBACK_DETAILS])
+        if len(feedback_details) > MAX_FEEDBACK_DETAILS:
+            feedback += " and other issues."
+
+    return total_score, feedback
+
+
+def score_answers(pairs):
+    """Score (user_answer, correct_answer) pairs, sharing word distances across the batch."""
+    cache = {}
+    return [score_answer(user_answer, correct_answer, cache)
+            for user_answer, correct_answer in pairs]
@@ -0,0 +1,139 @@
+"""
+Inverted full-text index over a user's markdown documents.
+
+The index maps every token to the documents containing it and the character
+offsets at which it occurs, so a query only touches the postings of its own
+terms and snippets can be cut from the stored offsets. Persistence and
+keeping the index in sync with storage live in ``src.utils``.
+
+Matching is by word: a document matches when every query term occurs in it,
+in any order. A term matches words equal to it, words it occurs in (if it
+has at least MIN_INFIX_LENGTH characters, ranked lower) and, for the last
+term, words it starts. This covers the substring matches of the former
+scan, except for terms shorter than MIN_INFIX_LENGTH inside words and for
+substrings spanning punctuation, which only match word by word.
+"""
+
+import re
+import math
+import bisect
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+# Offsets kept per token per document; enough for ranking and snippets
+MAX_POSITIONS = 32
+# Shorter terms only match whole words and prefixes
+MIN_INFIX_LENGTH = 3
+INDEX_VERSION = 1
+
+
+def tokenize(text):
+    """Yield (lowercased token, character offset) pairs for text."""
+    for match in TOKEN_RE.finditer(text):
+        yield match.group().lower(), match.start()
+
+
+class SearchIndex:
+    def __init__(self, documents=None, postings=None):
+        # path -> {'generation': ..., 'tokens': [...]}
+        self.documents = documents or {}
+        # token -> {path: [offsets]}
+        self.postings = postings or {}
+        self._sorted_tokens = None
+
+    @classmethod
+    def from_dict(cls, data):
+        if not data or data.get('version') != INDEX_VERSION:
+            return cls()
+        return cls(data.get('documents'), data.get('postings'))
+
+    def to_dict(self):
+        return {'version': INDEX_VERSION, 'documents': self.documents, 'postings': self.postings}
+
+    def generation(self, path):
+        document = self.documents.get(path)
+        return document['generation'] if document else None
+
+    def add_document(self, path, content, generation):
+        """Index (or re-index) a document."""
+        self.remove_document(path)
+        positions = {}
+        for token, offset in tokenize(content):
+            offsets = positions.setdefault(token, [])
+            if len(offsets) < MAX_POSITIONS:
+                offsets.append(offset)
+        for token, offsets in positions.items():
+            self.postings.setdefault(token, {})[path] = offsets
+        self.documents[path] = {'generation': generation, 'tokens': list(positions)}
+        self._sorted_tokens = None
+
+    def remove_document(self, path):
+        document = self.documents.pop(path, None)
+        if not document:
+            return
+        for token in document['tokens']:
+            postings = self.postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(path, None)
+            if not postings:
+                del self.postings[token]
+        self._sorted_tokens = None
+
+    def move_document(self, old_path, new_path):
+        document = self.documents.pop(old_path, None)
+        if not document:
+            return
+        for token in document['tokens']:
+            postings = self.postings[token]
+            postings[new_path] = postings.pop(old_path)
+        self.documents[new_path] = document
+
+    def _expand(self, term, prefix):
+        """Return (token, weight) pairs matching a query term."""
+        matches = [(term, 1.0)] if term in self.postings else []
+        if len(term) >= MIN_INFIX_LENGTH:
+            matches.extend((token, 0.25) for token in self.postings
+                           if term in token and token != term
+                           and not (prefix and token.startswith(term)))
+        if prefix:
+            if self._sorted_tokens is None:
+                self._sorted_tokens = sorted(self.postings)
+            start = bisect.bisect_left(self._sorted_tokens, term)
+            for token in self._sorted_tokens[start:]:
+                if not token.startswith(term):
+                    break
+                if token != term:
+                    matches.append((token, 0.5))
+        return matches
+
+    def search(self, query, limit=20):
+        """Rank documents containing every query term.
+
+        The last term also matches as a prefix so results update while the
+        user is still typing; terms also match inside longer words. Returns (path, score, offset) tuples where offset
+        is the position of the first matched term, best first.
+        """
+        terms = [token for token, _ in tokenize(query)]
+        if not terms:
+            return []
+
+        total = len(self.documents)
+        scores, offsets, candidates = {}, {}, None
+        for i, term in enumerate(terms):
+            term_docs = {}
+            for token, weight in self._expand(term, prefix=i == len(terms) - 1):
+                postings = self.postings[token]
+                idf = math.log(1 + total / len(postings))
+                for path, positions in postings.items():
+                    score = weight * idf * (1 + math.log(len(positions)))
+                    term_docs[path] = term_docs.get(path, 0) + score
+                    if i == 0:
+                        offsets[path] = min(offsets.get(path, positions[0]), positions[0])
+            candidates = set(term_docs) if candidates is None else candidates & set(term_docs)
+            if not candidates:
+                return []
+            for path in candidates:
+                scores[path] = scores.get(path, 0) + term_docs[path]
+
+        ranked = sorted(candidates, key=lambda path: (-scores[path], path))
+        return [(path, scores[path], offsets[path]) for path in ranked[:limit]]
@@ -270,6 +270,8 @@ document.addEventListener("DOMContentLoaded", function () {
                 if (!response.ok) {
                     throw new Error(`HTTP error! status: ${response.status}`);
                 }
+                // Append-log files: sent back on save (see /editor/save)
+                markdownEditorElement.dataset.logVersion = response.headers.get('X-Log-Version') || '';
                 return response.text();
             })
             .then(content => {
@@ -304,6 +306,9 @@ document.addEventListener("DOMContentLoaded", function () {
         if (selectedFolder) {
             payload.folder = selectedFolder;
         }
+        if (markdownEditorElement.dataset.logVersion) {
+            payload.log_version = markdownEditorElement.dataset.logVersion;
+        }
 
         fetch('/editor/save', {
             method: 'POST',
@@ -313,6 +318,7 @@ document.addEventListener("DOMContentLoaded", function () {
             .then(response => response.json())
             .then(result => {
                 if (result.success) {
+                    markdownEditorElement.dataset.logVersion = result.log_version || '';
                     showToast(`File "${filename}" saved successfully`, 'success');
                     fetchFileList();
                     updatePreview(markdownEditorElement.value);
@@ -345,6 +351,7 @@ document.addEventListener("DOMContentLoaded", function () {
                         fetchFileList();
                         selectedFile = filename;
                         markdownEditorElement.value = '';
+                        markdownEditorElement.dataset.logVersion = result.log_version || '';
                         currentFilenameElement.value = filename;
                         updatePreview('');
                         updateFileNameDisplay(filename);
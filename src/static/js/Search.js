@@ -93,6 +93,8 @@ document.addEventListener("DOMContentLoaded", function () {
                 if (!response.ok) {
                     throw new Error(`HTTP error! status: ${response.status}`);
                 }
+                // Append-log files: sent back on save (see /editor/save)
+                markdownEditorElement.dataset.logVersion = response.headers.get('X-Log-Version') || '';
                 return response.text();
             })
             .then(content => {
@@ -585,7 +585,8 @@
     }
 
     function loadAudioFiles() {
-      fetch('/audio/files')
+      // Details include the duration from the audio catalog, so files are not downloaded to show it
+      fetch('/audio/files?details=1')
         .then(response => {
           if (response.status === 403) {
             throw new Error('Session expired or access denied. Please log in again.');
@@ -595,7 +596,7 @@
           return response.json();
         })
         .then(files => {
-          audioFiles = files;
+          audioFiles = files.map(entry => entry.name);
           renderAudioList(files);
         })
         .catch(error => {
@@ -626,7 +627,9 @@
         return;
       }
 
-      files.forEach((file, index) => {
+      files.forEach((entry, index) => {
+        const file = entry.name;
+        const duration = entry.duration != null ? formatTime(entry.duration) : '--:--';
         const audioItem = document.createElement('div');
         audioItem.classList.add('audio-item');
         if (currentAudioItem && file === currentAudioItem.dataset.filename) {
@@ -642,7 +645,7 @@
           </div>
           <div class="audio-item-details">
             <div class="audio-item-title">${file}</div>
-            <div class="audio-item-duration">--:--</div>
+            <div class="audio-item-duration">${duration}</div>
           </div>
         `;
 
@@ -66,6 +66,9 @@ document.addEventListener("DOMContentLoaded", function () {
         if (selectedFolder) {
             payload.folder = selectedFolder;
         }
+        if (markdownEditorElement.dataset.logVersion) {
+            payload.log_version = markdownEditorElement.dataset.logVersion;
+        }
 
         fetch('/editor/save', {
             method: 'POST',
@@ -75,6 +78,7 @@ document.addEventListener("DOMContentLoaded", function () {
             .then(response => response.json())
             .then(result => {
                 if (result.success) {
+                    markdownEditorElement.dataset.logVersion = result.log_version || '';
                     showToast(`File "${filename}" saved successfully`, 'success');
                     // Trigger file list refresh
                     document.dispatchEvent(new CustomEvent('fileSaved', { detail: { filename } }));
@@ -7,6 +7,7 @@ document.addEventListener('DOMContentLoaded', function () {
     let audioChunks = [];
     let practiceText = '';
     let recordingTimer;
+    const JOB_POLL_INTERVAL = 1000; // ms between job status checks
 
     // DOM elements
     const speechButton = document.getElementById('speech-recognition');
@@ -619,6 +620,7 @@ document.addEventListener('DOMContentLoaded', function () {
                         }
                         return response.json();
                     })
+                    .then(waitForJob)
                     .then(data => {
                         if (data.error) {
                             showToast(data.error, 'error');
@@ -648,6 +650,30 @@ document.addEventListener('DOMContentLoaded', function () {
             });
     }
 
+    // Transcription and evaluation run as background jobs; poll until one finishes
+    function waitForJob(data) {
+        if (!data || !data.job_id) {
+            return Promise.resolve(data);
+        }
+        return new Promise((resolve, reject) => {
+            const poll = () => {
+                fetch(data.status_url)
+                    .then(response => response.json())
+                    .then(job => {
+                        if (job.status === 'done') {
+                            resolve(job.result);
+                        } else if (!job.status || job.status === 'failed' || job.status === 'cancelled') {
+                            resolve({ error: job.error || `Job ${job.status || 'not found'}` });
+                        } else {
+                            setTimeout(poll, JOB_POLL_INTERVAL);
+                        }
+                    })
+                    .catch(reject);
+            };
+            poll();
+        });
+    }
+
     // Fallback function if the evaluation endpoint doesn't exist
     function fallbackToTranscriptionOnly(formData) {
         return fetch('/openai/transcribe', {
@@ -660,7 +686,11 @@ document.addEventListener('DOMContentLoaded', function () {
                 }
                 return response.json();
             })
+            .then(waitForJob)
             .then(data => {
+                if (data.error) {
+                    return data;
+                }
                 // Create a simulated evaluation response with just the transcription
                 return {
                     transcription: data.transcription,
@@ -0,0 +1,122 @@
+"""
+On-disk cache of Whisper transcriptions keyed by audio content.
+
+The key is the SHA-256 of the audio plus the model and language, so
+re-submitted recordings and replayed sample clips are answered without
+another API call, whoever submits them. Container metadata (ID3 tags, FLAC
+comments, WAV info chunks) is left out of the hash, so the same recording
+re-uploaded with different tags is a hit; the audio itself is hashed as
+encoded, so a re-encoded copy is a miss (decoding every upload to hash its
+samples would cost more than the lookups save). Entries are small JSON files
+shared by all worker processes; reading an entry refreshes its mtime and the
+least recently used entries are evicted once the cache grows past its limit.
+"""
+
+import os
+import json
+import uuid
+import hashlib
+import logging
+import tempfile
+import threading
+from src.audio_formats import audio_parts
+
+TRANSCRIPTION_CACHE_DIR = os.getenv('TRANSCRIPTION_CACHE_DIR', os.path.join(
+    tempfile.gettempdir(), 'transcription-cache'))
+TRANSCRIPTION_CACHE_ENTRIES = int(os.getenv('TRANSCRIPTION_CACHE_ENTRIES', 5000))
+# Stores between two eviction scans of the cache directory
+EVICTION_INTERVAL = 50
+
+
+class TranscriptionCache:
+    def __init__(self, directory, max_entries):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._stores_since_eviction = EVICTION_INTERVAL
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    @staticmethod
+    def key(audio, model, language=None):
+        digest = hashlib.sha256()
+        for part in audio_parts(audio):
+            digest.update(part)
+        digest.update(f"\0{model}\0{language or ''}".encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _record(self, stat, count=1):
+        with self._lock:
+            self.stats[stat] += count
+
+    def get(self, key):
+        """Return the cached transcription text, or None."""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = json.load(f)['text']
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            self._record('misses')
+            return None
+        self._record('hits')
+        return text
+
+    def put(self, key, text):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so readers never see a partial entry
+            temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'text': text}, f)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logging.error(f"Error caching transcription {key}: {str(e)}")
+            return
+        self._record('stores')
+        with self._lock:
+            self._stores_since_eviction += 1
+            due = self._stores_since_eviction >= EVICTION_INTERVAL
+            if due:
+                self._stores_since_eviction = 0
+        if due:
+            self.evict()
+
+    def _entries(self):
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    entries.append((os.stat(path).st_mtime, path))
+                except OSError:
+                    continue
+        return entries
+
+    def evict(self):
+        """Remove the least recently used entries beyond max_entries."""
+        entries = self._entries()
+        excess = len(entries) - self.max_entries
+        if excess <= 0:
+            return
+        removed = 0
+        for _, path in sorted(entries)[:excess]:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                continue
+        self._record('evictions', removed)
+        logging.info(f"Evicted {removed} cached transcriptions")
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats.update(directory=self.directory, max_entries=self.max_entries)
+        return stats
+
+
+transcription_cache = TranscriptionCache(TRANSCRIPTION_CACHE_DIR, TRANSCRIPTION_CACHE_ENTRIES)
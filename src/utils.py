@@ -1,285 +1,807 @@
 import os
+import io
 import json
+import time
+import atexit
 import logging
-import shutil
-from flask_sqlalchemy import SQLAlchemy
+import uuid
+import mimetypes
+import threading
+import zlib
+from collections import defaultdict
 from werkzeug.security import generate_password_hash
 from src.models import db, User
-from src.gcs_utils import gcs_client
-from google.cloud.storage import Blob
-from functools import lru_cache
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from src.storage import storage, join_path, file_generation, WriteConflict
+from src.media import send_media
+from src.search_index import SearchIndex
+from src.audio_catalog import AudioCatalog
+from src.audio_formats import run_audio_task, sniff_audio_format
+from src.audio_metadata import METADATA_VERSION, extract_audio_metadata
+from src.jobs import job_queue
+from src.lessons import LessonCache, compile_lesson, is_lesson, lesson_to_dict, lesson_from_dict
+from src import append_log
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from cachetools import TTLCache
 import zipfile
+from datetime import datetime
 
 # Define paths
+# Seed files shipped with the application (always read from local disk)
 ARTIFACTS_DIR = os.path.join(os.path.dirname(__file__), 'artifacts')
-PUBLISH_DIR_LOCAL = os.path.join(
-    ARTIFACTS_DIR, 'published')  # Local filesystem path
-# GCS path prefix (relative to bucket root)
-PUBLISH_DIR_GCS = 'artifacts/published'
-AUDIO_DIR = os.path.join(ARTIFACTS_DIR, 'audio')
-USER_FOLDER = ARTIFACTS_DIR
+# Storage keys (resolved by the active storage backend)
+ARTIFACTS_PREFIX = 'artifacts'
+PUBLISH_DIR = join_path(ARTIFACTS_PREFIX, 'published')
+AUDIO_PREFIX = join_path(ARTIFACTS_PREFIX, 'audio')
+NOTIFICATIONS_PATH = join_path(ARTIFACTS_PREFIX, 'notifications.json')
+MANIFEST_FILENAME = '.manifest.json'
+MANIFEST_VERSION = 1
+PROVISION_MARKER = '.provisioned.json'
+SEARCH_INDEX_FILENAME = '.search_index.json'
+SEARCH_RESULT_LIMIT = 20
+# Bump whenever get_user_seed_files() changes so existing users are re-checked
+PROVISION_VERSION = 1
+
+# Files stored as a canonical object plus append-only segments (see
+# src/append_log.py), mapped to the function that merges their segments
+APPEND_LOG_FILES = {
+    ('', 'typo.json'): append_log.merge_json_list,
+    ('word bank', 'wordbank.md'): append_log.merge_text,
+    ('word bank', 'wordbank_saved.md'): append_log.merge_text,
+}
+
+DEFAULT_BOOKS = [
+    {"key": "A0A2", "title": "Book 1",
+        "url": "https://online.anyflip.com/rxoaf/axyh/index.html"},
+    {"key": "A2B1", "title": "Book 2",
+        "url": "https://online.anyflip.com/rxoaf/ycin/index.html"}
+]
+
+
+def get_user_storage_path(username, folder='', filename=''):
+    """Return the storage key for a user's folder or file."""
+    # join_path drops empty parts, which would resolve into the shared root
+    if not username or not str(username).strip('/'):
+        raise ValueError("A username is required for user storage")
+    return join_path(ARTIFACTS_PREFIX, username, folder, filename)
+
+
+def read_storage_json(path, default=None):
+    """Read and parse a JSON object from storage, returning default if missing or invalid."""
+    content = storage.read(path)
+    if not content:
+        return default
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError as e:
+        logging.error(f"Error decoding JSON from {path}: {str(e)}")
+        return default
+
+
+def write_storage_json(path, data, indent=4):
+    """Serialize data as JSON and write it to storage."""
+    storage.write(path, json.dumps(data, indent=indent))
+
+
+def send_storage_file(path, mimetype=None):
+    """Send a stored file in the response (for backends without signed URLs).
 
-# Create local directories if they don't exist
-os.makedirs(ARTIFACTS_DIR, exist_ok=True)
-os.makedirs(AUDIO_DIR, exist_ok=True)
+    Supports conditional and Range requests (see src/media.py).
+    """
+    mimetype = mimetype or mimetypes.guess_type(
+        path)[0] or 'application/octet-stream'
+    download_name = os.path.basename(path)
+    local_path = storage.local_path(path)
+    if local_path:
+        if not os.path.isfile(local_path):
+            raise FileNotFoundError(f"File not found: {path}")
+        file = open(local_path, 'rb')
+        stat = os.fstat(file.fileno())
+        return send_media(file, stat.st_size, file_generation(stat), mimetype,
+                          last_modified=stat.st_mtime, download_name=download_name)
+    data = storage.read_bytes(path)
+    if data is None:
+        raise FileNotFoundError(f"File not found: {path}")
+    # A checksum stands in for the mtime so no extra metadata request is needed
+    return send_media(io.BytesIO(data), len(data), zlib.crc32(data), mimetype,
+                      download_name=download_name)
+
+
+def read_notifications():
+    """Read the admin notifications list."""
+    try:
+        return read_storage_json(NOTIFICATIONS_PATH, [])
+    except Exception as e:
+        logging.error(f"Error reading notifications: {str(e)}")
+        return []
 
 
-def get_user_artifacts_dir(username):
-    return os.path.join(ARTIFACTS_DIR, username)
+def save_notifications(notifications):
+    """Replace the admin notifications list."""
+    write_storage_json(NOTIFICATIONS_PATH, notifications, indent=2)
+
+
+def write_notification(notification):
+    """Append a notification to the admin notifications list."""
+    try:
+        notifications = read_notifications()
+        # Assign a unique id if not already present
+        if 'id' not in notification:
+            notification['id'] = str(uuid.uuid4().int >> 64)  # Store as string
+        notifications.append(notification)
+        save_notifications(notifications)
+        logging.info(f"Notification added: {notification['details']}")
+    except Exception as e:
+        logging.error(f"Error writing notification: {str(e)}")
+        raise
 
 
-def get_user_folder_dir(username, folder):
-    return os.path.join(get_user_artifacts_dir(username), folder) if folder else get_user_artifacts_dir(username)
+# Audio library
+#
+# artifacts/audio/.catalog.json lists every audio file with its size,
+# generation, duration and tags. The parsed catalog is kept in process and
+# reloaded when the catalog object's generation changes (checked at most every
+# AUDIO_CATALOG_TTL seconds); it is rebuilt from a listing only when missing.
+# Updates are written conditionally on the generation they were applied to
+# and retried, so concurrent uploads and metadata jobs never drop entries.
+# Per-user permission sets are cached with the generation of the permissions
+# file and revalidated with a stat on every check.
+# Duration, bitrate and waveform peaks are extracted by a background job for
+# every new or changed file and stored in a .<filename>.meta.json sidecar.
+AUDIO_CATALOG_PATH = join_path(AUDIO_PREFIX, '.catalog.json')
+AUDIO_CATALOG_TTL = float(os.getenv('AUDIO_CATALOG_TTL', 30))
+AUDIO_PERMISSIONS_CACHE_TTL = int(os.getenv('AUDIO_PERMISSIONS_CACHE_TTL', 300))
+AUDIO_CATALOG_UPDATE_ATTEMPTS = 5
+AUDIO_METADATA_TIMEOUT = 300
+_audio_catalog = {'catalog': None, 'generation': None, 'checked_at': 0}
+_audio_catalog_lock = threading.Lock()
+# username -> (generation, frozenset of filenames)
+audio_permissions_cache = TTLCache(maxsize=4096, ttl=AUDIO_PERMISSIONS_CACHE_TTL)
+_audio_permissions_lock = threading.Lock()
 
 
 def update_audio_permissions(username, audio_files):
     """Update the list of audio files a user can access."""
-    if gcs_client.enabled:
-        gcs_client.update_audio_permissions(username, audio_files)
-    else:
-        permissions_file = os.path.join(
-            get_user_artifacts_dir(username), 'audio_permissions.json')
-        permissions = {'accessible_audio_files': audio_files}
-        try:
-            with open(permissions_file, 'w', encoding='utf-8') as f:
-                json.dump(permissions, f, indent=4)
-            logging.info(f"Updated audio permissions for user {username}")
-        except Exception as e:
-            logging.error(
-                f"Error updating audio permissions for {username}: {str(e)}")
-            raise
+    permissions = {'accessible_audio_files': audio_files}
+    try:
+        write_storage_json(get_user_storage_path(
+            username, filename='audio_permissions.json'), permissions)
+        with _audio_permissions_lock:
+            audio_permissions_cache.pop(username, None)
+        logging.info(f"Updated audio permissions for user {username}")
+    except Exception as e:
+        logging.error(
+            f"Error updating audio permissions for {username}: {str(e)}")
+        raise
 
 
 def get_audio_permissions(username):
-    """Retrieve the list of audio files a user can access."""
-    if gcs_client.enabled:
-        permissions = gcs_client.get_audio_permissions(username)
-        logging.debug(
-            f"Retrieved audio permissions for {username} from GCS: {permissions}")
-        return permissions
-    permissions_file = os.path.join(
-        get_user_artifacts_dir(username), 'audio_permissions.json')
+    """Retrieve the set of audio files a user can access."""
+    path = get_user_storage_path(username, filename='audio_permissions.json')
     try:
-        if os.path.exists(permissions_file):
-            with open(permissions_file, 'r', encoding='utf-8') as f:
-                permissions = json.load(f)
-                accessible_files = permissions.get(
-                    'accessible_audio_files', [])
-                logging.debug(
-                    f"Retrieved audio permissions for {username} locally: {accessible_files}")
-                return accessible_files
+        obj = storage.stat(path)
+        with _audio_permissions_lock:
+            cached = audio_permissions_cache.get(username)
+            if obj is None:
+                audio_permissions_cache.pop(username, None)
+        if obj is None:
+            logging.debug(f"No audio permissions file found for {username}")
+            return frozenset()
+        if cached is not None and cached[0] == obj.generation:
+            return cached[1]
+        content, generation = storage.read_with_generation(path)
+        permissions = json.loads(content) if content else {}
+        allowed_files = frozenset(permissions.get('accessible_audio_files', []))
         logging.debug(
-            f"No audio permissions file found for {username} locally")
-        return []
+            f"Retrieved audio permissions for {username}: {sorted(allowed_files)}")
     except Exception as e:
         logging.error(
             f"Error reading audio permissions for {username}: {str(e)}")
-        return []
+        return frozenset()
+    with _audio_permissions_lock:
+        audio_permissions_cache[username] = (generation, allowed_files)
+    return allowed_files
+
+
+def _audio_catalog_entry(obj, previous=None):
+    previous = previous or {}
+    same_file = previous.get('generation') == obj.generation
+    return {
+        'size': obj.size,
+        'generation': obj.generation,
+        'mtime': obj.updated,
+        'duration': previous.get('duration') if same_file else None,
+        'bitrate': previous.get('bitrate') if same_file else None,
+        'waveform': previous.get('waveform', False) if same_file else False,
+        'tags': previous.get('tags', [])
+    }
+
+
+def _save_audio_catalog(catalog, if_generation_match=None):
+    """Persist the catalog and make it the in-process copy; the caller holds the lock."""
+    storage.write(AUDIO_CATALOG_PATH, json.dumps(catalog.to_dict()),
+                  if_generation_match=if_generation_match)
+    obj = storage.stat(AUDIO_CATALOG_PATH)
+    _audio_catalog.update(catalog=catalog, generation=obj.generation if obj else None,
+                          checked_at=time.monotonic())
+
+
+def rebuild_audio_catalog():
+    """Rebuild the audio catalog from a listing, keeping known tags and durations."""
+    with _audio_catalog_lock:
+        previous = AudioCatalog.from_dict(read_storage_json(AUDIO_CATALOG_PATH)) or AudioCatalog()
+        objects, _ = storage.list(AUDIO_PREFIX + '/', delimiter='/')
+        catalog = AudioCatalog()
+        for obj in objects:
+            name = os.path.basename(obj.name)
+            if not name.startswith('.'):
+                catalog.set_file(name, _audio_catalog_entry(obj, previous.files.get(name)))
+        _save_audio_catalog(catalog)
+    logging.info(f"Rebuilt audio catalog: {len(catalog.files)} files")
+    for name, entry in catalog.files.items():
+        if entry['duration'] is None:
+            queue_audio_metadata(name)
+    return catalog
+
+
+def load_audio_catalog():
+    """Return the in-process audio catalog, reloading it if storage has a newer one."""
+    with _audio_catalog_lock:
+        catalog = _audio_catalog['catalog']
+        if catalog is not None and time.monotonic() - _audio_catalog['checked_at'] < AUDIO_CATALOG_TTL:
+            return catalog
+        obj = storage.stat(AUDIO_CATALOG_PATH)
+        if obj is not None:
+            if catalog is None or obj.generation != _audio_catalog['generation']:
+                catalog = AudioCatalog.from_dict(read_storage_json(AUDIO_CATALOG_PATH))
+            if catalog is not None:
+                _audio_catalog.update(catalog=catalog, generation=obj.generation,
+                                      checked_at=time.monotonic())
+                return catalog
+    return rebuild_audio_catalog()
+
+
+def update_audio_catalog(update):
+    """Apply update(catalog) to the latest catalog and persist it.
+
+    The catalog is read past the read cache and written conditionally on that
+    generation; if another process wrote in between the update is retried.
+    """
+    load_audio_catalog()
+    with _audio_catalog_lock:
+        for _ in range(AUDIO_CATALOG_UPDATE_ATTEMPTS):
+            content, generation = storage.read_with_generation(AUDIO_CATALOG_PATH)
+            try:
+                catalog = AudioCatalog.from_dict(json.loads(content) if content else None)
+            except json.JSONDecodeError as e:
+                logging.error(f"Error decoding JSON from {AUDIO_CATALOG_PATH}: {str(e)}")
+                catalog = None
+            if catalog is None:
+                # Missing or unreadable in storage: start from the in-process copy
+                catalog = AudioCatalog.from_dict(_audio_catalog['catalog'].to_dict())
+            update(catalog)
+            try:
+                _save_audio_catalog(catalog, if_generation_match=generation or 0)
+                return catalog
+            except WriteConflict:
+                logging.debug("Audio catalog changed concurrently, retrying")
+    raise WriteConflict(f"Too many concurrent updates of {AUDIO_CATALOG_PATH}")
+
+
+def save_audio_file(filename, data, tags=None):
+    """Store an audio file in the library and record it in the catalog."""
+    path = join_path(AUDIO_PREFIX, filename)
+    storage.write_bytes(path, data, content_type=mimetypes.guess_type(
+        filename)[0] or 'audio/mpeg')
+    obj = storage.stat(path)
+
+    def update(catalog):
+        entry = _audio_catalog_entry(obj, catalog.files.get(filename))
+        if tags is not None:
+            entry['tags'] = tags
+        catalog.set_file(filename, entry)
+    update_audio_catalog(update)
+    logging.info(f"Stored audio file {filename} ({obj.size} bytes)")
+    queue_audio_metadata(filename)
+    return path
+
+
+def get_audio_metadata_path(filename):
+    return join_path(AUDIO_PREFIX, f".{filename}.meta.json")
+
+
+def queue_audio_metadata(filename):
+    """Queue extraction of an audio file's duration and waveform."""
+    try:
+        job_queue.submit('audio_metadata', 'system', {'filename': filename})
+    except Exception as e:
+        logging.error(f"Error queueing metadata extraction for {filename}: {str(e)}")
+
+
+def run_audio_metadata(job):
+    """Job handler: write the metadata sidecar of an audio file and update the catalog."""
+    filename = job.params['filename']
+    path = join_path(AUDIO_PREFIX, filename)
+    obj = storage.stat(path)
+    if obj is None:
+        return None
+
+    metadata = read_storage_json(get_audio_metadata_path(filename))
+    if not metadata or metadata.get('version') != METADATA_VERSION or \
+            metadata.get('generation') != obj.generation:
+        job.set_progress(0.1, 'Decoding audio')
+        data = storage.read_bytes(path)
+        metadata = run_audio_task(
+            extract_audio_metadata, data,
+            sniff_audio_format(data) or os.path.splitext(filename)[1][1:] or None,
+            timeout=AUDIO_METADATA_TIMEOUT)
+        metadata['generation'] = obj.generation
+        write_storage_json(get_audio_metadata_path(filename), metadata, indent=None)
+
+    def update(catalog):
+        entry = catalog.files.get(filename)
+        # Skip if the file changed again meanwhile; its own job will record it
+        if entry is not None and entry['generation'] == obj.generation:
+            entry.update(duration=metadata['duration'], bitrate=metadata['bitrate'],
+                         waveform=bool(metadata['peaks']))
+            catalog.set_file(filename, entry)
+    update_audio_catalog(update)
+    logging.info(f"Extracted metadata of audio file {filename}: {metadata['duration']}s")
+    return {'duration': metadata['duration'], 'bitrate': metadata['bitrate']}
+
+
+job_queue.register('audio_metadata', run_audio_metadata)
+
+
+def get_audio_waveform(username, audio_filename):
+    """Return the duration and waveform peaks of an audio file the user can access, or None."""
+    get_audio_file(username, audio_filename)
+    metadata = read_storage_json(get_audio_metadata_path(audio_filename))
+    if not metadata:
+        return None
+    return {'duration': metadata['duration'], 'peaks': metadata['peaks']}
+
+
+def list_audio_details(username):
+    """Return the catalog entries (name, size, duration, bitrate, tags) of the user's audio files."""
+    catalog = load_audio_catalog()
+    details = []
+    for name in list_audio_files(username):
+        # Files the catalog has not caught up with yet are listed without metadata
+        entry = catalog.files.get(name) or {}
+        details.append(dict(name=name, size=entry.get('size'), duration=entry.get('duration'),
+                            bitrate=entry.get('bitrate'), waveform=entry.get('waveform', False),
+                            tags=entry.get('tags', [])))
+    return details
 
 
 def list_audio_files(username):
     """List audio files the user is allowed to access."""
     ensure_user_artifacts_dir(username)
-    allowed_files = get_audio_permissions(username)
-    if gcs_client.enabled:
-        try:
-            prefix = 'artifacts/audio/'
-            blobs = gcs_client.client.list_blobs(
-                gcs_client.bucket, prefix=prefix)
-            audio_files = [
-                os.path.basename(blob.name)
-                for blob in blobs
-                if blob.name.endswith('.mp3')
-            ]
-            available_files = [f for f in audio_files if f in allowed_files]
-            logging.info(
-                f"Retrieved {len(available_files)} accessible audio files from GCS for user {username}: {available_files}")
-            return available_files
-        except Exception as e:
-            logging.error(
-                f"Error listing audio files from GCS for user {username}: {str(e)}")
-            return []
-    available_files = [
-        f for f in os.listdir(AUDIO_DIR)
-        if os.path.isfile(os.path.join(AUDIO_DIR, f)) and f in allowed_files
-    ]
-    logging.info(
-        f"Retrieved {len(available_files)} accessible audio files for user {username}: {available_files}")
-    return available_files
+    try:
+        allowed_files = get_audio_permissions(username)
+        catalog = load_audio_catalog()
+        available_files = sorted(name for name in catalog.files if name in allowed_files)
+        logging.info(
+            f"Retrieved {len(available_files)} accessible audio files for user {username}")
+        return available_files
+    except Exception as e:
+        logging.error(
+            f"Error listing audio files for user {username}: {str(e)}")
+        return []
+
+
+def search_audio_files(username, query):
+    """Return the accessible audio files whose name or tags contain query."""
+    ensure_user_artifacts_dir(username)
+    try:
+        return load_audio_catalog().search(query, get_audio_permissions(username))
+    except Exception as e:
+        logging.error(
+            f"Error searching audio files for user {username}: {str(e)}")
+        return []
 
 
 def get_audio_file(username, audio_filename):
-    """Retrieve the path to an audio file if the user has access."""
+    """Return the storage key of an audio file if the user has access."""
     allowed_files = get_audio_permissions(username)
     if audio_filename not in allowed_files:
         logging.error(
             f"User {username} does not have access to audio file: {audio_filename}")
         raise ValueError(f"Access denied to audio file: {audio_filename}")
 
-    if gcs_client.enabled:
-        return gcs_client.get_audio_file(username, audio_filename)
-
-    audio_file_path = os.path.join(AUDIO_DIR, audio_filename)
-    if not os.path.exists(audio_file_path):
-        logging.error(f"Audio file not found: {audio_file_path}")
-        raise FileNotFoundError(f"Audio file not found: {audio_filename}")
-
     logging.info(
         f"Access granted to audio file {audio_filename} for user {username}")
-    return audio_file_path
+    return join_path(AUDIO_PREFIX, audio_filename)
+
+
+def get_user_seed_files(username):
+    """Return (storage key, local seed file or literal content) pairs every user starts with."""
+    return [
+        (get_user_storage_path(username, 'word bank', 'wordbank.md'),
+         os.path.join(ARTIFACTS_DIR, 'wordbank.md')),
+        (get_user_storage_path(username, 'word bank', 'wordbank_organized.md'),
+         os.path.join(ARTIFACTS_DIR, 'wordbank_organized.md')),
+        (get_user_storage_path(username, 'word bank', 'wordbank_saved.md'),
+         os.path.join(ARTIFACTS_DIR, 'wordbank_saved.md')),
+        (get_user_storage_path(username, 'practice page', 'practice_sample.md'),
+         os.path.join(ARTIFACTS_DIR, 'practice_sample.md')),
+        (get_user_storage_path(username, 'practice page', 'shortcuts_magic.md'),
+         os.path.join(ARTIFACTS_DIR, 'shortcuts_magic.md')),
+        (get_user_storage_path(username, 'practice page', '16_School.md'),
+         os.path.join(ARTIFACTS_DIR, '16_School.md')),
+        (get_user_storage_path(username, filename='typo.json'), '[]'),
+        (get_user_storage_path(username, filename='learning_progress.json'), '{}'),
+        (get_user_storage_path(username, filename='audio_permissions.json'),
+         '{"accessible_audio_files": ["taal1.mp3"]}'),
+        (get_user_storage_path(username, filename='books.json'),
+         json.dumps(DEFAULT_BOOKS, indent=4)),
+        (get_user_storage_path(username, filename='sharing_permissions.json'),
+         '{"shared_files": {}}'),
+        (get_user_storage_path(username, 'shared', '.placeholder'), ''),
+    ]
+
+
+# Users whose seed files are known to be present at PROVISION_VERSION
+_provisioned_users = set()
+
+
+def _read_seed_content(source, username):
+    if not source.startswith(ARTIFACTS_DIR):
+        return source
+    if os.path.exists(source):
+        with open(source, 'r', encoding='utf-8') as f:
+            return f.read()
+    logging.error(
+        f"Seed file {source} not found in ARTIFACTS_DIR for user {username}")
+    return ''
+
+
+def _create_seed_file(path, source, username):
+    try:
+        storage.write(path, _read_seed_content(source, username))
+        logging.info(f"Created {path} for user {username}")
+    except Exception as e:
+        logging.error(
+            f"Error creating {path} for user {username}: {str(e)}")
+        raise
 
 
 def ensure_user_artifacts_dir(username):
-    user_artifacts_dir = get_user_artifacts_dir(username)
-    word_bank_dir = os.path.join(user_artifacts_dir, 'word bank')
-    free_dir = os.path.join(user_artifacts_dir, 'practice page')
-    shared_dir = os.path.join(user_artifacts_dir, 'shared')
-
-    if gcs_client.enabled:
-        gcs_paths = [
-            (os.path.join('artifacts', username, 'word bank', 'wordbank.md').replace(
-                os.sep, '/'), os.path.join(ARTIFACTS_DIR, 'wordbank.md')),
-            (os.path.join('artifacts', username, 'word bank', 'wordbank_organized.md').replace(
-                os.sep, '/'), os.path.join(ARTIFACTS_DIR, 'wordbank_organized.md')),
-            (os.path.join('artifacts', username, 'word bank', 'wordbank_saved.md').replace(
-                os.sep, '/'), os.path.join(ARTIFACTS_DIR, 'wordbank_saved.md')),
-            (os.path.join('artifacts', username, 'practice page', 'practice_sample.md').replace(
-                os.sep, '/'), os.path.join(ARTIFACTS_DIR, 'practice_sample.md')),
-            (os.path.join('artifacts', username, 'practice page', 'shortcuts_magic.md').replace(
-                os.sep, '/'), os.path.join(ARTIFACTS_DIR, 'shortcuts_magic.md')),
-            (os.path.join('artifacts', username, 'practice page', '16_School.md').replace(
-                os.sep, '/'), os.path.join(ARTIFACTS_DIR, '16_School.md')),
-            (os.path.join('artifacts', username,
-             'typo.json').replace(os.sep, '/'), '[]'),
-            (os.path.join('artifacts', username,
-             'learning_progress.json').replace(os.sep, '/'), '{}'),
-            (os.path.join('artifacts', username, 'audio_permissions.json').replace(
-                os.sep, '/'), '{"accessible_audio_files": ["taal1.mp3"]}'),
-            (os.path.join('artifacts', username, 'books.json').replace(os.sep, '/'), json.dumps([
-                {"key": "A0A2", "title": "Book 1",
-                    "url": "https://online.anyflip.com/rxoaf/axyh/index.html"},
-                {"key": "A2B1", "title": "Book 2",
-                    "url": "https://online.anyflip.com/rxoaf/ycin/index.html"}
-            ], indent=4)),
-            (os.path.join('artifacts', username, 'sharing_permissions.json').replace(
-                os.sep, '/'), '{"shared_files": {}}'),
-            (os.path.join('artifacts', username, 'shared',
-             '.placeholder').replace(os.sep, '/'), ''),
-        ]
-        for gcs_path, source in gcs_paths:
-            blob = gcs_client.bucket.blob(gcs_path)
-            if not blob.exists():
-                try:
-                    if isinstance(source, str) and os.path.exists(source):
-                        with open(source, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                    else:
-                        content = source
-                    gcs_client.write_file(gcs_path, content)
-                    logging.info(
-                        f"Created {gcs_path} in GCS for user {username}")
-                except Exception as e:
-                    logging.error(
-                        f"Error creating {gcs_path} in GCS for user {username}: {str(e)}")
-                    raise
+    """Create any missing seed files for the user.
+
+    Provisioning is recorded in a versioned marker object and memoized in
+    process, so after the first call this costs no storage round-trips.
+    """
+    if username in _provisioned_users:
+        return
+    marker_path = get_user_storage_path(username, filename=PROVISION_MARKER)
+    marker = read_storage_json(marker_path, {})
+    if marker.get('version') == PROVISION_VERSION:
+        _provisioned_users.add(username)
         return
 
-    if not os.path.exists(user_artifacts_dir):
-        os.makedirs(user_artifacts_dir, exist_ok=True)
-        logging.warning(
-            f"Created missing artifacts directory for user: {username}")
-
-    if not os.path.exists(word_bank_dir):
-        os.makedirs(word_bank_dir, exist_ok=True)
-        logging.warning(
-            f"Created missing word bank directory for user: {username}")
-
-        wordbank_files = [
-            'wordbank.md',
-            'wordbank_organized.md',
-            'wordbank_saved.md'
-        ]
-        for file in wordbank_files:
-            src = os.path.join(ARTIFACTS_DIR, file)
-            dst = os.path.join(word_bank_dir, file)
-            if os.path.exists(src):
-                shutil.copy2(src, dst)
-                logging.info(
-                    f"Copied {file} to word bank directory for user: {username}")
-            else:
-                logging.error(
-                    f"Source file {src} not found in ARTIFACTS_DIR for user {username}")
-                with open(dst, 'w', encoding='utf-8') as f:
-                    f.write('')
-                logging.info(
-                    f"Created empty {file} in word bank directory for user: {username}")
-
-    if not os.path.exists(free_dir):
-        os.makedirs(free_dir, exist_ok=True)
-        logging.warning(f"Created missing free directory for user: {username}")
-
-        free_files = [
-            'practice_sample.md',
-            'shortcuts_magic.md',
-            '16_School.md'
-        ]
-        for file in free_files:
-            src = os.path.join(ARTIFACTS_DIR, file)
-            dst = os.path.join(free_dir, file)
-            if os.path.exists(src):
-                shutil.copy2(src, dst)
-                logging.info(
-                    f"Copied {file} to free directory for user: {username}")
-            else:
-                logging.error(
-                    f"Source file {src} not found in ARTIFACTS_DIR for user {username}")
-                with open(dst, 'w', encoding='utf-8') as f:
-                    f.write('')
-                logging.info(
-                    f"Created empty {file} in free directory for user: {username}")
-
-    if not os.path.exists(shared_dir):
-        os.makedirs(shared_dir, exist_ok=True)
-        logging.warning(
-            f"Created missing shared directory for user: {username}")
-        placeholder_file = os.path.join(shared_dir, '.placeholder')
-        with open(placeholder_file, 'w', encoding='utf-8') as f:
-            f.write('')
-        logging.info(
-            f"Created .placeholder in shared directory for user: {username}")
-
-    permissions_file = os.path.join(
-        user_artifacts_dir, 'audio_permissions.json')
-    if not os.path.exists(permissions_file):
-        update_audio_permissions(username, ['taal1.mp3'])
-        logging.info(f"Initialized audio permissions for user: {username}")
-
-    typo_file = os.path.join(user_artifacts_dir, 'typo.json')
-    if not os.path.exists(typo_file):
-        with open(typo_file, 'w', encoding='utf-8') as f:
-            json.dump([], f)
-        logging.info(f"Initialized typo.json for user: {username}")
-
-    progress_file = os.path.join(user_artifacts_dir, 'learning_progress.json')
-    if not os.path.exists(progress_file):
-        with open(progress_file, 'w', encoding='utf-8') as f:
-            json.dump({}, f)
-        logging.info(
-            f"Initialized learning_progress.json for user: {username}")
-
-    books_file = os.path.join(user_artifacts_dir, 'books.json')
-    if not os.path.exists(books_file):
-        initialize_user_books(username)
-        logging.info(f"Initialized books.json for user: {username}")
-
-    sharing_permissions_file = os.path.join(
-        user_artifacts_dir, 'sharing_permissions.json')
-    if not os.path.exists(sharing_permissions_file):
-        with open(sharing_permissions_file, 'w', encoding='utf-8') as f:
-            json.dump({'shared_files': {}}, f)
-        logging.info(
-            f"Initialized sharing_permissions.json for user: {username}")
+    seed_files = get_user_seed_files(username)
+    with ThreadPoolExecutor(max_workers=len(seed_files)) as executor:
+        present = list(executor.map(
+            lambda seed: storage.exists(seed[0]), seed_files))
+        missing = [seed for seed, exists in zip(
+            seed_files, present) if not exists]
+        # list() re-raises the first failure, leaving the marker unwritten
+        list(executor.map(
+            lambda seed: _create_seed_file(seed[0], seed[1], username), missing))
+
+    if missing:
+        with _manifest_locks[username]:
+            rebuild_user_manifest(username)
+    write_storage_json(marker_path, {
+        'version': PROVISION_VERSION,
+        'provisioned_at': datetime.utcnow().isoformat()
+    })
+    _provisioned_users.add(username)
+    logging.info(
+        f"Provisioned user {username} at version {PROVISION_VERSION} ({len(missing)} seed files created)")
+
+
+# Per-user storage manifest
+#
+# artifacts/<user>/.manifest.json records every user document with its folder,
+# size, generation and mtime, plus the user's folders, so listings cost one
+# storage read instead of a prefix scan. Mutating helpers keep it up to date;
+# rebuild_user_manifest() repairs drift (e.g. edits made outside the app).
+_manifest_locks = defaultdict(threading.Lock)
+MANIFEST_UPDATE_ATTEMPTS = 5
+
+
+def get_manifest_path(username):
+    return get_user_storage_path(username, filename=MANIFEST_FILENAME)
+
+
+def is_manifest_tracked(relative_path):
+    """Hidden files and root-level JSON settings are not listed as documents."""
+    if any(part.startswith('.') for part in relative_path.split('/')):
+        return False
+    folder, _, filename = relative_path.rpartition('/')
+    return bool(folder) or not filename.endswith('.json')
+
+
+def _manifest_entry(obj, relative_path):
+    return {
+        'folder': relative_path.rpartition('/')[0],
+        'size': obj.size,
+        'generation': obj.generation,
+        'mtime': obj.updated
+    }
+
+
+def rebuild_user_manifest(username):
+    """Rebuild a user's manifest from a full listing of their prefix."""
+    prefix = get_user_storage_path(username) + '/'
+    objects, _ = storage.list(prefix)
+    _, prefixes = storage.list(prefix, delimiter='/')
+    files = {}
+    for obj in objects:
+        relative_path = obj.name[len(prefix):]
+        if is_manifest_tracked(relative_path):
+            files[relative_path] = _manifest_entry(obj, relative_path)
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'folders': sorted(p[len(prefix):].rstrip('/') for p in prefixes),
+        'files': files
+    }
+    write_storage_json(get_manifest_path(username), manifest, indent=None)
+    invalidate_file_list_cache(username)
+    logging.info(
+        f"Rebuilt manifest for user {username}: {len(files)} files, {len(manifest['folders'])} folders")
+    return manifest
+
+
+def load_user_manifest(username):
+    """Return the user's manifest, rebuilding it if missing or outdated."""
+    manifest = read_storage_json(get_manifest_path(username))
+    if not manifest or manifest.get('version') != MANIFEST_VERSION:
+        with _manifest_locks[username]:
+            return rebuild_user_manifest(username)
+    return manifest
+
+
+def load_user_manifest_versioned(username):
+    """Return (manifest, generation) read past the read cache.
+
+    The generation is None if the manifest had to be rebuilt.
+    """
+    content, generation = storage.read_with_generation(get_manifest_path(username))
+    try:
+        manifest = json.loads(content) if content else None
+    except json.JSONDecodeError as e:
+        logging.error(f"Error decoding JSON from manifest of {username}: {str(e)}")
+        manifest = None
+    if not manifest or manifest.get('version') != MANIFEST_VERSION:
+        with _manifest_locks[username]:
+            return rebuild_user_manifest(username), None
+    return manifest, generation
+
+
+def update_user_manifest(username, update):
+    """Apply update(manifest) and persist it.
+
+    The lock only serializes this process: the manifest is read past the read
+    cache and written conditionally on that generation, so an update made by
+    another worker in between is retried rather than overwritten. If updates
+    keep colliding the manifest is rebuilt from a listing instead.
+    """
+    path = get_manifest_path(username)
+    with _manifest_locks[username]:
+        for _ in range(MANIFEST_UPDATE_ATTEMPTS):
+            content, generation = storage.read_with_generation(path)
+            try:
+                manifest = json.loads(content) if content else None
+            except json.JSONDecodeError as e:
+                logging.error(f"Error decoding JSON from {path}: {str(e)}")
+                manifest = None
+            if not manifest or manifest.get('version') != MANIFEST_VERSION:
+                # A rebuild already reflects the change that triggered the update
+                rebuild_user_manifest(username)
+                return
+            update(manifest)
+            try:
+                storage.write(path, json.dumps(manifest),
+                              if_generation_match=generation)
+                break
+            except WriteConflict:
+                logging.debug(f"Manifest of {username} changed concurrently, retrying")
+        else:
+            logging.warning(
+                f"Manifest of {username} kept changing during update, rebuilding")
+            rebuild_user_manifest(username)
+            return
+        invalidate_file_list_cache(username)
+
+
+def manifest_record_file(username, relative_path, obj=None):
+    """Record the current state of a file that was just created or changed."""
+    if not is_manifest_tracked(relative_path):
+        return
+    obj = obj or storage.stat(get_user_storage_path(
+        username, filename=relative_path))
+
+    def update(manifest):
+        if obj is None:
+            manifest['files'].pop(relative_path, None)
+            return
+        entry = _manifest_entry(obj, relative_path)
+        manifest['files'][relative_path] = entry
+        top_folder = relative_path.split('/', 1)[0]
+        if entry['folder'] and top_folder not in manifest['folders']:
+            manifest['folders'] = sorted(manifest['folders'] + [top_folder])
+    update_user_manifest(username, update)
+
+
+def manifest_remove_file(username, relative_path):
+    if not is_manifest_tracked(relative_path):
+        return
+    update_user_manifest(
+        username, lambda manifest: manifest['files'].pop(relative_path, None))
+    unindex_user_document(username, relative_path)
+    folder, _, filename = relative_path.rpartition('/')
+    lesson_cache.invalidate((username, folder, filename))
+    if filename.endswith('.md'):
+        storage.delete(get_lesson_sidecar_path(username, folder, filename))
+
+
+def manifest_move_file(username, old_relative_path, new_relative_path):
+    move_indexed_document(username, old_relative_path, new_relative_path)
+    manifest_remove_file(username, old_relative_path)
+    manifest_record_file(username, new_relative_path)
+
+
+def manifest_add_folder(username, folder):
+    def update(manifest):
+        if folder not in manifest['folders']:
+            manifest['folders'] = sorted(manifest['folders'] + [folder])
+    update_user_manifest(username, update)
+
+
+def _remove_folder_entries(manifest, folder):
+    folder_prefix = folder + '/'
+    for relative_path in [p for p in manifest['files'] if p.startswith(folder_prefix)]:
+        del manifest['files'][relative_path]
+    if folder in manifest['folders']:
+        manifest['folders'].remove(folder)
+
+
+def manifest_remove_folder(username, folder):
+    update_user_manifest(
+        username, lambda manifest: _remove_folder_entries(manifest, folder))
+
+
+def manifest_rename_folder(username, old_folder, new_folder):
+    # Renames rewrite generations on object stores, so re-list the new folder
+    prefix = get_user_storage_path(username) + '/'
+    objects, _ = storage.list(get_user_storage_path(username, new_folder) + '/')
+
+    def update(manifest):
+        _remove_folder_entries(manifest, old_folder)
+        manifest['folders'] = sorted(manifest['folders'] + [new_folder])
+        for obj in objects:
+            relative_path = obj.name[len(prefix):]
+            if is_manifest_tracked(relative_path):
+                manifest['files'][relative_path] = _manifest_entry(
+                    obj, relative_path)
+    update_user_manifest(username, update)
+
+
+def list_manifest_files(username, folder=None, extension='.md', manifest=None):
+    """Return (folder, filename) pairs from the manifest, optionally for one folder."""
+    manifest = manifest or load_user_manifest(username)
+    files = []
+    for relative_path, entry in manifest['files'].items():
+        if extension and not relative_path.endswith(extension):
+            continue
+        if folder is not None and entry['folder'] != folder:
+            continue
+        files.append((entry['folder'], relative_path.rpartition('/')[2]))
+    return sorted(files)
+
+
+# Per-user full-text search index
+#
+# Parsed indexes are kept in process. Saves, renames and deletes update the
+# in-memory index; the persisted copy (artifacts/<user>/.search_index.json) is
+# brought up to date on the next search, which also re-indexes any document
+# whose manifest generation differs from the indexed one. The manifest is only
+# re-read when a stat shows it changed since the last search.
+_search_indexes = {}
+# username -> (manifest generation, {relative path: generation}) last indexed
+_search_index_sources = {}
+_dirty_search_indexes = set()
+_search_index_locks = defaultdict(threading.Lock)
+
+
+def get_search_index_path(username):
+    return get_user_storage_path(username, filename=SEARCH_INDEX_FILENAME)
+
+
+def _get_search_index(username):
+    """Return the in-memory index for a user; the caller holds its lock."""
+    index = _search_indexes.get(username)
+    if index is None:
+        index = SearchIndex.from_dict(
+            read_storage_json(get_search_index_path(username)))
+        _search_indexes[username] = index
+    return index
+
+
+def index_user_document(username, relative_path, content, generation):
+    if not relative_path.endswith('.md'):
+        return
+    with _search_index_locks[username]:
+        index = _search_indexes.get(username)
+        if index is not None:
+            index.add_document(relative_path, content, generation)
+            _dirty_search_indexes.add(username)
+
+
+def unindex_user_document(username, relative_path):
+    with _search_index_locks[username]:
+        index = _search_indexes.get(username)
+        if index is not None and relative_path in index.documents:
+            index.remove_document(relative_path)
+            _dirty_search_indexes.add(username)
+
+
+def move_indexed_document(username, old_relative_path, new_relative_path):
+    with _search_index_locks[username]:
+        index = _search_indexes.get(username)
+        if index is not None and old_relative_path in index.documents:
+            index.move_document(old_relative_path, new_relative_path)
+            _dirty_search_indexes.add(username)
+
+
+def refresh_search_index(username):
+    """Reconcile the user's index with the manifest and persist any changes."""
+    obj = storage.stat(get_manifest_path(username))
+    source = _search_index_sources.get(username)
+    if obj is not None and source is not None and source[0] == obj.generation:
+        documents = dict(source[1])
+    else:
+        manifest, generation = load_user_manifest_versioned(username)
+        documents = {relative_path: entry['generation']
+                     for relative_path, entry in manifest['files'].items()
+                     if relative_path.endswith('.md')}
+        if generation is not None:
+            _search_index_sources[username] = (generation, dict(documents))
+    for relative_path in documents:
+        if get_append_log_merge_for_path(relative_path):
+            # Appends do not change the canonical generation; the log version does
+            documents[relative_path] = append_log.get_version(
+                get_user_storage_path(username, filename=relative_path))
+    with _search_index_locks[username]:
+        index = _get_search_index(username)
+        stale = [relative_path for relative_path, generation in documents.items()
+                 if index.generation(relative_path) != generation]
+        removed = [relative_path for relative_path in index.documents
+                   if relative_path not in documents]
+
+    def read_document(relative_path):
+        return relative_path, read_user_document(username, relative_path)
+
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        contents = list(executor.map(read_document, stale))
+
+    with _search_index_locks[username]:
+        for relative_path in removed:
+            index.remove_document(relative_path)
+        for relative_path, content in contents:
+            if content is not None:
+                index.add_document(
+                    relative_path, content, documents[relative_path])
+        if stale or removed or username in _dirty_search_indexes:
+            write_storage_json(get_search_index_path(
+                username), index.to_dict(), indent=None)
+            _dirty_search_indexes.discard(username)
+            logging.info(
+                f"Updated search index for user {username}: {len(stale)} indexed, {len(removed)} removed")
+    return index
 
 
 def open_json_file(filename, username, folder='', default=None):
@@ -300,148 +822,113 @@ def open_json_file(filename, username, folder='', default=None):
         return default
 
 
+CACHE_DURATION = int(os.getenv('FILE_LIST_CACHE_TTL', 300))  # Cache file lists for 5 minutes
+FILE_LIST_CACHE_SIZE = int(os.getenv('FILE_LIST_CACHE_SIZE', 2048))
+# (username, folder) -> (manifest generation, markdown filenames),
+# (username, None) -> (manifest generation, folder names).
+# Entries are revalidated against the manifest's generation on every use, so
+# changes made by other workers are seen at once; the TTL only bounds memory.
+file_list_cache = TTLCache(maxsize=FILE_LIST_CACHE_SIZE, ttl=CACHE_DURATION)
+file_list_cache_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+_file_list_cache_lock = threading.Lock()
+
+
+def get_cached_listing(key, load):
+    """Return a cached listing for key, calling load(manifest) on a miss.
+
+    Costs one stat of the user's manifest when the cached listing is current.
+    """
+    obj = storage.stat(get_manifest_path(key[0]))
+    with _file_list_cache_lock:
+        entry = file_list_cache.get(key)
+        hit = entry is not None and obj is not None and entry[0] == obj.generation
+        file_list_cache_stats['hits' if hit else 'misses'] += 1
+    if hit:
+        return list(entry[1])
+    manifest, generation = load_user_manifest_versioned(key[0])
+    listing = load(manifest)
+    if generation is not None:
+        with _file_list_cache_lock:
+            file_list_cache[key] = (generation, listing)
+    return list(listing)
+
+
+def invalidate_file_list_cache(username):
+    """Drop every cached listing of a user."""
+    with _file_list_cache_lock:
+        for key in [key for key in list(file_list_cache) if key[0] == username]:
+            file_list_cache.pop(key, None)
+        file_list_cache_stats['invalidations'] += 1
+
+
+def get_file_list_cache_stats():
+    with _file_list_cache_lock:
+        stats = dict(file_list_cache_stats)
+        stats.update(entries=file_list_cache.currsize,
+                     max_entries=file_list_cache.maxsize, ttl=CACHE_DURATION)
+    return stats
+
+
 def list_md_files(username, folder=''):
     """List markdown files in the specified folder."""
-    if gcs_client.enabled:
-        try:
-            files = gcs_client.list_files(username, folder)
-            logging.debug(
-                f"Listed {len(files)} markdown files in GCS for user {username} in folder {folder}")
-            return files
-        except Exception as e:
-            logging.error(
-                f"Error listing markdown files in GCS for user {username} in folder {folder}: {str(e)}")
-            return []
-    user_dir = get_user_folder_dir(username, folder)
     ensure_user_artifacts_dir(username)
-    if not os.path.exists(user_dir):
-        logging.debug(f"Local directory not found: {user_dir}")
+    folder = folder.strip('/')
+    try:
+        files = get_cached_listing((username, folder), lambda manifest: [
+            filename for _, filename in list_manifest_files(username, folder, manifest=manifest)])
+    except Exception as e:
+        logging.error(
+            f"Error listing markdown files for user {username} in folder {folder}: {str(e)}")
         return []
-    files = [f for f in os.listdir(user_dir) if f.endswith('.md')]
     logging.debug(
-        f"Listed {len(files)} local markdown files for user {username} in folder {folder}")
+        f"Listed {len(files)} markdown files for user {username} in folder {folder}")
     return files
 
 
-file_list_cache = {}
-CACHE_DURATION = 300  # Cache file lists for 5 minutes
-
-
 def search_files(keyword, username):
-    """Search markdown files for a keyword."""
+    """Search the user's markdown files, best matches first."""
     if not keyword:
         return []
 
-    results = []
-    if gcs_client.enabled:
-        try:
-            prefix = f"artifacts/{username}/"
-            blobs = gcs_client.client.list_blobs(
-                gcs_client.bucket, prefix=prefix)
-            md_files = []
-            for blob in blobs:
-                if blob.name.endswith('.md'):
-                    relative_path = blob.name[len(prefix):]
-                    folder = os.path.dirname(
-                        relative_path).replace(os.sep, '/') or ''
-                    filename = os.path.basename(blob.name)
-                    md_files.append((blob, filename, folder))
-
-            logging.info(
-                f"Found {len(md_files)} .md files in GCS for user {username}")
-
-            def search_blob(blob_info):
-                blob, filename, folder = blob_info
-                try:
-                    content = blob.download_as_text(
-                        encoding='utf-8', start=0, end=10240)
-                    if keyword.lower() in content.lower():
-                        idx = content.lower().index(keyword.lower())
-                        start_idx = max(0, idx - 50)
-                        snippet = content[start_idx:start_idx +
-                                          100].replace('\n', ' ')
-                        return {
-                            'filename': filename,
-                            'path': os.path.join(folder, filename).replace(os.sep, '/'),
-                            'folder': folder,
-                            'snippet': snippet
-                        }
-                except UnicodeDecodeError:
-                    content = blob.download_as_text(
-                        encoding='iso-8859-1', start=0, end=10240)
-                    if keyword.lower() in content.lower():
-                        idx = content.lower().index(keyword.lower())
-                        start_idx = max(0, idx - 50)
-                        snippet = content[start_idx:start_idx +
-                                          100].replace('\n', ' ')
-                        return {
-                            'filename': filename,
-                            'path': os.path.join(folder, filename).replace(os.sep, '/'),
-                            'folder': folder,
-                            'snippet': snippet
-                        }
-                except Exception as e:
-                    logging.error(
-                        f"Error reading GCS file {blob.name}: {str(e)}")
-                return None
-
-            with ThreadPoolExecutor(max_workers=10) as executor:
-                future_to_blob = {executor.submit(
-                    search_blob, blob_info): blob_info for blob_info in md_files}
-                for future in as_completed(future_to_blob):
-                    result = future.result()
-                    if result:
-                        results.append(result)
-
-            logging.info(
-                f"Search for '{keyword}' returned {len(results)} results in GCS for user {username}")
-        except Exception as e:
-            logging.error(
-                f"Error searching files in GCS for user {username}: {str(e)}")
-        return results
-
-    user_artifacts_dir = get_user_artifacts_dir(username)
     ensure_user_artifacts_dir(username)
+    results = []
+    try:
+        index = refresh_search_index(username)
+        with _search_index_locks[username]:
+            matches = index.search(keyword, limit=SEARCH_RESULT_LIMIT)
+
+        def build_result(match):
+            relative_path, _, offset = match
+            folder, _, filename = relative_path.rpartition('/')
+            snippet = ''
+            try:
+                content = read_user_document(username, relative_path) or ''
+                start_idx = max(0, offset - 50)
+                snippet = content[start_idx:start_idx +
+                                  100].replace('\n', ' ')
+            except Exception as e:
+                logging.error(f"Error reading {relative_path}: {str(e)}")
+            return {
+                'filename': filename,
+                'path': relative_path,
+                'folder': folder,
+                'snippet': snippet
+            }
+
+        # Only the ranked matches are read, to cut their snippets
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            results = list(executor.map(build_result, matches))
+    except Exception as e:
+        logging.error(
+            f"Error searching files for user {username}: {str(e)}")
 
-    def search_in_directory(directory, relative_folder=''):
-        try:
-            for entry in os.listdir(directory):
-                full_path = os.path.join(directory, entry)
-                folder_path = relative_folder if relative_folder else ''
-                if os.path.isfile(full_path) and entry.endswith('.md'):
-                    try:
-                        with open(full_path, 'r', encoding='utf-8', errors='replace') as file:
-                            content = file.read(10240)
-                            if keyword.lower() in content.lower():
-                                file_path = os.path.join(
-                                    folder_path, entry) if folder_path else entry
-                                idx = content.lower().index(keyword.lower())
-                                start_idx = max(0, idx - 50)
-                                snippet = content[start_idx:start_idx +
-                                                  100].replace('\n', ' ')
-                                results.append({
-                                    'filename': entry,
-                                    'path': file_path,
-                                    'folder': folder_path,
-                                    'snippet': snippet
-                                })
-                    except Exception as e:
-                        logging.error(f"Error reading {full_path}: {e}")
-                elif os.path.isdir(full_path):
-                    new_relative_folder = os.path.join(
-                        relative_folder, entry) if relative_folder else entry
-                    search_in_directory(full_path, new_relative_folder)
-        except Exception as e:
-            logging.error(f"Error accessing directory {directory}: {e}")
-
-    search_in_directory(user_artifacts_dir)
     logging.info(
         f"Search for '{keyword}' returned {len(results)} results for user {username}")
     return results
 
 
-def save_file(filename, content, username, folder=''):
-    """Save a file in the specified folder, restricted to premium users."""
+def check_premium_user(username, filename):
+    """Raise unless the user exists and may write files."""
     user = User.query.filter_by(username=username).first()
     if not user:
         logging.error(f"User {username} not found")
@@ -452,60 +939,361 @@ def save_file(filename, content, username, folder=''):
         raise PermissionError(
             "Only premium users can save files. Please upgrade to premium.")
 
-    if gcs_client.enabled:
+
+def get_append_log_merge(filename, folder=''):
+    return APPEND_LOG_FILES.get((folder.strip('/'), filename))
+
+
+def get_append_log_merge_for_path(relative_path):
+    folder, _, filename = relative_path.rpartition('/')
+    return get_append_log_merge(filename, folder)
+
+
+def read_user_document(username, relative_path):
+    """Read a user file as it is shown to the user (append logs merged)."""
+    path = get_user_storage_path(username, filename=relative_path)
+    merge = get_append_log_merge_for_path(relative_path)
+    if not merge:
+        return storage.read(path)
+    flush_pending_writes(path)
+    return append_log.read_merged(path, merge)
+
+
+def save_file(filename, content, username, folder='', log_version=None):
+    """Save a file in the specified folder, restricted to premium users."""
+    check_premium_user(username, filename)
+    # Buffered changes must not land on top of this save later
+    flush_pending_writes(get_user_storage_path(username, folder, filename))
+    return store_user_file(filename, content, username, folder, log_version)
+
+
+def store_user_file(filename, content, username, folder='', log_version=None,
+                    if_generation_match=None):
+    """Write a user file and update the manifest and search index.
+
+    For append-log files, log_version is the version the content was read at
+    (see open_md_file_versioned): only the entries merged into that read are
+    replaced. Returns the new log version, or None for other files.
+    if_generation_match makes the write conditional (see storage.write).
+    """
+    path = get_user_storage_path(username, folder, filename)
+    try:
+        merge = get_append_log_merge(filename, folder)
+        if merge:
+            log_version = append_log.replace_content(path, content, log_version)
+        else:
+            storage.write(path, content, if_generation_match=if_generation_match)
+            log_version = None
+        lesson_cache.invalidate((username, folder.strip('/'), filename))
+        relative_path = join_path(folder, filename)
+        if is_manifest_tracked(relative_path):
+            obj = storage.stat(path)
+            manifest_record_file(username, relative_path, obj)
+            # Append logs are indexed from their merged content on refresh
+            if obj and not merge:
+                index_user_document(
+                    username, relative_path, content, obj.generation)
+                if filename.endswith('.md'):
+                    store_lesson(filename, username, folder,
+                                 content, obj.generation)
+        logging.info(f"File saved successfully: {path}")
+        return log_version
+    except WriteConflict:
+        raise
+    except Exception as e:
+        logging.error(f"Error saving file {path}: {str(e)}")
+        raise
+
+
+def update_json_file(filename, username, update, folder='', attempts=5):
+    """Read-modify-write a user JSON file, safe against concurrent workers.
+
+    update receives the parsed content ({} if missing or corrupted) and
+    returns the new content. The write is conditional on the generation that
+    was read and the cycle is retried if another worker wrote in between.
+    """
+    check_premium_user(username, filename)
+    flush_pending_writes(get_user_storage_path(username, folder, filename))
+    return _update_json_file(filename, username, update, folder, attempts)
+
+
+def _update_json_file(filename, username, update, folder='', attempts=5):
+    path = get_user_storage_path(username, folder, filename)
+    for _ in range(attempts):
+        content, generation = storage.read_with_generation(path)
+        data = {}
+        if content:
+            try:
+                data = json.loads(content)
+            except json.JSONDecodeError as e:
+                logging.error(f"Error decoding JSON from {path}: {str(e)}")
+        data = update(data)
         try:
-            gcs_client.save_file(filename, content, username, folder)
-            logging.info(
-                f"File saved successfully to GCS: artifacts/{username}/{folder}/{filename}")
-            return
-        except Exception as e:
-            logging.error(
-                f"Error saving file to GCS: artifacts/{username}/{folder}/{filename}: {str(e)}")
-            raise
-    user_dir = get_user_folder_dir(username, folder)
-    os.makedirs(user_dir, exist_ok=True)
-    full_path = os.path.join(user_dir, filename)
+            store_user_file(filename, json.dumps(data, indent=4), username, folder,
+                            if_generation_match=generation or 0)
+            return data
+        except WriteConflict:
+            logging.info(f"Concurrent update of {path}, retrying")
+    raise WriteConflict(f"Too many concurrent updates of {path}")
+
+
+def append_to_file(filename, entry, username, folder=''):
+    """Append an entry to an append-log file without rewriting it."""
+    check_premium_user(username, filename)
+    if not get_append_log_merge(filename, folder):
+        raise ValueError(f"File {filename} does not support appending")
+    if WRITE_BEHIND_WINDOW > 0:
+        buffer_append(filename, entry, username, folder)
+    else:
+        store_appended_entries(filename, [entry], username, folder)
+
+
+def store_appended_entries(filename, entries, username, folder=''):
+    """Write buffered entries of an append-log file as a single segment."""
+    path = get_user_storage_path(username, folder, filename)
+    merge = get_append_log_merge(filename, folder)
+    # JSON logs hold one entry per line; markdown entries carry their newlines
+    separator = '\n' if merge is append_log.merge_json_list else ''
     try:
-        with open(full_path, 'w', encoding='utf-8') as file:
-            file.write(content)
-        logging.info(f"File saved successfully: {full_path}")
+        append_log.append_entry(path, separator.join(entries), merge, on_compact=lambda: manifest_record_file(
+            username, join_path(folder, filename)))
+        logging.info(f"Appended {len(entries)} entries to {path}")
     except Exception as e:
-        logging.error(f"Error saving file {full_path}: {str(e)}")
+        logging.error(f"Error appending to file {path}: {str(e)}")
         raise
 
 
+# Write-behind buffer
+#
+# High-frequency small writes (typos, word bank appends, progress saves) are
+# held in process for WRITE_BEHIND_WINDOW seconds and flushed as one write per
+# file. Reading a path through open_md_file flushes it first, and everything
+# is flushed at interpreter shutdown; a killed worker loses up to a window of
+# buffered writes. The buffer is per process, so only blind writes (appends
+# and whole-file overwrites not derived from a read) are buffered as content:
+# read-modify-write changes are buffered as update functions and applied at
+# flush time with update_json_file. Set the window to 0 to write through.
+WRITE_BEHIND_WINDOW = float(os.getenv('WRITE_BEHIND_WINDOW', 5))
+# path -> (username, folder, filename, content)
+_pending_writes = {}
+# path -> (username, folder, filename, [entries])
+_pending_appends = {}
+# path -> (username, folder, filename, [update functions])
+_pending_updates = {}
+# path -> time.monotonic() of the oldest unflushed change
+_pending_since = {}
+_write_buffer_lock = threading.Lock()
+_path_flush_locks = defaultdict(threading.Lock)
+_flusher_thread = None
+
+
+def buffer_file_write(filename, content, username, folder=''):
+    """Save a file like save_file, coalescing writes within the window.
+
+    Only for blind overwrites: content computed from a read of the same file
+    would lose updates made by other workers while it is buffered.
+    """
+    check_premium_user(username, filename)
+    if WRITE_BEHIND_WINDOW <= 0:
+        store_user_file(filename, content, username, folder)
+        return
+    path = get_user_storage_path(username, folder, filename)
+    with _write_buffer_lock:
+        has_changes = path in _pending_appends or path in _pending_updates
+    if has_changes:
+        # Keep earlier changes ordered before the full write that follows them
+        flush_pending_writes(path)
+    with _write_buffer_lock:
+        _pending_writes[path] = (username, folder, filename, content)
+        _pending_since.setdefault(path, time.monotonic())
+    _ensure_flusher()
+
+
+def buffer_json_update(filename, username, update, folder=''):
+    """Apply update to a JSON file like update_json_file, within the window.
+
+    The updates buffered for a file are applied in order at flush time, in a
+    single conditional read-modify-write, so they compose with changes made
+    by other workers in the meantime.
+    """
+    check_premium_user(username, filename)
+    if WRITE_BEHIND_WINDOW <= 0:
+        update_json_file(filename, username, update, folder)
+        return
+    path = get_user_storage_path(username, folder, filename)
+    with _write_buffer_lock:
+        _pending_updates.setdefault(
+            path, (username, folder, filename, []))[3].append(update)
+        _pending_since.setdefault(path, time.monotonic())
+    _ensure_flusher()
+
+
+def buffer_append(filename, entry, username, folder=''):
+    path = get_user_storage_path(username, folder, filename)
+    with _write_buffer_lock:
+        _pending_appends.setdefault(
+            path, (username, folder, filename, []))[3].append(entry)
+        _pending_since.setdefault(path, time.monotonic())
+    _ensure_flusher()
+
+
+def flush_pending_writes(path):
+    """Write out anything buffered for path (read-your-writes)."""
+    with _path_flush_locks[path]:
+        with _write_buffer_lock:
+            write = _pending_writes.pop(path, None)
+            appends = _pending_appends.pop(path, None)
+            updates = _pending_updates.pop(path, None)
+            _pending_since.pop(path, None)
+        if write:
+            store_user_file(write[2], write[3], write[0], write[1])
+        if appends:
+            store_appended_entries(
+                appends[2], appends[3], appends[0], appends[1])
+        if updates:
+            def apply_all(data, updates=updates[3]):
+                for update in updates:
+                    data = update(data)
+                return data
+            _update_json_file(updates[2], updates[0], apply_all, updates[1])
+
+
+def discard_pending_writes(path):
+    with _write_buffer_lock:
+        _pending_writes.pop(path, None)
+        _pending_appends.pop(path, None)
+        _pending_updates.pop(path, None)
+        _pending_since.pop(path, None)
+
+
+def flush_due_writes(force=False):
+    """Flush every path whose oldest change is older than the window."""
+    cutoff = time.monotonic() - WRITE_BEHIND_WINDOW
+    with _write_buffer_lock:
+        due = [path for path, since in _pending_since.items()
+               if force or since <= cutoff]
+    for path in due:
+        try:
+            flush_pending_writes(path)
+        except Exception as e:
+            logging.error(f"Error flushing buffered writes for {path}: {str(e)}")
+
+
+def _ensure_flusher():
+    global _flusher_thread
+    with _write_buffer_lock:
+        if _flusher_thread is not None:
+            return
+        _flusher_thread = threading.Thread(
+            target=_run_flusher, name='write-behind-flusher', daemon=True)
+    _flusher_thread.start()
+
+
+def _run_flusher():
+    while True:
+        time.sleep(max(WRITE_BEHIND_WINDOW / 2, 0.1))
+        flush_due_writes()
+
+
+atexit.register(flush_due_writes, force=True)
+
+
 def open_md_file(filename, username, folder=''):
     """Open a markdown or JSON file in the specified folder."""
-    if gcs_client.enabled:
-        content = gcs_client.open_file(filename, username, folder)
-        if content is not None:
-            logging.info(
-                f"File opened successfully from GCS: artifacts/{username}/{folder}/{filename}")
-            return content
-        if filename in ['wordbank.md', 'wordbank_organized.md', 'wordbank_saved.md']:
-            gcs_client.save_file(filename, '', username, folder)
-            logging.info(
-                f"Created empty file in GCS: artifacts/{username}/{folder}/{filename}")
-            return ''
-        logging.error(
-            f"File not found in GCS: artifacts/{username}/{folder}/{filename}")
-        raise FileNotFoundError(f"File {filename} not found")
-    user_dir = get_user_folder_dir(username, folder)
-    full_path = os.path.join(user_dir, filename)
+    return open_md_file_versioned(filename, username, folder)[0]
+
+
+def open_md_file_versioned(filename, username, folder=''):
+    """Open a file like open_md_file, returning (content, log version).
+
+    The log version is None unless the file is an append log; pass it back
+    to save_file to replace exactly the content that was read.
+    """
+    path = get_user_storage_path(username, folder, filename)
+    merge = get_append_log_merge(filename, folder)
+    flush_pending_writes(path)
+    version = None
     try:
-        with open(full_path, 'r', encoding='utf-8') as file:
-            content = file.read()
-        logging.info(f"File opened successfully: {full_path}")
-        return content
-    except UnicodeDecodeError:
-        logging.warning(
-            f"UTF-8 decode failed for {full_path}, trying with iso-8859-1")
-        with open(full_path, 'r', encoding='iso-8859-1') as file:
-            content = file.read()
-        return content
+        if merge:
+            content, version = append_log.read_merged_versioned(
+                path, merge, on_compact=lambda: manifest_record_file(
+                    username, join_path(folder, filename)))
+        else:
+            content = storage.read(path)
     except Exception as e:
-        logging.error(f"Error opening file {full_path}: {str(e)}")
+        logging.error(f"Error opening file {path}: {str(e)}")
         raise
+    if content is not None:
+        logging.info(f"File opened successfully: {path}")
+        return content, version
+    if filename in ['wordbank.md', 'wordbank_organized.md', 'wordbank_saved.md']:
+        storage.write(path, '')
+        manifest_record_file(username, join_path(folder, filename))
+        logging.info(f"Created empty file: {path}")
+        if merge:
+            version = append_log.get_version(path)
+        return '', version
+    logging.error(f"File not found: {path}")
+    raise FileNotFoundError(f"File {filename} not found")
+
+
+# Compiled practice lessons: an in-process LRU in front of a per-lesson
+# sidecar, both revalidated against the generation of the lesson file
+LESSON_CACHE_SIZE = int(os.getenv('LESSON_CACHE_SIZE', 256))
+lesson_cache = LessonCache(LESSON_CACHE_SIZE)
+
+
+def get_lesson_sidecar_path(username, folder, filename):
+    return get_user_storage_path(username, folder, f".{filename}.lesson.json")
+
+
+def store_lesson(filename, username, folder, content, generation):
+    """Compile a lesson and store it in the cache and, for tables, its sidecar."""
+    folder = folder.strip('/')
+    lesson = compile_lesson(content)
+    if generation is None:
+        return lesson
+    lesson_cache.put((username, folder, filename), lesson, generation)
+    if is_lesson(lesson):
+        try:
+            write_storage_json(get_lesson_sidecar_path(username, folder, filename),
+                               lesson_to_dict(lesson, generation), indent=None)
+        except Exception as e:
+            logging.error(
+                f"Error writing lesson sidecar for {filename} of user {username}: {str(e)}")
+    return lesson
+
+
+def load_lesson(filename, username, folder='', content=None):
+    """Return the compiled lesson for a markdown file, parsing it only when it changed.
+
+    Pass content when the caller already read the file to avoid a second read
+    on a cache miss. Raises FileNotFoundError if the file does not exist.
+    """
+    folder = folder.strip('/')
+    key = (username, folder, filename)
+    # A metadata request on every load: saves made by other workers do not
+    # invalidate this process's cache
+    obj = storage.stat(get_user_storage_path(username, folder, filename))
+    generation = obj.generation if obj else None
+    cached = lesson_cache.get(key)
+    if cached and generation is not None and cached[1] == generation:
+        lesson_cache.record('hits')
+        return cached[0]
+
+    if generation is not None:
+        lesson = lesson_from_dict(read_storage_json(
+            get_lesson_sidecar_path(username, folder, filename)), generation)
+        if lesson is not None:
+            lesson_cache.record('sidecar_hits')
+            lesson_cache.put(key, lesson, generation)
+            return lesson
+
+    # Lessons saved before sidecars existed, or changed behind our back
+    lesson_cache.record('misses')
+    if content is None:
+        content = open_md_file(filename, username, folder)
+    return store_lesson(filename, username, folder, content, generation)
 
 
 def save_user(email, username, password):
@@ -553,29 +1341,32 @@ def update_user_password(email, new_password):
 def create_user_folder(username, folder):
     """Create a new folder for the user."""
     ensure_user_artifacts_dir(username)
-    if gcs_client.enabled:
-        return gcs_client.create_user_folder(username, folder)
-    user_dir = get_user_folder_dir(username, folder)
-    if os.path.exists(user_dir):
+    folder_path = get_user_storage_path(username, folder)
+    if storage.folder_exists(folder_path):
         raise FileExistsError(f"Folder '{folder}' already exists.")
-    os.makedirs(user_dir, exist_ok=True)
+    storage.make_folder(folder_path)
+    manifest_add_folder(username, folder)
     logging.info(f"Created folder '{folder}' for user '{username}'")
-    return user_dir
+    return folder_path
 
 
 def delete_user_folder(username, folder):
     """Delete a folder for the user."""
     ensure_user_artifacts_dir(username)
-    if gcs_client.enabled:
-        return gcs_client.delete_user_folder(username, folder)
-    user_dir = get_user_folder_dir(username, folder)
-    if not os.path.exists(user_dir):
+    folder_path = get_user_storage_path(username, folder)
+    if not storage.folder_exists(folder_path):
         raise FileNotFoundError(f"Folder '{folder}' does not exist.")
 
-    if os.listdir(user_dir):
+    objects, prefixes = storage.list(folder_path + '/', delimiter='/')
+    contents = [obj.name for obj in objects
+                if os.path.basename(obj.name) != '.keep'] + prefixes
+    if contents:
+        logging.error(
+            f"Folder '{folder}' is not empty for user '{username}'. Contents: {contents}")
         raise ValueError(f"Folder '{folder}' is not empty. Cannot delete.")
 
-    os.rmdir(user_dir)
+    storage.remove_folder(folder_path)
+    manifest_remove_folder(username, folder)
     logging.info(f"Deleted folder '{folder}' for user '{username}'")
     return True
 
@@ -583,18 +1374,16 @@ def delete_user_folder(username, folder):
 def rename_user_folder(username, old_folder, new_folder):
     """Rename a folder for the user."""
     ensure_user_artifacts_dir(username)
-    if gcs_client.enabled:
-        return gcs_client.rename_user_folder(username, old_folder, new_folder)
-
-    old_dir = get_user_folder_dir(username, old_folder)
-    new_dir = get_user_folder_dir(username, new_folder)
+    old_path = get_user_storage_path(username, old_folder)
+    new_path = get_user_storage_path(username, new_folder)
 
-    if not os.path.exists(old_dir):
+    if not storage.folder_exists(old_path):
         raise FileNotFoundError(f"Folder '{old_folder}' does not exist.")
-    if os.path.exists(new_dir):
+    if storage.folder_exists(new_path):
         raise FileExistsError(f"Folder '{new_folder}' already exists.")
 
-    os.rename(old_dir, new_dir)
+    storage.rename_folder(old_path, new_path)
+    manifest_rename_folder(username, old_folder, new_folder)
     logging.info(
         f"Renamed folder from '{old_folder}' to '{new_folder}' for user '{username}'")
     return True
@@ -604,32 +1393,13 @@ def list_user_folders(username):
     """
     List all folders in the user's artifacts directory (including 'word bank' and 'free'),
     but excluding hidden folders (those starting with a dot).
-    Supports both local and GCS storage.
     """
     ensure_user_artifacts_dir(username)
-    if gcs_client.enabled:
-        try:
-            folders = gcs_client.list_folders(username)
-            user_folders = [
-                f for f in folders
-                if not f.startswith('.')
-            ]
-            logging.info(
-                f"Retrieved folders from GCS for user {username}: {user_folders}")
-            return sorted(user_folders)
-        except Exception as e:
-            logging.error(
-                f"Error listing folders from GCS for user {username}: {str(e)}")
-            return []
     try:
-        user_artifacts_dir = get_user_artifacts_dir(username)
-        folders = [
-            f for f in os.listdir(user_artifacts_dir)
-            if os.path.isdir(os.path.join(user_artifacts_dir, f))
-            and not f.startswith('.')
-        ]
+        folders = get_cached_listing((username, None), lambda manifest: sorted(
+            folder for folder in manifest['folders'] if not folder.startswith('.')))
         logging.info(f"Retrieved folders for user {username}: {folders}")
-        return sorted(folders)
+        return folders
     except Exception as e:
         logging.error(f"Error listing folders for user {username}: {str(e)}")
         return []
@@ -647,17 +1417,10 @@ def generate_unique_username(base_username):
 
 def initialize_user_books(username):
     """Initialize books.json for a user with default book links."""
-    books_file = os.path.join(get_user_artifacts_dir(username), 'books.json')
-    if not os.path.exists(books_file):
-        default_books = [
-            {"key": "A0A2", "title": "Book 1",
-                "url": "https://online.anyflip.com/rxoaf/axyh/index.html"},
-            {"key": "A2B1", "title": "Book 2",
-                "url": "https://online.anyflip.com/rxoaf/ycin/index.html"}
-        ]
+    books_file = get_user_storage_path(username, filename='books.json')
+    if not storage.exists(books_file):
         try:
-            with open(books_file, 'w', encoding='utf-8') as f:
-                json.dump(default_books, f, indent=4)
+            write_storage_json(books_file, DEFAULT_BOOKS)
             logging.info(f"Initialized books.json for user: {username}")
         except Exception as e:
             logging.error(
@@ -667,27 +1430,11 @@ def initialize_user_books(username):
 
 def get_user_books(username):
     """Retrieve the list of book links for a user."""
-    if gcs_client.enabled:
-        try:
-            content = gcs_client.open_file('books.json', username)
-            if content:
-                books = json.loads(content)
-                logging.debug(
-                    f"Retrieved books for {username} from GCS: {books}")
-                return books
-            return []
-        except Exception as e:
-            logging.error(
-                f"Error retrieving books.json from GCS for {username}: {str(e)}")
-            return []
-    books_file = os.path.join(get_user_artifacts_dir(username), 'books.json')
     try:
-        if os.path.exists(books_file):
-            with open(books_file, 'r', encoding='utf-8') as f:
-                books = json.load(f)
-                logging.debug(f"Retrieved books for {username}: {books}")
-                return books
-        return []
+        books = read_storage_json(get_user_storage_path(
+            username, filename='books.json'), [])
+        logging.debug(f"Retrieved books for {username}: {books}")
+        return books
     except Exception as e:
         logging.error(f"Error reading books.json for {username}: {str(e)}")
         return []
@@ -701,32 +1448,102 @@ def save_user_books(username, books):
             f"User {username} is not premium or not found, cannot save books")
         raise PermissionError("Only premium users can manage book links.")
 
-    if gcs_client.enabled:
-        try:
-            gcs_client.save_file(
-                'books.json', json.dumps(books, indent=4), username)
-            logging.info(f"Saved books.json to GCS for user: {username}")
-        except Exception as e:
-            logging.error(
-                f"Error saving books.json to GCS for {username}: {str(e)}")
-            raise
-    books_file = os.path.join(get_user_artifacts_dir(username), 'books.json')
     try:
-        with open(books_file, 'w', encoding='utf-8') as f:
-            json.dump(books, f, indent=4)
+        write_storage_json(get_user_storage_path(
+            username, filename='books.json'), books)
         logging.info(f"Saved books.json for user: {username}")
     except Exception as e:
         logging.error(f"Error saving books.json for {username}: {str(e)}")
         raise
 
 
-def create_zip_from_folder(username, folder, zip_path):
+ZIP_FETCH_WORKERS = 8
+
+
+class ZipStreamBuffer:
+    """Write-only sink for zipfile; collected bytes are drained after each entry.
+
+    It reports a position but cannot seek, so zipfile writes streaming-style
+    entries (with data descriptors) instead of patching headers afterwards.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def read_export_bytes(path, merge=None):
+    if not merge:
+        return storage.read_bytes(path)
+    flush_pending_writes(path)
+    content = append_log.read_merged(path, merge)
+    return content.encode('utf-8') if content is not None else None
+
+
+def stream_zip(entries, max_workers=ZIP_FETCH_WORKERS):
     """
-    Create a ZIP file containing all .md files in the user's folder.
+    Yield a ZIP archive of (arcname, storage path, merge) entries chunk by
+    chunk; append-log files (merge set) are exported merged.
+    Objects are fetched concurrently, but at most 2 * max_workers are held in
+    memory at once; entries are written in the order their downloads finish.
+    """
+    entries = iter(entries)
+    buffer = ZipStreamBuffer()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor, \
+            zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        pending = set()
+
+        def submit_next():
+            for arcname, path, merge in entries:
+                future = executor.submit(read_export_bytes, path, merge)
+                future.entry = (arcname, path)
+                pending.add(future)
+                return True
+            return False
+
+        while len(pending) < 2 * max_workers and submit_next():
+            pass
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.discard(future)
+                arcname, path = future.entry
+                data = future.result()
+                if data is None:
+                    logging.error(f"File disappeared during ZIP export: {path}")
+                else:
+                    zipf.writestr(arcname, data)
+                    logging.debug(f"Added {path} to ZIP as {arcname}")
+                submit_next()
+            yield buffer.drain()
+    # Central directory written on close
+    yield buffer.drain()
+
+
+def create_zip_from_folder(username, folder):
+    """
+    Stream a ZIP archive containing all .md files in the user's folder.
     Args:
         username (str): The username.
         folder (str): The folder to zip (empty for root).
-        zip_path (str): Path where the ZIP file will be saved.
+    Returns:
+        A generator of ZIP chunks; the folder is validated before returning.
     Raises:
         FileNotFoundError: If the folder doesn't exist.
         ValueError: If the user doesn't exist.
@@ -736,44 +1553,32 @@ def create_zip_from_folder(username, folder, zip_path):
         logging.error(f"User {username} not found")
         raise ValueError(f"User {username} not found")
 
-    if gcs_client.enabled:
-        try:
-            gcs_client.create_zip_from_folder(username, folder, zip_path)
-            logging.info(
-                f"Created ZIP file from GCS for folder '{folder or 'root'}' for user {username}")
-            return
-        except Exception as e:
-            logging.error(
-                f"Error creating ZIP from GCS for folder {folder} for user {username}: {str(e)}")
-            raise
-
-    user_dir = get_user_folder_dir(username, folder)
-    if not os.path.exists(user_dir):
-        logging.error(f"Folder not found: {user_dir}")
+    folder_path = get_user_storage_path(username, folder)
+    if folder and not storage.folder_exists(folder_path):
+        logging.error(f"Folder not found: {folder_path}")
         raise FileNotFoundError(f"Folder '{folder or 'root'}' not found")
 
-    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        for root, _, files in os.walk(user_dir):
-            for file in files:
-                if file.endswith('.md'):
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.join(
-                        folder or 'root', os.path.relpath(file_path, user_dir))
-                    zipf.write(file_path, arcname)
-                    logging.debug(f"Added {file_path} to ZIP as {arcname}")
-
+    objects, _ = storage.list(folder_path + '/')
+    entries = []
+    for obj in objects:
+        if obj.name.endswith('.md'):
+            relative_path = join_path(folder, obj.name[len(folder_path) + 1:])
+            entries.append((join_path(folder or 'root', obj.name[len(folder_path) + 1:]), obj.name,
+                            get_append_log_merge_for_path(relative_path)))
     logging.info(
-        f"Created ZIP file at {zip_path} for folder '{folder or 'root'}' for user {username}")
+        f"Streaming ZIP of {len(entries)} files for folder '{folder or 'root'}' for user {username}")
+    return stream_zip(entries)
 
 
-def create_zip_from_files(username, folder, files, zip_path):
+def create_zip_from_files(username, folder, files):
     """
-    Create a ZIP file containing specified .md files in the user's folder.
+    Stream a ZIP archive containing specified .md files in the user's folder.
     Args:
         username (str): The username.
         folder (str): The folder containing the files (empty for root).
         files (list): List of filenames to include in the ZIP.
-        zip_path (str): Path where the ZIP file will be saved.
+    Returns:
+        A generator of ZIP chunks; the files are validated before returning.
     Raises:
         FileNotFoundError: If the folder or any file doesn't exist.
         ValueError: If the user doesn't exist.
@@ -783,51 +1588,34 @@ def create_zip_from_files(username, folder, files, zip_path):
         logging.error(f"User {username} not found")
         raise ValueError(f"User {username} not found")
 
-    if gcs_client.enabled:
-        try:
-            gcs_client.create_zip_from_files(username, folder, files, zip_path)
-            logging.info(
-                f"Created ZIP file from GCS for {len(files)} files in folder '{folder or 'root'}' for user {username}")
-            return
-        except Exception as e:
-            logging.error(
-                f"Error creating ZIP from GCS for files in folder {folder} for user {username}: {str(e)}")
-            raise
-
-    user_dir = get_user_folder_dir(username, folder)
-    if not os.path.exists(user_dir):
-        logging.error(f"Folder not found: {user_dir}")
+    folder_path = get_user_storage_path(username, folder)
+    if folder and not storage.folder_exists(folder_path):
+        logging.error(f"Folder not found: {folder_path}")
         raise FileNotFoundError(f"Folder '{folder or 'root'}' not found")
 
-    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        for file in files:
-            file_path = os.path.join(user_dir, file)
-            if not os.path.exists(file_path):
-                logging.error(f"File not found: {file_path}")
-                raise FileNotFoundError(
-                    f"File '{file}' not found in folder '{folder or 'root'}'")
-            arcname = os.path.join(folder or 'root', file)
-            zipf.write(file_path, arcname)
-            logging.debug(f"Added {file_path} to ZIP as {arcname}")
+    # Validate up front: once streaming starts the status code is sent
+    existing = {obj.name for obj in storage.list(folder_path + '/', delimiter='/')[0]}
+    entries = []
+    for file in files:
+        file_path = join_path(folder_path, file)
+        if file_path not in existing:
+            logging.error(f"File not found: {file_path}")
+            raise FileNotFoundError(
+                f"File '{file}' not found in folder '{folder or 'root'}'")
+        entries.append((join_path(folder or 'root', file), file_path,
+                        get_append_log_merge(file, folder)))
 
     logging.info(
-        f"Created ZIP file at {zip_path} for {len(files)} files in folder '{folder or 'root'}' for user {username}")
+        f"Streaming ZIP of {len(files)} files in folder '{folder or 'root'}' for user {username}")
+    return stream_zip(entries)
 
 
 def ensure_published_dir():
-    """Ensure the artifacts/published directory exists (locally or in GCS)."""
-    if gcs_client.enabled:
-        placeholder_path = f"{PUBLISH_DIR_GCS}/.placeholder"
-        blob = gcs_client.bucket.blob(placeholder_path)
-        if not blob.exists():
-            try:
-                gcs_client.write_file(placeholder_path, '')
-                logging.info(f"Created placeholder in GCS: {placeholder_path}")
-            except Exception as e:
-                logging.error(
-                    f"Error creating placeholder in GCS: {placeholder_path}: {str(e)}")
-        return
-
-    if not os.path.exists(PUBLISH_DIR_LOCAL):
-        os.makedirs(PUBLISH_DIR_LOCAL, exist_ok=True)
-        logging.info(f"Created published directory: {PUBLISH_DIR_LOCAL}")
+    """Ensure the artifacts/published folder exists in storage."""
+    if not storage.folder_exists(PUBLISH_DIR):
+        try:
+            storage.make_folder(PUBLISH_DIR)
+            logging.info(f"Created published folder: {PUBLISH_DIR}")
+        except Exception as e:
+            logging.error(
+                f"Error creating published folder {PUBLISH_DIR}: {str(e)}")
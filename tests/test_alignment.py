@@ -0,0 +1,63 @@
+import random
+
+from src.alignment import align_words, compare_words, is_similar, normalize_word
+
+
+def levenshtein(a, b):
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1,
+                             previous[j - 1] + (a[i - 1] != b[j - 1]))
+        previous = current
+    return previous[len(b)]
+
+
+def statuses(analysis):
+    return [(item['original'], item['transcribed'], item['status']) for item in analysis]
+
+
+def test_normalize_word():
+    assert normalize_word('Huis,') == 'huis'
+    assert normalize_word('...') == '...'
+
+
+def test_is_similar_matches_levenshtein_ratio():
+    rng = random.Random(0)
+    for _ in range(500):
+        a = ''.join(rng.choices('abc', k=rng.randint(1, 8)))
+        b = ''.join(rng.choices('abc', k=rng.randint(1, 8)))
+        ratio = 1 - levenshtein(a, b) / max(len(a), len(b))
+        assert is_similar(a, b) == (ratio > 0.7 + 1e-9)
+
+
+def test_compare_words():
+    assert compare_words('fiets', 'fiets') == 'correct'
+    assert compare_words('vermoeid', 'vermoed') == 'similar'
+    assert compare_words('fiets', 'auto') == 'incorrect'
+
+
+def test_missing_word_does_not_shift_later_words():
+    analysis = align_words('Ik ga morgen naar school'.split(), 'Ik ga naar school'.split())
+    assert statuses(analysis) == [
+        ('Ik', 'Ik', 'correct'), ('ga', 'ga', 'correct'), ('morgen', '', 'incorrect'),
+        ('naar', 'naar', 'correct'), ('school', 'school', 'correct')]
+
+
+def test_extra_and_misspoken_words():
+    analysis = align_words('de kat slaapt'.split(), 'de grote kat slapt'.split())
+    assert statuses(analysis) == [
+        ('de', 'de', 'correct'), ('', 'grote', 'incorrect'),
+        ('kat', 'kat', 'correct'), ('slaapt', 'slapt', 'similar')]
+
+
+def test_every_word_appears_once_in_order():
+    rng = random.Random(1)
+    vocabulary = ['een', 'twee', 'drie', 'vier', 'vijf', 'zes']
+    for _ in range(100):
+        reference = rng.choices(vocabulary, k=rng.randint(0, 30))
+        spoken = [word for word in reference if rng.random() > 0.2] + rng.choices(vocabulary, k=2)
+        analysis = align_words(reference, spoken)
+        assert [item['original'] for item in analysis if item['original']] == reference
+        assert [item['transcribed'] for item in analysis if item['transcribed']] == spoken
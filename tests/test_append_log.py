@@ -0,0 +1,163 @@
+import json
+
+import pytest
+
+from src import append_log
+from src.append_log import LogConflict, merge_json_list, merge_text
+from src.storage import InMemoryStorageBackend
+
+PATH = 'users/anna/word bank/wordbank.md'
+
+
+@pytest.fixture
+def store(monkeypatch):
+    backend = InMemoryStorageBackend()
+    monkeypatch.setattr(append_log, 'storage', backend)
+    append_log._append_counts.clear()
+    return backend
+
+
+def segments(backend):
+    objects, _ = backend.list(append_log.get_segments_prefix(PATH))
+    return [obj.name for obj in objects if obj.name.endswith(append_log.SEGMENT_SUFFIX)]
+
+
+def wait_for_compactions():
+    append_log._compaction_executor.submit(lambda: None).result()
+
+
+def test_appends_merged_on_read(store):
+    store.write(PATH, 'huis\n')
+    append_log.append_entry(PATH, 'kat\n', merge_text)
+    append_log.append_entry(PATH, 'hond\n', merge_text)
+    assert store.read(PATH) == 'huis\n'
+    assert append_log.read_merged(PATH, merge_text) == 'huis\nkat\nhond\n'
+
+
+def test_json_entries_merged_into_list(store):
+    append_log.append_entry(PATH, json.dumps({'word': 'kat'}) + '\n', merge_json_list)
+    append_log.append_entry(PATH, json.dumps({'word': 'hond'}) + '\n', merge_json_list)
+    assert json.loads(append_log.read_merged(PATH, merge_json_list)) == \
+        [{'word': 'kat'}, {'word': 'hond'}]
+
+
+def test_compacted_once_threshold_reached(store, monkeypatch):
+    monkeypatch.setattr(append_log, 'COMPACT_THRESHOLD', 3)
+    store.write(PATH, 'huis\n')
+    for word in ('kat', 'hond', 'vis'):
+        append_log.append_entry(PATH, f"{word}\n", merge_text)
+    wait_for_compactions()
+    assert store.read(PATH) == 'huis\nkat\nhond\nvis\n'
+    assert segments(store) == []
+    assert append_log.read_merged(PATH, merge_text) == 'huis\nkat\nhond\nvis\n'
+
+
+def test_replace_keeps_entries_appended_after_the_read(store):
+    store.write(PATH, 'huis\n')
+    append_log.append_entry(PATH, 'kat\n', merge_text)
+    content, version = append_log.read_merged_versioned(PATH, merge_text)
+    append_log.append_entry(PATH, 'hond\n', merge_text)
+    append_log.replace_content(PATH, content.upper(), version)
+    assert append_log.read_merged(PATH, merge_text) == 'HUIS\nKAT\nhond\n'
+
+
+def test_replace_with_stale_version_conflicts(store):
+    store.write(PATH, 'huis\n')
+    _, version = append_log.read_merged_versioned(PATH, merge_text)
+    append_log.append_entry(PATH, 'kat\n', merge_text)
+    append_log.compact(PATH, merge_text)
+    with pytest.raises(LogConflict):
+        append_log.replace_content(PATH, 'huis\n', version)
+    assert append_log.read_merged(PATH, merge_text) == 'huis\nkat\n'
+
+
+def test_late_segment_with_old_name_not_lost(store):
+    store.write(PATH, 'huis\n')
+    append_log.append_entry(PATH, 'kat\n', merge_text)
+    append_log.compact(PATH, merge_text)
+    # Named before the compaction but written after it
+    store.write(append_log.get_segments_prefix(PATH) + '00000000000000000001-late0000.seg',
+                'hond\n')
+    assert append_log.read_merged(PATH, merge_text) == 'huis\nkat\nhond\n'
+    assert append_log.compact(PATH, merge_text) == 1
+    assert store.read(PATH) == 'huis\nkat\nhond\n'
+
+
+def test_crash_before_segments_deleted(store, monkeypatch):
+    store.write(PATH, 'huis\n')
+    append_log.append_entry(PATH, 'kat\n', merge_text)
+    append_log.append_entry(PATH, 'hond\n', merge_text)
+
+    delete_many = store.delete_many
+
+    def crash(paths):
+        raise RuntimeError('worker killed')
+
+    monkeypatch.setattr(store, 'delete_many', crash)
+    with pytest.raises(RuntimeError):
+        append_log.compact(PATH, merge_text)
+    monkeypatch.setattr(store, 'delete_many', delete_many)
+    assert len(segments(store)) == 2
+    assert append_log.read_merged(PATH, merge_text) == 'huis\nkat\nhond\n'
+    append_log.append_entry(PATH, 'vis\n', merge_text)
+    append_log.compact(PATH, merge_text)
+    assert store.read(PATH) == 'huis\nkat\nhond\nvis\n'
+
+
+def test_crash_between_marker_and_canonical_writes(store, monkeypatch):
+    store.write(PATH, 'huis\n')
+    append_log.append_entry(PATH, 'kat\n', merge_text)
+    marker = append_log.get_segments_prefix(PATH) + append_log.MARKER_NAME
+    write = store.write
+
+    def crash_after_marker(path, *args, **kwargs):
+        write(path, *args, **kwargs)
+        if path == marker:
+            raise RuntimeError('worker killed')
+
+    monkeypatch.setattr(store, 'write', crash_after_marker)
+    with pytest.raises(RuntimeError):
+        append_log.compact(PATH, merge_text)
+    monkeypatch.setattr(store, 'write', write)
+    # The canonical object was not rewritten, so the pending segment still counts
+    assert append_log.read_merged(PATH, merge_text) == 'huis\nkat\n'
+
+
+def test_crash_between_canonical_write_and_marker_update(store, monkeypatch):
+    store.write(PATH, 'huis\n')
+    append_log.append_entry(PATH, 'kat\n', merge_text)
+    marker = append_log.get_segments_prefix(PATH) + append_log.MARKER_NAME
+    write = store.write
+    marker_writes = []
+
+    def crash_on_second_marker(path, *args, **kwargs):
+        if path == marker:
+            marker_writes.append(path)
+            if len(marker_writes) == 2:
+                raise RuntimeError('worker killed')
+        write(path, *args, **kwargs)
+
+    monkeypatch.setattr(store, 'write', crash_on_second_marker)
+    with pytest.raises(RuntimeError):
+        append_log.compact(PATH, merge_text)
+    monkeypatch.setattr(store, 'write', write)
+    assert store.read(PATH) == 'huis\nkat\n'
+    # The segment is still listed as pending but already in the canonical object
+    assert append_log.read_merged(PATH, merge_text) == 'huis\nkat\n'
+    append_log.append_entry(PATH, 'hond\n', merge_text)
+    append_log.compact(PATH, merge_text)
+    assert store.read(PATH) == 'huis\nkat\nhond\n'
+    assert segments(store) == []
+
+
+def test_rewrites_wait_for_the_lease(store, monkeypatch):
+    monkeypatch.setattr(append_log, 'LEASE_WAIT', 0.1)
+    store.write(PATH, 'huis\n')
+    append_log.append_entry(PATH, 'kat\n', merge_text)
+    owner = append_log._acquire_lease(PATH, wait=False)
+    assert append_log._acquire_lease(PATH, wait=False) is None
+    assert append_log.compact(PATH, merge_text) == 0
+    with pytest.raises(LogConflict):
+        append_log.replace_content(PATH, 'huis\n')
+    append_log._release_lease(PATH, owner)
+    assert append_log.compact(PATH, merge_text) == 1
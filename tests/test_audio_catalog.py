@@ -0,0 +1,59 @@
+import random
+
+from src.audio_catalog import CATALOG_VERSION, AudioCatalog, catalog_terms
+
+
+def entry(*tags):
+    return {'size': 1, 'generation': 1, 'mtime': 0, 'duration': None, 'tags': list(tags)}
+
+
+def make_catalog():
+    return AudioCatalog({
+        'welcome.mp3': entry('intro'),
+        'les1-dialoog.mp3': entry('A1', 'welkom'),
+        'het-weer.mp3': entry('A2'),
+    })
+
+
+def test_search_by_name_and_tag_prefix_first():
+    catalog = make_catalog()
+    # Both start with 'wel' (one through its tag), so name order decides
+    assert catalog.search('wel') == ['les1-dialoog.mp3', 'welcome.mp3']
+    catalog.set_file('avondles.mp3', entry())
+    assert catalog.search('les') == ['les1-dialoog.mp3', 'avondles.mp3']
+    assert catalog.search('a1') == ['les1-dialoog.mp3']
+    assert catalog.search('dialoog') == ['les1-dialoog.mp3']
+    assert catalog.search('xyz') == []
+
+
+def test_empty_query_and_allowed_names():
+    catalog = make_catalog()
+    assert catalog.search('') == sorted(catalog.files)
+    assert catalog.search('', names=['het-weer.mp3', 'missing.mp3']) == ['het-weer.mp3']
+    assert catalog.search('wel', names=['les1-dialoog.mp3']) == ['les1-dialoog.mp3']
+
+
+def test_index_follows_changes():
+    catalog = make_catalog()
+    assert catalog.search('weer') == ['het-weer.mp3']
+    catalog.remove_file('het-weer.mp3')
+    catalog.set_file('weerbericht.mp3', entry())
+    assert catalog.search('weer') == ['weerbericht.mp3']
+
+
+def test_search_matches_linear_filter():
+    rng = random.Random(0)
+    catalog = AudioCatalog({
+        f"{''.join(rng.choices('abcd', k=8))}.mp3": entry(''.join(rng.choices('abcd', k=4)))
+        for _ in range(200)})
+    for query in ('a', 'ab', 'abc', 'abcd', 'dcba', 'b.mp'):
+        expected = {name for name, data in catalog.files.items()
+                    if any(query in term for term in catalog_terms(name, data))}
+        assert set(catalog.search(query)) == expected
+
+
+def test_round_trip_and_version_check():
+    catalog = make_catalog()
+    assert AudioCatalog.from_dict(catalog.to_dict()).files == catalog.files
+    assert AudioCatalog.from_dict({'version': CATALOG_VERSION - 1, 'files': {}}) is None
+    assert AudioCatalog.from_dict(None) is None
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from src import utils
+from src.audio_catalog import AudioCatalog
+from src.storage import InMemoryStorageBackend
+
+
+def test_files_missing_from_catalog_listed_without_metadata(monkeypatch):
+    catalog = AudioCatalog({'les1.mp3': {'size': 10, 'generation': 1, 'mtime': 0,
+                                         'duration': 61.5, 'bitrate': 128000,
+                                         'waveform': True, 'tags': ['A1']}})
+    monkeypatch.setattr(utils, 'load_audio_catalog', lambda: catalog)
+    monkeypatch.setattr(utils, 'list_audio_files', lambda username: ['les1.mp3', 'new.mp3'])
+    assert utils.list_audio_details('anna') == [
+        {'name': 'les1.mp3', 'size': 10, 'duration': 61.5, 'bitrate': 128000,
+         'waveform': True, 'tags': ['A1']},
+        {'name': 'new.mp3', 'size': None, 'duration': None, 'bitrate': None,
+         'waveform': False, 'tags': []},
+    ]
+
+
+@pytest.fixture
+def store(monkeypatch):
+    backend = InMemoryStorageBackend()
+    monkeypatch.setattr(utils, 'storage', backend)
+    monkeypatch.setattr(utils, '_audio_catalog',
+                        {'catalog': None, 'generation': None, 'checked_at': 0})
+    utils.audio_permissions_cache.clear()
+    return backend
+
+
+def write_permissions(backend, *filenames):
+    # Written straight to storage, as another worker would
+    backend.write(utils.get_user_storage_path('anna', filename='audio_permissions.json'),
+                  json.dumps({'accessible_audio_files': list(filenames)}))
+
+
+def test_revoked_permissions_seen_immediately(store):
+    write_permissions(store, 'les1.mp3', 'les2.mp3')
+    assert utils.get_audio_permissions('anna') == {'les1.mp3', 'les2.mp3'}
+    write_permissions(store, 'les1.mp3')
+    assert utils.get_audio_permissions('anna') == {'les1.mp3'}
+    store.delete(utils.get_user_storage_path('anna', filename='audio_permissions.json'))
+    assert utils.get_audio_permissions('anna') == frozenset()
+
+
+def test_concurrent_catalog_updates_kept(store):
+    entry = {'size': 1, 'generation': 1, 'mtime': 0, 'duration': None,
+             'bitrate': None, 'waveform': False, 'tags': []}
+    calls = []
+
+    def add_les1(catalog):
+        if not calls:
+            # Another worker records a file between our read and write
+            other = AudioCatalog.from_dict(json.loads(store.read(utils.AUDIO_CATALOG_PATH)))
+            other.set_file('les2.mp3', dict(entry))
+            store.write(utils.AUDIO_CATALOG_PATH, json.dumps(other.to_dict()))
+        calls.append(catalog)
+        catalog.set_file('les1.mp3', dict(entry))
+
+    catalog = utils.update_audio_catalog(add_les1)
+    assert len(calls) == 2
+    assert sorted(catalog.files) == ['les1.mp3', 'les2.mp3']
+    stored = json.loads(store.read(utils.AUDIO_CATALOG_PATH))
+    assert sorted(stored['files']) == ['les1.mp3', 'les2.mp3']
@@ -0,0 +1,28 @@
+import pytest
+
+from src.audio_formats import WHISPER_FORMATS, sniff_audio_format
+
+
+@pytest.mark.parametrize('header, expected', [
+    (b'ID3\x04\x00', 'mp3'),
+    (b'\xff\xfb\x90\x00', 'mp3'),  # MPEG-1 layer III
+    (b'\xff\xf3\x90\x00', 'mp3'),  # MPEG-2 layer III
+    (b'\xff\xf1\x50\x80', 'aac'),  # ADTS, MPEG-4, no CRC
+    (b'\xff\xf9\x50\x80', 'aac'),  # ADTS, MPEG-2, no CRC
+    (b'\xff\xf0\x50\x80', 'aac'),  # ADTS with CRC
+    (b'RIFF\x00\x00\x00\x00WAVEfmt ', 'wav'),
+    (b'\x1a\x45\xdf\xa3\x01\x00webm', 'webm'),
+    (b'\x1a\x45\xdf\xa3\x01\x00matroska', 'mkv'),
+    (b'OggS\x00', 'ogg'),
+    (b'fLaC\x00', 'flac'),
+    (b'\x00\x00\x00\x20ftypM4A ', 'm4a'),
+    (b'\x00\x00\x00\x20ftypisom', 'mp4'),
+    (b'not audio', None),
+    (b'', None),
+])
+def test_sniff_audio_format(header, expected):
+    assert sniff_audio_format(header + bytes(16)) == expected
+
+
+def test_adts_is_transcoded():
+    assert 'aac' not in WHISPER_FORMATS
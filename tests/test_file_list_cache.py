@@ -0,0 +1,41 @@
+import json
+
+import pytest
+
+from src import utils
+from src.storage import InMemoryStorageBackend
+
+
+@pytest.fixture
+def store(monkeypatch):
+    backend = InMemoryStorageBackend()
+    monkeypatch.setattr(utils, 'storage', backend)
+    monkeypatch.setattr(utils, '_provisioned_users', {'anna'})
+    utils.file_list_cache.clear()
+    return backend
+
+
+def write_manifest(backend, *relative_paths):
+    # Written straight to storage, as another worker would
+    files = {path: {'folder': path.rpartition('/')[0], 'size': 1, 'generation': 1,
+                    'mtime': 0} for path in relative_paths}
+    folders = sorted({path.split('/')[0] for path in relative_paths if '/' in path})
+    backend.write(utils.get_manifest_path('anna'), json.dumps(
+        {'version': utils.MANIFEST_VERSION, 'folders': folders, 'files': files}))
+
+
+def test_listing_cached_while_manifest_unchanged(store):
+    write_manifest(store, 'les/les1.md')
+    assert utils.list_md_files('anna', 'les') == ['les1.md']
+    hits = utils.file_list_cache_stats['hits']
+    assert utils.list_md_files('anna', 'les') == ['les1.md']
+    assert utils.file_list_cache_stats['hits'] == hits + 1
+
+
+def test_change_by_another_worker_seen_immediately(store):
+    write_manifest(store, 'les/les1.md')
+    assert utils.list_md_files('anna', 'les') == ['les1.md']
+    assert utils.list_user_folders('anna') == ['les']
+    write_manifest(store, 'les/les1.md', 'les/les2.md', 'oud/les0.md')
+    assert utils.list_md_files('anna', 'les') == ['les1.md', 'les2.md']
+    assert utils.list_user_folders('anna') == ['les', 'oud']
@@ -0,0 +1,51 @@
+import random
+
+from src.highlighter import (AUTOMATON_THRESHOLD, KeywordAutomaton, RegexMatcher,
+                             get_matcher, highlight, highlight_many)
+
+
+def test_whole_words_only_keeping_case():
+    assert highlight('Het huis en de Huisarts', ['huis']) == \
+        'Het <strong>huis</strong> en de Huisarts'
+    assert highlight('HUIS', ['huis']) == '<strong>HUIS</strong>'
+
+
+def test_longest_match_wins():
+    assert highlight('Ik woon in Den Haag', ['Den', 'Den Haag']) == \
+        'Ik woon in <strong>Den Haag</strong>'
+
+
+def test_no_keywords_leaves_text_unchanged():
+    assert highlight('Goedemorgen', []) == 'Goedemorgen'
+    assert highlight('Goedemorgen', ['']) == 'Goedemorgen'
+
+
+def test_large_sets_use_automaton():
+    words = [f"woord{i}" for i in range(AUTOMATON_THRESHOLD + 1)]
+    assert isinstance(get_matcher(words), KeywordAutomaton)
+    assert isinstance(get_matcher(words[:10]), RegexMatcher)
+
+
+def test_matcher_cached_by_keyword_set():
+    assert get_matcher(['kat', 'hond']) is get_matcher(['hond', 'kat'])
+
+
+def test_automaton_matches_regex():
+    rng = random.Random(0)
+    words = [''.join(rng.choices('abcde', k=rng.randint(1, 4))) for _ in range(300)]
+    words += ['ab cd', 'a_b']
+    regex, automaton = RegexMatcher(words), KeywordAutomaton(words)
+    for _ in range(200):
+        text = ''.join(rng.choices('abcde _.,', k=60))
+        assert list(automaton.matches(text)) == list(regex.matches(text))
+
+
+def test_automaton_falls_back_when_case_folding_changes_length():
+    words = [f"woord{i}" for i in range(AUTOMATON_THRESHOLD + 1)] + ['straat']
+    # 'İ' lowercases to two characters, shifting offsets
+    assert highlight('İstanbul straat', words) == 'İstanbul <strong>straat</strong>'
+
+
+def test_highlight_many():
+    assert highlight_many(['de kat', 'geen', 'KAT'], ['kat']) == \
+        ['de <strong>kat</strong>', 'geen', '<strong>KAT</strong>']
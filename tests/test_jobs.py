@@ -0,0 +1,143 @@
+import hashlib
+import io
+import time
+
+import pytest
+from flask import Flask
+
+from src import jobs
+from src.blueprints import openai as openai_blueprint
+from src.jobs import DONE, FAILED, QUEUED, JobQueue
+
+
+def wait_for(queue, job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job['status'] not in (QUEUED, 'running'):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"Job {job_id} still {job['status']}")
+
+
+def payload_digest(job):
+    return {'sha256': hashlib.sha256(job.payload).hexdigest(), 'size': len(job.payload),
+            'params': job.params, 'secrets': job.secrets}
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'jobs.db')
+
+
+@pytest.fixture
+def queue(db_path):
+    queue = JobQueue(db_path, 2)
+    queue.register('digest', payload_digest)
+    return queue
+
+
+def test_submit_and_poll(queue):
+    job_id = queue.submit('digest', 'anna', {'language': 'nl'}, payload=b'audio',
+                          secrets={'api_key': 'sk-test'})
+    job = wait_for(queue, job_id)
+    assert job['status'] == DONE and job['progress'] == 1
+    assert job['result']['params'] == {'language': 'nl'}
+    assert job['result']['secrets'] == {'api_key': 'sk-test'}
+    # Other users cannot see the job
+    assert queue.get(job_id, owner='bob') is None
+
+
+def test_payload_round_trips_as_blob(queue):
+    payload = bytes(range(256)) * 1000
+    job = wait_for(queue, queue.submit('digest', 'anna', {}, payload=payload))
+    assert job['result']['sha256'] == hashlib.sha256(payload).hexdigest()
+    assert job['result']['size'] == len(payload)
+    # Dropped once the job is finished
+    assert queue._execute("SELECT payload FROM jobs WHERE id = ?",
+                          (job['id'],)).fetchone() == (None,)
+
+
+def test_unknown_kind_rejected(queue):
+    with pytest.raises(ValueError):
+        queue.submit('unknown', 'anna', {})
+
+
+def test_jobs_pinned_to_submitting_node(db_path):
+    # Two processes sharing the queue; the first runs no workers
+    submitter, other = JobQueue(db_path, 0), JobQueue(db_path, 2)
+    for queue in (submitter, other):
+        queue.register('digest', payload_digest)
+    other._ensure_workers()
+    job_id = submitter.submit('digest', 'anna', {}, payload=b'audio')
+    time.sleep(0.3)
+    assert other.get(job_id)['status'] == QUEUED
+
+
+def test_jobs_of_dead_node_marked_failed(db_path):
+    gone, alive = JobQueue(db_path, 0), JobQueue(db_path, 0)
+    for queue in (gone, alive):
+        queue.register('digest', payload_digest)
+    job_id = gone.submit('digest', 'anna', {}, payload=b'audio')
+    alive._ensure_workers()
+    gone._execute("UPDATE job_nodes SET seen_at = ? WHERE node = ?",
+                  (time.time() - jobs.NODE_TIMEOUT - 1, gone.node))
+    alive._heartbeat()
+    job = alive.get(job_id)
+    assert job['status'] == FAILED
+    assert 'interrupted' in job['error']
+
+
+def test_failures_retried_with_backoff(queue, monkeypatch):
+    monkeypatch.setattr(jobs, 'JOB_RETRY_DELAY', 0.01)
+    attempts = []
+
+    def flaky(job):
+        attempts.append(job.attempt)
+        if job.attempt < 3:
+            raise ConnectionError('reset')
+        return 'ok'
+
+    queue.register('flaky', flaky, retry_on=(ConnectionError,))
+    job = wait_for(queue, queue.submit('flaky', 'anna', {}, max_attempts=3))
+    assert job['status'] == DONE and job['result'] == 'ok'
+    assert attempts == [1, 2, 3]
+
+
+@pytest.fixture
+def client(queue, monkeypatch):
+    queue.register('transcribe', payload_digest)
+    monkeypatch.setattr(openai_blueprint, 'job_queue', queue)
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.register_blueprint(openai_blueprint.openai_bp, url_prefix='/openai')
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['OPENAI_API_KEY'] = 'sk-test'
+    return client
+
+
+def test_transcribe_returns_job_to_poll(client):
+    response = client.post('/openai/transcribe', data={
+        'audio': (io.BytesIO(b'audio'), 'les.mp3')})
+    assert response.status_code == 202
+    data = response.get_json()
+    assert data['status'] == 'queued'
+    # What waitForJob polls until the status is done, failed or cancelled
+    deadline = time.monotonic() + 5
+    while True:
+        job = client.get(data['status_url']).get_json()
+        if job['status'] == DONE or time.monotonic() > deadline:
+            break
+        time.sleep(0.02)
+    assert job['id'] == data['job_id'] and job['status'] == DONE
+    assert job['result']['size'] == len(b'audio')
+    assert job['result']['params'] == {'long_audio': False, 'filename': 'les.mp3'}
+
+
+def test_jobs_of_other_sessions_not_found(client):
+    data = client.post('/openai/transcribe', data={
+        'audio': (io.BytesIO(b'audio'), 'les.mp3')}).get_json()
+    other = client.application.test_client()
+    assert other.get(data['status_url']).status_code == 404
+    assert other.post(data['status_url'] + '/cancel').status_code == 404
@@ -0,0 +1,55 @@
+import pytest
+
+from src import utils
+from src.lessons import LessonCache
+from src.storage import InMemoryStorageBackend
+
+LESSON = """| Target Language | Native Language |
+|---|---|
+| {sentence} | I live in The Hague. |
+"""
+
+
+@pytest.fixture
+def store(monkeypatch):
+    backend = InMemoryStorageBackend()
+    monkeypatch.setattr(utils, 'storage', backend)
+    monkeypatch.setattr(utils, 'lesson_cache', LessonCache(16))
+    return backend
+
+
+def write_lesson(backend, sentence):
+    # Written straight to storage, as another worker would
+    backend.write(utils.get_user_storage_path('anna', 'les', 'les1.md'),
+                  LESSON.format(sentence=sentence))
+
+
+def sentences(lesson):
+    return [s['target_lang'] for s in lesson['sentences']]
+
+
+def test_cached_lesson_served_while_unchanged(store):
+    write_lesson(store, 'Ik woon in Den Haag.')
+    first = utils.load_lesson('les1.md', 'anna', 'les')
+    assert utils.load_lesson('les1.md', 'anna', 'les') is first
+    assert utils.lesson_cache.snapshot()['hits'] == 1
+
+
+def test_change_by_another_worker_seen_immediately(store):
+    write_lesson(store, 'Ik woon in Den Haag.')
+    assert sentences(utils.load_lesson('les1.md', 'anna', 'les')) == ['Ik woon in Den Haag.']
+    write_lesson(store, 'Ik woon in Rotterdam.')
+    assert sentences(utils.load_lesson('les1.md', 'anna', 'les')) == ['Ik woon in Rotterdam.']
+
+
+def test_sidecar_used_by_a_fresh_process(store, monkeypatch):
+    write_lesson(store, 'Ik woon in Den Haag.')
+    utils.load_lesson('les1.md', 'anna', 'les')
+    monkeypatch.setattr(utils, 'lesson_cache', LessonCache(16))
+    assert sentences(utils.load_lesson('les1.md', 'anna', 'les')) == ['Ik woon in Den Haag.']
+    assert utils.lesson_cache.snapshot()['sidecar_hits'] == 1
+
+
+def test_missing_lesson(store):
+    with pytest.raises(FileNotFoundError):
+        utils.load_lesson('missing.md', 'anna', 'les')
@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+from src.storage import LocalStorageBackend, WriteConflict
+
+
+@pytest.fixture
+def backend(tmp_path):
+    return LocalStorageBackend(str(tmp_path))
+
+
+def write_within_one_tick(backend, path, content):
+    """Write path, keeping the previous mtime as a coarse filesystem clock would."""
+    full_path = backend._full_path(path)
+    mtime_ns = os.stat(full_path).st_mtime_ns
+    backend.write(path, content)
+    os.utime(full_path, ns=(mtime_ns, mtime_ns))
+
+
+def test_generation_matches_between_stat_and_read(backend):
+    backend.write('anna/notes.md', 'huis')
+    content, generation = backend.read_with_generation('anna/notes.md')
+    assert content == 'huis'
+    assert backend.stat('anna/notes.md').generation == generation
+    assert backend.read_with_generation('anna/missing.md') == (None, None)
+
+
+def test_generation_changes_within_one_timestamp_tick(backend):
+    backend.write('anna/notes.md', 'huis')
+    _, generation = backend.read_with_generation('anna/notes.md')
+    write_within_one_tick(backend, 'anna/notes.md', 'kat!')
+    assert backend.stat('anna/notes.md').generation != generation
+
+
+def test_stale_conditional_write_rejected_within_one_tick(backend):
+    backend.write('anna/progress.json', '{}')
+    _, generation = backend.read_with_generation('anna/progress.json')
+    write_within_one_tick(backend, 'anna/progress.json', '{"a": 1}')
+    with pytest.raises(WriteConflict):
+        backend.write('anna/progress.json', '{"b": 1}', if_generation_match=generation)
+    assert backend.read('anna/progress.json') == '{"a": 1}'
+
+
+def test_conditional_create(backend):
+    backend.write('anna/lease', 'mine', if_generation_match=0)
+    with pytest.raises(WriteConflict):
+        backend.write('anna/lease', 'theirs', if_generation_match=0)
+    assert backend.read('anna/lease') == 'mine'
@@ -0,0 +1,100 @@
+import pytest
+from pydub import AudioSegment
+from pydub.generators import Sine
+
+from src.blueprints import openai as openai_blueprint
+from src.long_audio import find_cut_points, plan_chunks, stitch_segments
+from src.transcription_cache import TranscriptionCache
+
+# A word every half second: (start, end, text) in seconds from the start
+SCRIPT = [(i * 0.5, i * 0.5 + 0.3, f"woord{i}") for i in range(50)]
+LENGTH_MS = 25000
+
+
+def tone(ms):
+    return Sine(440).to_audio_segment(duration=ms, volume=-6)
+
+
+def stub_transcriber(chunk):
+    """Transcribe a chunk of SCRIPT like Whisper: the words heard in full, in chunk time."""
+    start, end = chunk['start'] / 1000, chunk['end'] / 1000
+    return [{'start': word_start - start, 'end': word_end - start, 'text': text}
+            for word_start, word_end, text in SCRIPT
+            if start <= word_start and word_end <= end]
+
+
+def test_cuts_made_in_pauses_near_each_mark():
+    sound = tone(9300) + AudioSegment.silent(600) + tone(9500) + AudioSegment.silent(600) + \
+        tone(5000)
+    cuts = find_cut_points(sound, 10000)
+    assert len(cuts) == 2
+    assert cuts[0] == pytest.approx(9600, abs=20)
+    assert cuts[1] == pytest.approx(19700, abs=20)
+
+
+def test_cut_at_mark_without_pause_and_short_tail_kept():
+    assert find_cut_points(tone(25000), 10000) == [10000, 20000]
+    # A tail shorter than a quarter chunk joins the last chunk
+    assert find_cut_points(tone(22000), 10000) == [10000]
+
+
+def test_chunks_overlap_their_cores():
+    chunks = plan_chunks(LENGTH_MS, [9600, 19100], overlap_ms=1000)
+    assert [(c['core_start'], c['core_end']) for c in chunks] == \
+        [(0, 9600), (9600, 19100), (19100, LENGTH_MS)]
+    assert [(c['start'], c['end']) for c in chunks] == \
+        [(0, 10600), (8600, 20100), (18100, LENGTH_MS)]
+
+
+def test_overlapping_text_kept_once():
+    chunks = plan_chunks(LENGTH_MS, [9600, 19100], overlap_ms=1000)
+    transcribed = [(chunk, stub_transcriber(chunk)) for chunk in chunks]
+    # Words in the overlaps are heard by both neighbouring chunks
+    assert sum(len(segments) for _, segments in transcribed) > len(SCRIPT)
+    stitched = stitch_segments(transcribed)
+    assert [segment['text'] for segment in stitched] == [text for _, _, text in SCRIPT]
+    assert [(segment['start'], segment['end']) for segment in stitched] == \
+        [(round(start, 2), round(end, 2)) for start, end, _ in SCRIPT]
+
+
+def test_stitching_independent_of_completion_order():
+    chunks = plan_chunks(LENGTH_MS, [9600, 19100])
+    transcribed = [(chunk, stub_transcriber(chunk)) for chunk in chunks]
+    assert stitch_segments(reversed(transcribed)) == stitch_segments(transcribed)
+
+
+class StubJob:
+    def __init__(self, payload):
+        self.payload = payload
+        self.params = {'filename': 'les.mp3'}
+        self.secrets = {'api_key': 'sk-test'}
+        self.partials = []
+
+    def set_progress(self, progress, message=None, partial=None):
+        if partial is not None:
+            self.partials.append(partial)
+
+
+def test_long_transcription_stitched_and_cached(tmp_path, monkeypatch):
+    calls = []
+
+    def split(function, payload, audio_format, timeout):
+        return [dict(chunk, audio=b'chunk') for chunk in plan_chunks(LENGTH_MS, [9600, 19100])]
+
+    def transcribe_chunk(api_key, chunk, language=None):
+        calls.append(chunk['core_start'])
+        return stub_transcriber(chunk)
+
+    monkeypatch.setattr(openai_blueprint, 'run_audio_task', split)
+    monkeypatch.setattr(openai_blueprint, 'transcribe_chunk', transcribe_chunk)
+    monkeypatch.setattr(openai_blueprint, 'transcription_cache',
+                        TranscriptionCache(str(tmp_path), 10))
+    job = StubJob(b'\xff\xfb\x90\x00long recording')
+    result = openai_blueprint.transcribe_long(job)
+    assert result['transcription'] == ' '.join(text for _, _, text in SCRIPT)
+    assert sorted(calls) == [0, 9600, 19100]
+    assert [partial['chunks_done'] for partial in job.partials] == [1, 2, 3]
+    assert job.partials[-1]['segments'] == result['segments']
+    # The same recording again is answered from the cache
+    assert openai_blueprint.transcribe_long(StubJob(job.payload)) == result
+    assert len(calls) == 3
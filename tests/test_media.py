@@ -0,0 +1,78 @@
+import io
+
+import pytest
+from flask import Flask
+
+from src.media import DEFAULT_CACHE_POLICY, cache_policy, media_etag, send_media
+
+DATA = bytes(range(256)) * 40
+VERSION = 1234
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+
+    @app.route('/media')
+    def media():
+        return send_media(io.BytesIO(DATA), len(DATA), VERSION, 'audio/mpeg',
+                          last_modified=1_700_000_000, download_name='les.mp3')
+
+    return app.test_client()
+
+
+def test_full_response_headers(client):
+    response = client.get('/media')
+    assert response.status_code == 200
+    assert response.data == DATA
+    assert response.headers['ETag'] == f'"{media_etag(len(DATA), VERSION)}"'
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['Cache-Control'] == cache_policy('audio/mpeg')
+    assert 'les.mp3' in response.headers['Content-Disposition']
+
+
+def test_conditional_get(client):
+    etag = client.get('/media').headers['ETag']
+    response = client.get('/media', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+
+def test_range_request(client):
+    response = client.get('/media', headers={'Range': 'bytes=100-199'})
+    assert response.status_code == 206
+    assert response.data == DATA[100:200]
+    assert response.headers['Content-Range'] == f'bytes 100-199/{len(DATA)}'
+    assert response.headers['Content-Length'] == '100'
+
+
+def test_suffix_range_to_end(client):
+    response = client.get('/media', headers={'Range': 'bytes=-10'})
+    assert response.status_code == 206
+    assert response.data == DATA[-10:]
+
+
+def test_unsatisfiable_range(client):
+    response = client.get('/media', headers={'Range': f'bytes={len(DATA)}-'})
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(DATA)}'
+
+
+def test_stale_if_range_sends_whole_file(client):
+    response = client.get('/media', headers={'Range': 'bytes=0-9', 'If-Range': '"other"'})
+    assert response.status_code == 200
+    assert response.data == DATA
+
+
+def test_multiple_ranges_send_whole_file(client):
+    response = client.get('/media', headers={'Range': 'bytes=0-9,20-29'})
+    assert response.status_code == 200
+    assert response.data == DATA
+
+
+def test_cache_policies():
+    assert cache_policy('audio/mpeg') != DEFAULT_CACHE_POLICY
+    assert cache_policy('image/png') != DEFAULT_CACHE_POLICY
+    assert cache_policy('application/json') == DEFAULT_CACHE_POLICY
+    assert media_etag(255, 255) == 'ff-ff'
+    assert media_etag(255, 'abc') == 'ff-abc'
@@ -0,0 +1,102 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from openai import APITimeoutError
+
+from src.openai_clients import ClientPool
+
+
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    """Answers /v1/models like the API, keeping connections alive."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.connections.add(self.client_address)
+        if self.path.startswith('/v1/models/slow'):
+            time.sleep(self.server.delay)
+        body = json.dumps({'object': 'list', 'data': []}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubOpenAIHandler)
+    server.daemon_threads = True
+    server.connections = set()
+    server.delay = 1.0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_pool(server, **options):
+    return ClientPool(4, 600, base_url=f"http://127.0.0.1:{server.server_address[1]}/v1",
+                      max_retries=0, **options)
+
+
+def test_client_reused_per_key(stub_server):
+    pool = make_pool(stub_server)
+    client = pool.get('sk-test')
+    assert pool.get('sk-test') is client
+    assert pool.get('sk-other') is not client
+    assert pool.snapshot()['hits'] == 1
+
+
+def test_requests_reuse_connection(stub_server):
+    pool = make_pool(stub_server)
+    for _ in range(5):
+        pool.get('sk-test').models.list()
+    assert len(stub_server.connections) == 1
+
+
+def test_discarded_client_opens_new_connection(stub_server):
+    pool = make_pool(stub_server)
+    pool.get('sk-test').models.list()
+    pool.discard('sk-test')
+    pool.get('sk-test').models.list()
+    assert len(stub_server.connections) == 2
+
+
+def test_idle_clients_evicted(stub_server):
+    pool = ClientPool(4, 0.05, base_url=f"http://127.0.0.1:{stub_server.server_address[1]}/v1")
+    client = pool.get('sk-test')
+    time.sleep(0.1)
+    assert pool.get('sk-test') is not client
+    assert pool.snapshot()['evictions'] == 1
+
+
+def test_pool_bounded():
+    pool = ClientPool(2, 600, factory=lambda **options: object())
+    first = pool.get('sk-1')
+    pool.get('sk-2')
+    pool.get('sk-3')
+    assert pool.snapshot()['clients'] == 2
+    assert pool.get('sk-1') is not first
+
+
+def test_request_timeout_honoured(stub_server):
+    pool = make_pool(stub_server, timeout=0.2)
+    client = pool.get('sk-test')
+    started = time.monotonic()
+    with pytest.raises(APITimeoutError):
+        client.models.retrieve('slow')
+    assert time.monotonic() - started < stub_server.delay
+
+
+def test_per_call_options_override_pool_defaults(stub_server):
+    pool = make_pool(stub_server, timeout=0.2)
+    client = pool.get('sk-test', timeout=5)
+    client.models.retrieve('slow')
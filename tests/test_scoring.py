@@ -0,0 +1,67 @@
+import random
+
+from src.scoring import (bounded_edit_distance, find_close_match, score_answer,
+                         score_answers)
+
+
+def edit_distance(a, b, substitution_cost):
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else substitution_cost
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+        previous = current
+    return previous[len(b)]
+
+
+def test_bounded_edit_distance_matches_full_computation():
+    rng = random.Random(0)
+    for _ in range(500):
+        a = ''.join(rng.choices('abc', k=rng.randint(0, 8)))
+        b = ''.join(rng.choices('abc', k=rng.randint(0, 8)))
+        for cost in (1, 2):
+            expected = edit_distance(a, b, cost)
+            for max_distance in range(6):
+                result = bounded_edit_distance(a, b, max_distance, cost)
+                assert result == (expected if expected <= max_distance else None)
+
+
+def test_close_match_uses_similarity_cutoff():
+    rng = random.Random(1)
+    for _ in range(300):
+        word = ''.join(rng.choices('abcde', k=rng.randint(3, 9)))
+        candidate = ''.join(rng.choices('abcde', k=rng.randint(3, 9)))
+        similarity = 1 - edit_distance(word, candidate, 2) / (len(word) + len(candidate))
+        expected = candidate if similarity >= 0.8 - 1e-9 else None
+        words_by_length = {len(candidate): {candidate: set(candidate)}}
+        assert find_close_match(word, words_by_length) == expected
+
+
+def test_perfect_and_empty_answers():
+    assert score_answer('Ik ben moe', 'ik ben moe') == (10, "Perfect!")
+    assert score_answer('', 'ik ben moe') == (0, "No answer provided")
+
+
+def test_misspelled_word_gets_partial_credit():
+    points, feedback = score_answer('ik ben vermoed', 'ik ben vermoeid')
+    assert 0 < points < 10
+    assert "'vermoed' should be 'vermoeid'" in feedback
+
+
+def test_exact_matches_are_not_taken_by_fuzzy_matches():
+    points, feedback = score_answer('de dee', 'dee de')
+    assert 'should be' not in feedback
+    assert points == 9
+
+
+def test_missing_and_extra_words_reported():
+    _, feedback = score_answer('ik loop snel', 'ik ben moe')
+    assert "Missing word: 'ben'" in feedback
+    assert "Extra word: 'loop'" in feedback
+
+
+def test_batch_scoring_matches_single_scoring():
+    pairs = [('ik ben vermoed', 'ik ben vermoeid'), ('de katt slaapt', 'de kat slaapt'),
+             ('vermoed', 'vermoeid')]
+    assert score_answers(pairs) == [score_answer(*pair) for pair in pairs]
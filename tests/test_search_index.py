@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+from src import utils
+from src.search_index import SearchIndex
+from src.storage import InMemoryStorageBackend
+
+
+def paths(index, query):
+    return [path for path, _, _ in index.search(query)]
+
+
+@pytest.fixture
+def index():
+    index = SearchIndex()
+    index.add_document('les/les1.md', 'Ik woon in Den Haag, vlak bij het ziekenhuis.', 1)
+    index.add_document('les/les2.md', 'De huisarts woont in Utrecht.', 1)
+    return index
+
+
+def test_every_term_must_match(index):
+    assert paths(index, 'den haag') == ['les/les1.md']
+    assert paths(index, 'Haag Den') == ['les/les1.md']
+    assert paths(index, 'den utrecht') == []
+
+
+def test_last_term_matches_as_prefix(index):
+    assert paths(index, 'woo') == ['les/les1.md', 'les/les2.md']
+    assert paths(index, 'in Utr') == ['les/les2.md']
+    assert paths(index, 'Ut in') == []
+
+
+def test_substring_inside_words_still_matches(index):
+    # Matched by the former substring scan
+    assert sorted(paths(index, 'huis')) == ['les/les1.md', 'les/les2.md']
+    assert paths(index, 'arts') == ['les/les2.md']
+    # Whole words rank above words containing the term
+    assert paths(index, 'woon') == ['les/les1.md', 'les/les2.md']
+
+
+def test_short_terms_only_match_words_and_prefixes(index):
+    assert paths(index, 'ag') == []
+    assert paths(index, 'ha') == ['les/les1.md']
+
+
+def test_offset_of_first_term(index):
+    [(_, _, offset)] = index.search('haag')
+    assert offset == len('Ik woon in Den ')
+
+
+def test_reindex_and_unindex(index):
+    index.add_document('les/les1.md', 'Ik woon in Amsterdam.', 2)
+    assert paths(index, 'haag') == []
+    assert paths(index, 'amsterdam') == ['les/les1.md']
+    assert index.generation('les/les1.md') == 2
+    index.remove_document('les/les1.md')
+    assert paths(index, 'woon') == ['les/les2.md']
+    assert 'amsterdam' not in index.postings
+
+
+def test_rename(index):
+    index.move_document('les/les2.md', 'oud/les2.md')
+    assert paths(index, 'utrecht') == ['oud/les2.md']
+    assert index.generation('les/les2.md') is None
+
+
+def test_round_trip(index):
+    loaded = SearchIndex.from_dict(json.loads(json.dumps(index.to_dict())))
+    assert paths(loaded, 'huis') == paths(index, 'huis')
+
+
+@pytest.fixture
+def store(monkeypatch):
+    backend = InMemoryStorageBackend()
+    monkeypatch.setattr(utils, 'storage', backend)
+    monkeypatch.setattr(utils, '_provisioned_users', {'anna'})
+    monkeypatch.setattr(utils, '_search_indexes', {})
+    monkeypatch.setattr(utils, '_search_index_sources', {})
+    return backend
+
+
+def write_document(backend, relative_path, content):
+    # Written straight to storage, as another worker would
+    path = utils.get_user_storage_path('anna', filename=relative_path)
+    backend.write(path, content)
+    utils.update_user_manifest('anna', lambda manifest: manifest['files'].update(
+        {relative_path: utils._manifest_entry(backend.stat(path), relative_path)}))
+
+
+def test_search_files_follows_storage(store):
+    utils.rebuild_user_manifest('anna')
+    write_document(store, 'les/les1.md', 'Ik woon in Den Haag.')
+    [result] = utils.search_files('haag', 'anna')
+    assert result == {'filename': 'les1.md', 'path': 'les/les1.md', 'folder': 'les',
+                      'snippet': 'Ik woon in Den Haag.'}
+    write_document(store, 'les/les1.md', 'Ik woon in Utrecht.')
+    assert utils.search_files('haag', 'anna') == []
+    assert [r['path'] for r in utils.search_files('utrecht', 'anna')] == ['les/les1.md']
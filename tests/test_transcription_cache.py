@@ -0,0 +1,96 @@
+import os
+import struct
+import time
+
+import pytest
+
+from src.transcription_cache import TranscriptionCache
+
+MP3_FRAMES = b'\xff\xfb\x90\x00' + bytes(range(256)) * 4
+
+
+def id3v2(title):
+    frame = b'TIT2' + struct.pack('>I', len(title) + 1) + b'\x00\x00\x00' + title
+    size = len(frame)
+    syncsafe = bytes([size >> 21 & 0x7F, size >> 14 & 0x7F, size >> 7 & 0x7F, size & 0x7F])
+    return b'ID3\x04\x00\x00' + syncsafe + frame
+
+
+def id3v1(title):
+    return b'TAG' + title.ljust(125, b'\x00')
+
+
+def wav(*chunks):
+    body = b'WAVE' + b''.join(chunk_id + struct.pack('<I', len(data)) + data
+                              + b'\x00' * (len(data) & 1) for chunk_id, data in chunks)
+    return b'RIFF' + struct.pack('<I', len(body)) + body
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return TranscriptionCache(str(tmp_path), max_entries=3)
+
+
+def test_miss_then_hit(cache):
+    key = cache.key(MP3_FRAMES, 'whisper-1', 'nl')
+    assert cache.get(key) is None
+    cache.put(key, 'Ik woon in Den Haag.')
+    assert cache.get(key) == 'Ik woon in Den Haag.'
+    assert cache.snapshot()['hits'] == 1 and cache.snapshot()['misses'] == 1
+
+
+def test_key_depends_on_audio_model_and_language(cache):
+    key = cache.key(MP3_FRAMES, 'whisper-1', 'nl')
+    assert cache.key(MP3_FRAMES[:-1], 'whisper-1', 'nl') != key
+    assert cache.key(MP3_FRAMES, 'whisper-1:segments', 'nl') != key
+    assert cache.key(MP3_FRAMES, 'whisper-1', 'en') != key
+    assert cache.key(MP3_FRAMES, 'whisper-1') != key
+
+
+def test_retagged_mp3_hits(cache):
+    key = cache.key(MP3_FRAMES, 'whisper-1')
+    assert cache.key(id3v2(b'Les 1') + MP3_FRAMES, 'whisper-1') == key
+    assert cache.key(id3v2(b'Les 1 (kopie)') + MP3_FRAMES + id3v1(b'Les 1'), 'whisper-1') == key
+
+
+def test_wav_info_chunks_ignored(cache):
+    fmt = (b'fmt ', struct.pack('<HHIIHH', 1, 1, 16000, 32000, 2, 16))
+    data = (b'data', bytes(range(200)))
+    key = cache.key(wav(fmt, data), 'whisper-1')
+    assert cache.key(wav(fmt, (b'LIST', b'INFOISFT\x05\x00\x00\x00Lavf\x00'), data),
+                     'whisper-1') == key
+    assert cache.key(wav(fmt, (b'data', bytes(range(1, 201)))), 'whisper-1') != key
+
+
+def test_flac_comments_ignored(cache):
+    streaminfo = bytes(34)
+
+    def flac(*blocks):
+        encoded = b''
+        for i, (block_type, data) in enumerate(blocks):
+            last = 0x80 if i == len(blocks) - 1 else 0
+            encoded += bytes([last | block_type]) + len(data).to_bytes(3, 'big') + data
+        return b'fLaC' + encoded + b'\xff\xf8frames'
+
+    key = cache.key(flac((0, streaminfo)), 'whisper-1')
+    assert cache.key(flac((0, streaminfo), (4, b'\x05\x00\x00\x00title')), 'whisper-1') == key
+
+
+def test_corrupted_entry_is_a_miss(cache):
+    key = cache.key(MP3_FRAMES, 'whisper-1')
+    cache.put(key, 'Goedemorgen')
+    with open(cache._path(key), 'w') as f:
+        f.write('{"te')
+    assert cache.get(key) is None
+
+
+def test_least_recently_used_entries_evicted(cache):
+    keys = [cache.key(bytes([i]) * 10, 'whisper-1') for i in range(5)]
+    for i, key in enumerate(keys):
+        cache.put(key, f"tekst {i}")
+        # Distinct mtimes regardless of filesystem timestamp granularity
+        os.utime(cache._path(key), (time.time() - 100 + i, time.time() - 100 + i))
+    cache.get(keys[0])
+    cache.evict()
+    assert [cache.get(key) is not None for key in keys] == [True, False, False, True, True]
+    assert cache.snapshot()['evictions'] == 2
@@ -0,0 +1,90 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+from src.storage import (RESUMABLE_CHUNK_SIZE, RESUMABLE_UPLOAD_THRESHOLD, GCSStorageBackend,
+                         UploadStream, UploadTooLarge)
+
+DATA = os.urandom(100_000)
+
+
+def test_counts_and_hashes_while_reading():
+    upload = UploadStream(io.BytesIO(DATA))
+    assert upload.read() == DATA
+    assert upload.size == len(DATA)
+    assert upload.sha256 == hashlib.sha256(DATA).hexdigest()
+
+
+def test_limit_enforced_while_streaming():
+    upload = UploadStream(io.BytesIO(DATA), max_bytes=50_000)
+    upload.read(40_000)
+    with pytest.raises(UploadTooLarge):
+        upload.read(40_000)
+
+
+def test_retried_chunks_are_replayed():
+    """Resumable uploads seek back to the acknowledged offset of the last chunk."""
+    upload = UploadStream(io.BytesIO(DATA))
+    sent = b''
+    while True:
+        start = upload.tell()
+        chunk = upload.read(30_000)
+        if not chunk:
+            break
+        acknowledged = len(chunk) // 3
+        upload.seek(start + acknowledged)
+        sent += chunk[:acknowledged] + upload.read(30_000)
+        assert upload.tell() == len(sent)
+    assert sent == DATA
+    # Replayed bytes are neither counted nor hashed twice
+    assert upload.size == len(DATA)
+    assert upload.sha256 == hashlib.sha256(DATA).hexdigest()
+
+
+def test_cannot_seek_before_last_read():
+    upload = UploadStream(io.BytesIO(DATA))
+    upload.read(10_000)
+    upload.read(10_000)
+    with pytest.raises(io.UnsupportedOperation):
+        upload.seek(0)
+    with pytest.raises(io.UnsupportedOperation):
+        upload.seek(0, os.SEEK_END)
+
+
+class RecordingBlob:
+    def __init__(self):
+        self.chunk_size = None
+
+    def upload_from_file(self, fileobj, **kwargs):
+        self.data = fileobj.read()
+        self.kwargs = kwargs
+
+
+class RecordingClient:
+    def __init__(self):
+        self.bucket = self
+        self.blobs = {}
+
+    def blob(self, path):
+        return self.blobs.setdefault(path, RecordingBlob())
+
+    def invalidate(self, path):
+        pass
+
+
+def test_small_gcs_uploads_sent_in_one_request():
+    backend = GCSStorageBackend(RecordingClient())
+    backend.upload_fileobj(io.BytesIO(b'png'), 'a.png', 'image/png', size=3)
+    blob = backend.bucket.blobs['a.png']
+    # A size and no chunk size make the client send a single multipart request
+    assert blob.kwargs['size'] == 3 and blob.chunk_size is None
+
+
+def test_large_or_unknown_gcs_uploads_resumable():
+    backend = GCSStorageBackend(RecordingClient())
+    backend.upload_fileobj(io.BytesIO(b'png'), 'a.png', size=RESUMABLE_UPLOAD_THRESHOLD)
+    backend.upload_fileobj(io.BytesIO(b'png'), 'b.png')
+    for blob in backend.bucket.blobs.values():
+        assert 'size' not in blob.kwargs and blob.chunk_size == RESUMABLE_CHUNK_SIZE
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from src import utils
+from src.storage import InMemoryStorageBackend
+
+
+@pytest.fixture
+def store(monkeypatch):
+    backend = InMemoryStorageBackend()
+    monkeypatch.setattr(utils, 'storage', backend)
+    monkeypatch.setattr(utils, 'check_premium_user', lambda username, filename: None)
+    monkeypatch.setattr(utils, 'WRITE_BEHIND_WINDOW', 60)
+    monkeypatch.setattr(utils, '_ensure_flusher', lambda: None)
+    yield backend
+    utils.flush_due_writes(force=True)
+
+
+def progress_path():
+    return utils.get_user_storage_path('anna', '', 'learning_progress.json')
+
+
+def add_test(score):
+    def update(progress):
+        progress.setdefault('les/les1', {'tests': []})['tests'].append(score)
+        return progress
+    return update
+
+
+def test_buffered_updates_applied_on_top_of_other_writers(store):
+    store.write(progress_path(), json.dumps({'les/les0': {'tests': [5]}}))
+    utils.buffer_json_update('learning_progress.json', 'anna', add_test(7))
+    utils.buffer_json_update('learning_progress.json', 'anna', add_test(9))
+    assert json.loads(store.read(progress_path())) == {'les/les0': {'tests': [5]}}
+    # Another worker writes while the updates are buffered
+    store.write(progress_path(), json.dumps({'les/les0': {'tests': [5, 6]}}))
+    utils.flush_due_writes(force=True)
+    assert json.loads(store.read(progress_path())) == {
+        'les/les0': {'tests': [5, 6]}, 'les/les1': {'tests': [7, 9]}}
+
+
+def test_read_flushes_buffered_updates(store):
+    utils.buffer_json_update('learning_progress.json', 'anna', add_test(7))
+    assert json.loads(utils.open_md_file('learning_progress.json', 'anna')) == \
+        {'les/les1': {'tests': [7]}}
+
+
+def test_blind_writes_coalesced(store, monkeypatch):
+    writes = []
+    write = store.write
+    monkeypatch.setattr(store, 'write', lambda path, *args, **kwargs:
+                        writes.append(path) or write(path, *args, **kwargs))
+    for sentence in range(3):
+        utils.buffer_file_write('les1.md_progress.json', json.dumps({sentence: True}),
+                                'anna', 'les')
+    utils.flush_due_writes(force=True)
+    path = utils.get_user_storage_path('anna', 'les', 'les1.md_progress.json')
+    assert writes.count(path) == 1
+    assert json.loads(store.read(path)) == {'2': True}
+
+
+def test_save_is_not_overwritten_by_older_buffered_write(store):
+    utils.buffer_file_write('notes.json', '{"old": true}', 'anna')
+    utils.save_file('notes.json', '{"new": true}', 'anna')
+    utils.flush_due_writes(force=True)
+    path = utils.get_user_storage_path('anna', '', 'notes.json')
+    assert json.loads(store.read(path)) == {'new': True}